@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# Builds and queries a memory-mapped dbSNP position/allele index.
+# Each chromosome-split dbSNP VCF (homo_sapiens_chr{N}.vcf.gz) is turned into
+# three .npy arrays that are loaded with mmap_mode='r', so a lookup only pages
+# in the chromosomes (and the parts of them) that are actually used:
+#   chr{N}.pos.npy   sorted uint32 positions
+#   chr{N}.key.npy   uint64 hash of "REF_ALT" (one entry per ALT allele)
+#   chr{N}.rsid.npy  uint64 rsID number (rs prefix stripped); NO_RSID for records whose ID
+#                    is ".", which are reported as "." like the tabix lookup does
+
+import argparse
+import glob
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+VCF_PATTERN = "homo_sapiens_chr{chrom}.vcf.gz"
+INDEX_ARRAYS = ("pos", "key", "rsid")
+
+# rsID number of dbSNP records without an rs ID (ID "."); 0 means no record
+NO_RSID = np.uint64(np.iinfo(np.uint64).max)
+
+# Cache of memory-mapped index arrays per chromosome
+index_cache = {}
+
+def normalize_chrom(chrom):
+    return str(chrom).replace("chr", "")
+
+def allele_keys(ref, alt):
+    """
+    Hash REF/ALT allele pairs to uint64 keys. ref and alt are array-likes of strings.
+    """
+    pairs = pd.Series(ref, dtype=object).astype(str).str.cat(pd.Series(alt, dtype=object).astype(str).values, sep="_")
+    return pd.util.hash_array(pairs.to_numpy(dtype=object))
+
+def index_paths(index_dir, chrom):
+    chrom = normalize_chrom(chrom)
+    return {name: os.path.join(index_dir, f"chr{chrom}.{name}.npy") for name in INDEX_ARRAYS}
+
+def build_chrom_index(vcf_file, index_dir, chrom, chunksize=5_000_000):
+    """
+    Convert one chromosome dbSNP VCF into position/key/rsID arrays.
+    """
+    pos_parts, key_parts, rsid_parts = [], [], []
+    skipped = 0
+
+    reader = pd.read_csv(
+        vcf_file, sep="\t", comment="#", header=None, usecols=[1, 2, 3, 4],
+        names=["POS", "ID", "REF", "ALT"], dtype=str, chunksize=chunksize,
+    )
+    for chunk in reader:
+        # One entry per ALT allele so multi-allelic sites match on any of them
+        chunk = chunk.assign(ALT=chunk["ALT"].str.split(",")).explode("ALT")
+
+        rs_number = pd.to_numeric(chunk["ID"].str.replace(r"^rs", "", regex=True), errors="coerce")
+        no_id = (chunk["ID"] == ".").to_numpy()
+        valid = rs_number.notna().to_numpy() | no_id
+        skipped += int((~valid).sum())
+        chunk = chunk[valid]
+
+        pos_parts.append(chunk["POS"].astype(np.uint32).to_numpy())
+        key_parts.append(allele_keys(chunk["REF"].to_numpy(), chunk["ALT"].to_numpy()))
+        numbers = np.full(len(chunk), NO_RSID, dtype=np.uint64)
+        numbers[~no_id[valid]] = rs_number[valid & ~no_id].astype(np.uint64).to_numpy()
+        rsid_parts.append(numbers)
+
+    pos = np.concatenate(pos_parts) if pos_parts else np.empty(0, dtype=np.uint32)
+    key = np.concatenate(key_parts) if key_parts else np.empty(0, dtype=np.uint64)
+    rsid = np.concatenate(rsid_parts) if rsid_parts else np.empty(0, dtype=np.uint64)
+
+    # dbSNP VCFs are position-sorted already; a stable sort keeps file order
+    # within a position so the first matching record still wins on lookup
+    order = np.argsort(pos, kind="stable")
+
+    os.makedirs(index_dir, exist_ok=True)
+    paths = index_paths(index_dir, chrom)
+    np.save(paths["pos"], pos[order])
+    np.save(paths["key"], key[order])
+    np.save(paths["rsid"], rsid[order])
+
+    print(f"Indexed chr{normalize_chrom(chrom)}: {len(pos)} alleles ({skipped} records with a non-rs ID skipped).")
+
+def build_index(vcf_dir, index_dir, chromosomes=None):
+    """
+    Build index arrays for every chromosome VCF in vcf_dir (or the listed chromosomes).
+    """
+    if chromosomes is None:
+        pattern = os.path.join(vcf_dir, VCF_PATTERN.format(chrom="*"))
+        regex = re.compile(re.escape(VCF_PATTERN).replace(r"\{chrom\}", "(.+)"))
+        chromosomes = sorted(regex.fullmatch(os.path.basename(f)).group(1) for f in glob.glob(pattern))
+
+    if not chromosomes:
+        print(f"No dbSNP VCF files found in directory: {vcf_dir}")
+        return
+
+    for chrom in chromosomes:
+        vcf_file = os.path.join(vcf_dir, VCF_PATTERN.format(chrom=normalize_chrom(chrom)))
+        if not os.path.exists(vcf_file):
+            raise FileNotFoundError(f"Missing VCF file for chromosome {chrom}: {vcf_file}")
+        build_chrom_index(vcf_file, index_dir, chrom)
+
+def load_chrom_index(index_dir, chrom):
+    """
+    Memory-map the index arrays of one chromosome. Returns None if the chromosome is not indexed.
+    """
+    paths = index_paths(index_dir, chrom)
+    if paths["pos"] not in index_cache:
+        if not os.path.exists(paths["pos"]):
+            index_cache[paths["pos"]] = None
+        else:
+            index_cache[paths["pos"]] = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+    return index_cache[paths["pos"]]
+
+def lookup_chrom(index, pos, ref=None, alt=None):
+    """
+    Vectorized rsID lookup for variants on one chromosome.
+
+    Args:
+        index (dict): Arrays returned by load_chrom_index.
+        pos (np.ndarray): Integer positions.
+        ref, alt (array-like): Alleles; rows with an empty ref or alt match on position only.
+
+    Returns:
+        np.ndarray: uint64 rsID numbers, 0 where no record matches.
+    """
+    pos = np.asarray(pos, dtype=np.int64)
+    result = np.zeros(len(pos), dtype=np.uint64)
+    if index is None or len(pos) == 0 or len(index["pos"]) == 0:
+        return result
+
+    lo = np.searchsorted(index["pos"], pos, side="left")
+    hi = np.searchsorted(index["pos"], pos, side="right")
+
+    if ref is None or alt is None:
+        by_position = np.ones(len(pos), dtype=bool)
+        keys = np.zeros(len(pos), dtype=np.uint64)
+    else:
+        ref = pd.Series(ref, dtype=object).fillna("").astype(str).to_numpy()
+        alt = pd.Series(alt, dtype=object).fillna("").astype(str).to_numpy()
+        by_position = (ref == "") | (alt == "")
+        keys = allele_keys(ref, alt)
+
+    # Position-only rows take the first record at that position
+    hit = by_position & (lo < hi)
+    result[hit] = index["rsid"][lo[hit]]
+
+    # Allele rows scan the (short) run of records at their position, in file order
+    pending = ~by_position & (lo < hi)
+    offset = 0
+    while pending.any():
+        rows = np.flatnonzero(pending)
+        cand = lo[rows] + offset
+        in_run = cand < hi[rows]
+        rows, cand = rows[in_run], cand[in_run]
+        match = index["key"][cand] == keys[rows]
+        result[rows[match]] = index["rsid"][cand[match]]
+        pending[:] = False
+        pending[rows[~match]] = True
+        offset += 1
+
+    return result
+
+def format_rsids(numbers):
+    """
+    Turn uint64 rsID numbers into 'rs...' strings, with 'NA' for misses and '.' for
+    dbSNP records without an rs ID.
+    """
+    numbers = np.asarray(numbers)
+    out = np.full(len(numbers), "NA", dtype=object)
+    found = (numbers > 0) & (numbers != NO_RSID)
+    out[found] = np.char.add("rs", numbers[found].astype(str))
+    out[numbers == NO_RSID] = "."
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped dbSNP position/allele index from chromosome-split dbSNP VCFs.")
+    parser.add_argument("vcf_dir", help="Directory containing chromosome-specific VCF files (e.g., homo_sapiens_chr1.vcf.gz)")
+    parser.add_argument("index_dir", help="Directory to write the per-chromosome .npy index files to")
+    parser.add_argument("--chromosomes", nargs="*", default=None, help="Chromosomes to index (default: every VCF found in vcf_dir)")
+
+    args = parser.parse_args()
+    build_index(args.vcf_dir, args.index_dir, args.chromosomes)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,18 @@
-pip install gwas-validator
+#!/usr/bin/env bash
+set -euo pipefail
 
-gwas-validator --input ~/sumstats/Biomarkers/CRP/35459240-GCST90029070-EFO_0004458-Build37.f.tsv.gz --output validation_report.json
+# Detect the genome build (GRCh37/GRCh38) of a sumstats file offline, from a sample of its
+# variants looked up in the GRCh37 and GRCh38 dbSNP indexes (dbsnp_index.py).
+# Exit code 2 if the build could not be determined.
+
+SUMSTATS="${1:-$HOME/sumstats/Biomarkers/CRP/35459240-GCST90029070-EFO_0004458-Build37.f.tsv.gz}"
+REPORT="${2:-validation_report.json}"
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+INDEX37="${INDEX37:-/root/persistent/opt/dbsnp/GRCh37/index}"
+INDEX38="${INDEX38:-/root/persistent/opt/dbsnp/GRCh38/index}"
+
+python "${SCRIPT_DIR}/prs_detect_build.py" detect "$SUMSTATS" \
+  --index37 "$INDEX37" \
+  --index38 "$INDEX38" \
+  --output "$REPORT"
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# Vectorized liftover with UCSC chain files.
+# A chain file is parsed once into sorted interval arrays per source chromosome (one entry
+# per ungapped block: source start/end, target chromosome, target start, strand). Whole
+# chunks of positions are then mapped with np.searchsorted. Positions outside every block,
+# or inside blocks of several chains (duplicated in the target build), are reported as
+# unmapped, like UCSC liftOver does. On the minus strand the position is mirrored and the
+# alleles are reverse-complemented.
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from dbsnp_index import normalize_chrom
+from prs_sumstats_ingest import detect_columns
+from sumstats_io import open_input, open_output
+
+COMPLEMENT = str.maketrans("ACGTacgt", "TGCAtgca")
+
+# Unmapped reasons
+UNMAPPED_CHROM = "chrom_not_in_chain"
+UNMAPPED_GAP = "deleted_in_new"
+UNMAPPED_MULTIPLE = "duplicated_in_new"
+UNMAPPED_SPLIT = "split_in_new"
+
+class ChainMap:
+    """
+    Ungapped chain blocks per source chromosome, sorted by source start.
+    """
+
+    def __init__(self, path):
+        self.target_chroms = []
+        blocks = {}
+        target_ids = {}
+
+        with open_input(path) as f:
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                if fields[0] == "chain":
+                    t_chrom = normalize_chrom(fields[2])
+                    t_pos = int(fields[5])
+                    q_chrom, q_size, q_strand, q_pos = normalize_chrom(fields[7]), int(fields[8]), fields[9], int(fields[10])
+                    if q_chrom not in target_ids:
+                        target_ids[q_chrom] = len(self.target_chroms)
+                        self.target_chroms.append(q_chrom)
+                    chrom_blocks = blocks.setdefault(t_chrom, [])
+                    target = target_ids[q_chrom]
+                    continue
+                size = int(fields[0])
+                chrom_blocks.append((t_pos, t_pos + size, target, q_pos, q_strand == "-", q_size))
+                if len(fields) == 3:
+                    t_pos += size + int(fields[1])
+                    q_pos += size + int(fields[2])
+
+        self.chroms = {}
+        for chrom, rows in blocks.items():
+            arr = np.array(rows, dtype=np.int64)
+            arr = arr[np.argsort(arr[:, 0], kind="stable")]
+            start, end = arr[:, 0], arr[:, 1]
+            # Blocks overlapping an earlier block (from another chain) form a group;
+            # positions in a group of more than one block need the slow exact check
+            max_end = np.maximum.accumulate(end)
+            new_group = np.ones(len(arr), dtype=bool)
+            new_group[1:] = start[1:] >= max_end[:-1]
+            group = np.cumsum(new_group) - 1
+            group_start = np.flatnonzero(new_group)
+            group_size = np.diff(np.append(group_start, len(arr)))
+            self.chroms[chrom] = {
+                "start": start, "end": end, "max_end": max_end,
+                "target": arr[:, 2], "target_start": arr[:, 3], "minus": arr[:, 4].astype(bool), "target_size": arr[:, 5],
+                "group": group, "group_start": group_start, "group_size": group_size,
+            }
+
+    def lift(self, chrom, pos, length=None):
+        """
+        Lift 1-based positions on one source chromosome.
+
+        Args:
+            chrom (str): Source chromosome.
+            pos (np.ndarray): 1-based positions.
+            length (np.ndarray): Reference allele lengths (default: 1); the whole allele must
+                lie in one block.
+
+        Returns:
+            (target chromosomes, 1-based target positions, minus strand flags, unmapped reasons);
+            the reason is None for mapped rows.
+        """
+        pos = np.asarray(pos, dtype=np.int64)
+        n = len(pos)
+        length = np.ones(n, dtype=np.int64) if length is None else np.maximum(np.asarray(length, dtype=np.int64), 1)
+        new_chrom = np.full(n, None, dtype=object)
+        new_pos = np.zeros(n, dtype=np.int64)
+        minus = np.zeros(n, dtype=bool)
+        reason = np.full(n, None, dtype=object)
+
+        blocks = self.chroms.get(normalize_chrom(chrom))
+        if blocks is None:
+            reason[:] = UNMAPPED_CHROM
+            return new_chrom, new_pos, minus, reason
+
+        p0 = pos - 1
+        idx = np.searchsorted(blocks["start"], p0, side="right") - 1
+        valid = idx >= 0
+        idx = np.where(valid, idx, 0)
+        covered = valid & (blocks["max_end"][idx] > p0)
+        block = np.where(covered & (blocks["end"][idx] > p0), idx, -1)
+
+        # Queries inside an overlap group: count the blocks containing them exactly
+        grouped = np.flatnonzero(covered & (blocks["group_size"][blocks["group"][idx]] > 1))
+        for k in grouped:
+            first = blocks["group_start"][blocks["group"][idx[k]]]
+            hits = first + np.flatnonzero((blocks["start"][first:idx[k] + 1] <= p0[k]) & (blocks["end"][first:idx[k] + 1] > p0[k]))
+            if len(hits) > 1:
+                reason[k] = UNMAPPED_MULTIPLE
+            block[k] = hits[0] if len(hits) == 1 else -1
+
+        mapped = block >= 0
+        reason[~mapped & pd.isna(reason)] = UNMAPPED_GAP
+        split = mapped & (p0 + length > blocks["end"][np.where(mapped, block, 0)])
+        reason[split] = UNMAPPED_SPLIT
+        mapped &= ~split
+
+        b = block[mapped]
+        q0 = blocks["target_start"][b] + (p0[mapped] - blocks["start"][b])
+        minus[mapped] = blocks["minus"][b]
+        # Minus strand: mirror the allele span, so the new position is its leftmost base
+        new_pos[mapped] = np.where(blocks["minus"][b], blocks["target_size"][b] - q0 - length[mapped] + 1, q0 + 1)
+        new_chrom[mapped] = np.asarray(self.target_chroms, dtype=object)[blocks["target"][b]]
+        return new_chrom, new_pos, minus, reason
+
+def reverse_complement(alleles):
+    return pd.Series(alleles, dtype=object).fillna("").str.translate(COMPLEMENT).str[::-1].to_numpy()
+
+def lift_frame(chain, chrom, pos, ref=None, alt=None):
+    """
+    Lift a chunk of variants (any mix of chromosomes).
+
+    Returns a DataFrame with CHR, POS, REF, ALT (reverse-complemented on the minus strand),
+    STRAND and UNMAPPED (reason, or None) columns, in input order.
+    """
+    codes, chroms = pd.factorize(pd.Series(chrom, dtype=object))
+    pos = np.asarray(pos, dtype=np.int64)
+    n = len(pos)
+    if ref is not None:
+        ref, alt = np.array(ref, dtype=object), np.array(alt, dtype=object)
+        length = pd.Series(ref, dtype=object).str.len().fillna(1).to_numpy(dtype=np.int64)
+    else:
+        length = np.ones(n, dtype=np.int64)
+
+    new_chrom = np.full(n, None, dtype=object)
+    new_pos = np.zeros(n, dtype=np.int64)
+    minus = np.zeros(n, dtype=bool)
+    reason = np.full(n, None, dtype=object)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(chroms)))
+    offset = int((codes < 0).sum())
+    reason[order[:offset]] = UNMAPPED_CHROM
+    for k, c in enumerate(chroms):
+        rows = order[offset + (bounds[k - 1] if k else 0):offset + bounds[k]]
+        new_chrom[rows], new_pos[rows], minus[rows], reason[rows] = chain.lift(c, pos[rows], length[rows])
+
+    out = {"CHR": new_chrom, "POS": new_pos, "STRAND": np.where(minus, "-", "+").astype(object), "UNMAPPED": reason}
+    if ref is not None:
+        ref[minus], alt[minus] = reverse_complement(ref[minus]), reverse_complement(alt[minus])
+        out["REF"], out["ALT"] = ref, alt
+    return pd.DataFrame({name: pd.Series(values, dtype=values.dtype) for name, values in out.items()})
+
+def liftover_file(input_file, output_file, chain_file, unmapped_file=None, chunksize=1_000_000, threads=4):
+    """
+    Lift the CHR/POS columns of a tab-delimited sumstats file; alleles (A1/A2) are
+    reverse-complemented on the minus strand. Unmapped rows go to unmapped_file.
+    """
+    chain = ChainMap(chain_file)
+    unmapped_out = open_output(unmapped_file, threads) if unmapped_file else None
+    n_in = n_unmapped = 0
+    try:
+        with open_input(input_file) as infile, open_output(output_file, threads) as outfile:
+            reader = pd.read_csv(infile, sep="\t", dtype=str, keep_default_na=False, chunksize=chunksize)
+            first = True
+            for chunk in reader:
+                mapping = detect_columns(list(chunk.columns), required=["CHR", "POS"])
+                a1, a2 = mapping.get("A1"), mapping.get("A2")
+                pos = pd.to_numeric(chunk[mapping["POS"]], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+                lifted = lift_frame(chain, chunk[mapping["CHR"]], pos,
+                                    chunk[a2].to_numpy() if a1 and a2 else None,
+                                    chunk[a1].to_numpy() if a1 and a2 else None)
+                unmapped = lifted["UNMAPPED"].notna().to_numpy()
+
+                out = chunk.copy()
+                out[mapping["CHR"]] = lifted["CHR"].to_numpy()
+                out[mapping["POS"]] = lifted["POS"].astype(str).to_numpy()
+                if a1 and a2:
+                    out[a2], out[a1] = lifted["REF"].to_numpy(), lifted["ALT"].to_numpy()
+                out[~unmapped].to_csv(outfile, sep="\t", index=False, header=first)
+                if unmapped_out is not None:
+                    chunk[unmapped].assign(UNMAPPED=lifted["UNMAPPED"].to_numpy()[unmapped]).to_csv(unmapped_out, sep="\t", index=False, header=first)
+                first = False
+                n_in += len(chunk)
+                n_unmapped += int(unmapped.sum())
+    finally:
+        if unmapped_out is not None:
+            unmapped_out.close()
+    print(f"Lifted {n_in - n_unmapped} of {n_in} variants to {output_file}; {n_unmapped} unmapped.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Lift the CHR/POS columns of GWAS summary statistics to another build with a UCSC chain file.")
+    parser.add_argument("input_file", help="Tab-delimited sumstats with CHR and POS columns (plain, gzip or BGZF)")
+    parser.add_argument("output_file", help="Lifted sumstats (written as BGZF if it ends in .gz or .bgz)")
+    parser.add_argument("chain_file", help="UCSC chain file, e.g. hg38ToHg19.over.chain.gz")
+    parser.add_argument("--unmapped_file", default=None, help="Write unmapped rows with the reason here.")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="Rows per chunk (default: 1000000).")
+    parser.add_argument("--threads", type=int, default=4, help="Number of threads compressing BGZF output blocks (default: 4).")
+
+    args = parser.parse_args()
+    liftover_file(args.input_file, args.output_file, args.chain_file, args.unmapped_file, args.chunksize, args.threads)
+
+if __name__ == "__main__":
+    main()
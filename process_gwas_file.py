@@ -2,6 +2,13 @@ import pysam
 import csv
 import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import dbsnp_index
+import liftover
+from sumstats_io import open_input, open_output
 
 # Cache opened tabix files per chromosome
 tabix_cache = {}
@@ -40,8 +47,8 @@ def get_rsid(vcf_dir, chrom, pos, ref=None, alt=None):
         return "NA"
     return "NA"
 
-def process_gwas_file(input_file, output_file, vcf_dir):
-    with open(input_file, 'r') as infile, open(output_file, 'w', newline='') as outfile:
+def process_gwas_file(input_file, output_file, vcf_dir, threads=4):
+    with open_input(input_file) as infile, open_output(output_file, threads) as outfile:
         reader = csv.reader(infile, delimiter='\t')
         writer = csv.writer(outfile, delimiter='\t')
 
@@ -60,14 +67,419 @@ def process_gwas_file(input_file, output_file, vcf_dir):
             except Exception as e:
                 writer.writerow([f"Error: {e}"] + other_data)
 
+def parse_variant_ids(input_file):
+    """
+    Parse the SNP IDs of an input GWAS file into per-chromosome lists of
+    (pos, row index, pos string, ref, alt) sorted by position.
+
+    Returns the per-chromosome lists, a dict of row index -> error string
+    for IDs that could not be parsed, and the number of data rows.
+    """
+    by_chrom = {}
+    errors = {}
+    idx = -1
+    with open_input(input_file) as infile:
+        reader = csv.reader(infile, delimiter='\t')
+        next(reader)
+        for idx, row in enumerate(reader):
+            try:
+                chrom, pos, allele_info = row[0].split(":")
+                ref, alt = allele_info.split("_")
+            except Exception as e:
+                errors[idx] = f"Error: {e}"
+                continue
+            try:
+                pos_int = int(pos)
+            except ValueError:
+                # get_rsid cannot fetch a non-integer position either
+                continue
+            by_chrom.setdefault(chrom, []).append((pos_int, idx, pos, ref, alt))
+
+    for variants in by_chrom.values():
+        variants.sort()
+    return by_chrom, errors, idx + 1
+
+def merge_chrom_rsids(vcf_dir, chrom, variants, rsids):
+    """
+    Walk one chromosome VCF once, sequentially, alongside the position-sorted
+    variants and fill in rsids[row index] for every match.
+
+    Matching follows get_rsid: the first VCF record at the same position whose
+    REF equals ref and whose ALT list contains alt wins.
+    """
+    try:
+        tabix_file = load_chrom_vcf(vcf_dir, chrom)
+    except Exception:
+        return
+    if chrom.startswith("chr"):
+        chrom = chrom[3:]
+
+    n_variants = len(variants)
+    i = 0
+    try:
+        records = tabix_file.fetch(chrom, variants[0][0] - 1, variants[-1][0])
+    except Exception:
+        return
+
+    for record in records:
+        fields = record.split('\t', 5)
+        vcf_pos = int(fields[1])
+
+        # Advance past variants that lie before the current record
+        while i < n_variants and variants[i][0] < vcf_pos:
+            i += 1
+        if i == n_variants:
+            break
+
+        # Check every variant sitting at this record's position
+        j = i
+        while j < n_variants and variants[j][0] == vcf_pos:
+            _, idx, pos, ref, alt = variants[j]
+            if rsids[idx] == "NA" and fields[1] == pos:
+                if ref and alt:
+                    if fields[3] == ref and alt in fields[4].split(','):
+                        rsids[idx] = fields[2]
+                else:
+                    rsids[idx] = fields[2]
+            j += 1
+
+def process_gwas_file_sorted(input_file, output_file, vcf_dir, threads=4):
+    """
+    Sorted-merge variant of process_gwas_file.
+
+    Sorts the input variants by chromosome and position, walks each
+    homo_sapiens_chr{N}.vcf.gz once instead of seeking per row, and writes
+    the same output as process_gwas_file in the original row order.
+    """
+    # Pass 1: collect and sort variant keys
+    by_chrom, errors, n_rows = parse_variant_ids(input_file)
+    print(f"Parsed {n_rows} variants on {len(by_chrom)} chromosomes.")
+
+    # Pass 2: merge each chromosome VCF against the sorted variants
+    rsids = ["NA"] * n_rows
+    for chrom, variants in by_chrom.items():
+        merge_chrom_rsids(vcf_dir, chrom, variants, rsids)
+    for idx, message in errors.items():
+        rsids[idx] = message
+
+    # Pass 3: write the output in the original row order
+    write_annotated(input_file, output_file, rsids, threads)
+
+def write_annotated(input_file, output_file, rsids, threads=4):
+    """
+    Re-read the input and write it with rsids[row index] in place of the SNP ID.
+    """
+    with open_input(input_file) as infile, open_output(output_file, threads) as outfile:
+        reader = csv.reader(infile, delimiter='\t')
+        writer = csv.writer(outfile, delimiter='\t')
+
+        header = next(reader)
+        writer.writerow(['rsID'] + header[1:])  # Drop original SNP ID
+
+        for idx, row in enumerate(reader):
+            writer.writerow([rsids[idx]] + row[1:])
+
+def init_worker():
+    # Forked workers must not share the parent's tabix handles; each opens its own
+    tabix_cache.clear()
+
+def annotate_shard(vcf_dir, chrom, variants):
+    """
+    Worker task: annotate one position-sorted shard and return {row index: rsID}.
+    """
+    rsids = {idx: "NA" for _, idx, _, _, _ in variants}
+    merge_chrom_rsids(vcf_dir, chrom, variants, rsids)
+    return rsids
+
+def make_shards(by_chrom, shard_size):
+    """
+    Split per-chromosome variant lists into shards of at most shard_size variants.
+    Shards of one chromosome cover consecutive position ranges.
+    """
+    shards = []
+    for chrom, variants in by_chrom.items():
+        for start in range(0, len(variants), shard_size):
+            shards.append((chrom, variants[start:start + shard_size]))
+    # Largest shards first so the pool does not end on a long straggler
+    shards.sort(key=lambda shard: len(shard[1]), reverse=True)
+    return shards
+
+def process_gwas_file_parallel(input_file, output_file, vcf_dir, workers, shard_size=500_000, threads=4):
+    """
+    Parallel variant of process_gwas_file_sorted.
+
+    Splits the variants by chromosome (and into row-range shards for large
+    chromosomes), annotates the shards in a process pool with one tabix
+    handle per worker, and writes the output in the original row order.
+    """
+    by_chrom, errors, n_rows = parse_variant_ids(input_file)
+    shards = make_shards(by_chrom, shard_size)
+    print(f"Parsed {n_rows} variants into {len(shards)} shards; annotating with {workers} workers.")
+
+    rsids = ["NA"] * n_rows
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        futures = [pool.submit(annotate_shard, vcf_dir, chrom, variants) for chrom, variants in shards]
+        for future in futures:
+            for idx, rsid in future.result().items():
+                rsids[idx] = rsid
+    for idx, message in errors.items():
+        rsids[idx] = message
+
+    write_annotated(input_file, output_file, rsids, threads)
+
+def split_variant_ids(snps):
+    """
+    Vectorized split of CHR:POS:REF_ALT IDs.
+
+    Returns a DataFrame with CHR, POS, REF, ALT and ERROR columns; ERROR holds
+    the same "Error: ..." text the per-row parser writes, or NA for valid IDs.
+    """
+    snps = pd.Series(snps, dtype=object).astype(str).reset_index(drop=True)
+    parts = snps.str.split(":", expand=True, n=3).reindex(columns=range(4))
+    n_parts = snps.str.count(":") + 1
+
+    alleles = parts[2].fillna("").str.split("_", expand=True, n=2).reindex(columns=range(3))
+    n_alleles = parts[2].fillna("").str.count("_") + 1
+
+    error = pd.Series(pd.NA, index=snps.index, dtype=object)
+    bad_alleles = (n_parts == 3) & (n_alleles != 2)
+    error[bad_alleles & (n_alleles < 2)] = "Error: not enough values to unpack (expected 2, got " + n_alleles.astype(str) + ")"
+    error[bad_alleles & (n_alleles > 2)] = "Error: too many values to unpack (expected 2)"
+    error[n_parts < 3] = "Error: not enough values to unpack (expected 3, got " + n_parts.astype(str) + ")"
+    error[n_parts > 3] = "Error: too many values to unpack (expected 3)"
+
+    return pd.DataFrame({
+        "CHR": parts[0],
+        "POS": parts[1],
+        "REF": alleles[0],
+        "ALT": alleles[1],
+        "ERROR": error,
+    })
+
+def annotate_chunk_indexed(snps, index_dir):
+    """
+    Look up rsIDs for a chunk of CHR:POS:REF_ALT IDs against the prebuilt dbSNP index.
+    """
+    variants = split_variant_ids(snps)
+    rsids = pd.Series("NA", index=variants.index, dtype=object)
+
+    ok = variants["ERROR"].isna()
+    pos = pd.to_numeric(variants["POS"].where(ok), errors="coerce")
+    ok &= pos.notna()
+
+    chroms = variants["CHR"].where(ok).map(dbsnp_index.normalize_chrom, na_action="ignore")
+    for chrom, rows in chroms[ok].groupby(chroms[ok]).groups.items():
+        index = dbsnp_index.load_chrom_index(index_dir, chrom)
+        numbers = dbsnp_index.lookup_chrom(
+            index,
+            pos[rows].to_numpy(dtype=np.int64),
+            variants.loc[rows, "REF"].to_numpy(),
+            variants.loc[rows, "ALT"].to_numpy(),
+        )
+        rsids[rows] = dbsnp_index.format_rsids(numbers)
+
+    failed = variants["ERROR"].notna()
+    rsids[failed] = variants.loc[failed, "ERROR"]
+    return rsids
+
+COMPLEMENT = str.maketrans("ACGTacgt", "TGCAtgca")
+
+# Allele orientations tried against the reference, in order of preference
+ALLELE_ORIENTATIONS = ("exact", "swapped", "flipped", "flipped_swapped")
+
+def harmonise_chunk(snps, index_dir):
+    """
+    Columnar harmonisation of a chunk of CHR:POS:REF_ALT IDs against the dbSNP index.
+
+    Alleles are matched as given, swapped, strand-flipped, or flipped and swapped.
+    Palindromic SNPs (A/T, C/G) are only accepted on an exact match, because a
+    swap and a strand flip cannot be told apart for them.
+
+    Returns a DataFrame with rsID, ALLELE_MATCH and REJECT (a reason, or NA) columns.
+    """
+    variants = split_variant_ids(snps)
+    n = len(variants)
+    rsid_numbers = np.zeros(n, dtype=np.uint64)
+    allele_match = np.full(n, None, dtype=object)
+    reject = np.full(n, None, dtype=object)
+
+    malformed = variants["ERROR"].notna().to_numpy()
+    reject[malformed] = "malformed_id"
+
+    pos = pd.to_numeric(variants["POS"].where(~malformed), errors="coerce")
+    bad_pos = ~malformed & pos.isna().to_numpy()
+    reject[bad_pos] = "invalid_position"
+
+    ref = variants["REF"].fillna("").str.upper()
+    alt = variants["ALT"].fillna("").str.upper()
+    bad_alleles = ~malformed & ~bad_pos & ~(ref.str.fullmatch(r"[ACGTN]+") & alt.str.fullmatch(r"[ACGTN]+")).to_numpy()
+    reject[bad_alleles] = "invalid_alleles"
+
+    # Reverse complement handles both SNPs and indel alleles
+    ref_flip = ref.str.translate(COMPLEMENT).str[::-1]
+    alt_flip = alt.str.translate(COMPLEMENT).str[::-1]
+    palindromic = (ref == alt_flip).to_numpy()
+
+    orientations = {
+        "exact": (ref, alt),
+        "swapped": (alt, ref),
+        "flipped": (ref_flip, alt_flip),
+        "flipped_swapped": (alt_flip, ref_flip),
+    }
+
+    ambiguous = np.zeros(n, dtype=bool)
+    ok = pd.Series(pd.isna(reject), index=variants.index)
+    chroms = variants["CHR"].where(ok).map(dbsnp_index.normalize_chrom, na_action="ignore")
+    for chrom, rows in chroms[ok].groupby(chroms[ok]).groups.items():
+        rows = np.asarray(rows)
+        index = dbsnp_index.load_chrom_index(index_dir, chrom)
+        for orientation in ALLELE_ORIENTATIONS:
+            pending = rows[rsid_numbers[rows] == 0]
+            if orientation != "exact":
+                pending = pending[~palindromic[pending]]
+            if len(pending) == 0:
+                break
+            a1, a2 = orientations[orientation]
+            numbers = dbsnp_index.lookup_chrom(index, pos.to_numpy()[pending].astype(np.int64), a1.to_numpy()[pending], a2.to_numpy()[pending])
+            hit = numbers > 0
+            rsid_numbers[pending[hit]] = numbers[hit]
+            allele_match[pending[hit]] = orientation
+
+        # Palindromic SNPs that only match swapped are ambiguous rather than absent
+        pending = rows[(rsid_numbers[rows] == 0) & palindromic[rows]]
+        if len(pending):
+            numbers = dbsnp_index.lookup_chrom(index, pos.to_numpy()[pending].astype(np.int64), alt.to_numpy()[pending], ref.to_numpy()[pending])
+            ambiguous[pending[numbers > 0]] = True
+
+    unresolved = pd.isna(reject) & (rsid_numbers == 0)
+    reject[unresolved & ambiguous] = "ambiguous_palindromic"
+    reject[unresolved & ~ambiguous] = "not_in_reference"
+
+    return pd.DataFrame({
+        "rsID": dbsnp_index.format_rsids(rsid_numbers),
+        "ALLELE_MATCH": allele_match,
+        "REJECT": reject,
+    })
+
+def lift_variant_ids(snps, chain):
+    """
+    Lift a chunk of CHR:POS:REF_ALT IDs to the target build of a liftover.ChainMap.
+
+    Returns (lifted IDs, unmapped reasons); malformed and unmapped IDs keep their
+    original text and get an unmapped reason (NA for lifted IDs).
+    """
+    variants = split_variant_ids(snps)
+    ok = variants["ERROR"].isna()
+    pos = pd.to_numeric(variants["POS"].where(ok), errors="coerce")
+    ok &= pos.notna()
+
+    ids = pd.Series(snps, dtype=object).astype(str).reset_index(drop=True)
+    reason = pd.Series(pd.NA, index=ids.index, dtype=object)
+    rows = np.flatnonzero(ok.to_numpy())
+    if len(rows):
+        lifted = liftover.lift_frame(
+            chain,
+            variants["CHR"].to_numpy()[rows],
+            pos.to_numpy()[rows].astype(np.int64),
+            variants["REF"].to_numpy()[rows],
+            variants["ALT"].to_numpy()[rows],
+        )
+        mapped = lifted["UNMAPPED"].isna().to_numpy()
+        ids[rows[mapped]] = (
+            lifted["CHR"][mapped] + ":" + lifted["POS"][mapped].astype(str) + ":" + lifted["REF"][mapped] + "_" + lifted["ALT"][mapped]
+        ).to_numpy()
+        reason[rows[~mapped]] = lifted["UNMAPPED"].to_numpy()[~mapped]
+    return ids, reason
+
+def process_gwas_file_indexed(input_file, output_file, index_dir, chunksize=1_000_000, threads=4, rejects_file=None, chain_file=None):
+    """
+    Annotate a GWAS file in chunks using vectorized lookups against the
+    memory-mapped dbSNP index built by dbsnp_index.py.
+
+    If rejects_file is given, alleles are harmonised against the reference
+    (see harmonise_chunk): the output gains an ALLELE_MATCH column, and rows
+    that cannot be resolved are written to rejects_file (ROW, SNP, REASON)
+    instead of the output.
+
+    If chain_file is given, variant IDs are first lifted to the build of the
+    index (see liftover.py); unmapped variants get "Error: liftover <reason>"
+    as rsID, or are rejected with reason liftover_<reason>.
+    """
+    chain = liftover.ChainMap(chain_file) if chain_file else None
+    rejects = open_output(rejects_file, threads) if rejects_file else None
+    n_rejected = 0
+    row_offset = 0
+    try:
+        with open_input(input_file) as infile, open_output(output_file, threads) as outfile:
+            reader = pd.read_csv(infile, sep="\t", dtype=str, keep_default_na=False, chunksize=chunksize)
+            first = True
+            for chunk in reader:
+                snp_col = chunk.columns[0]
+                out = chunk.drop(columns=snp_col)
+                snps = chunk[snp_col]
+                unmapped = None
+                if chain is not None:
+                    snps, unmapped = lift_variant_ids(snps, chain)
+                if rejects is None:
+                    rsids = annotate_chunk_indexed(snps, index_dir)
+                    if unmapped is not None:
+                        rsids = rsids.where(unmapped.isna(), "Error: liftover " + unmapped.astype(str))
+                    out.insert(0, "rsID", rsids.to_numpy())
+                else:
+                    harmonised = harmonise_chunk(snps, index_dir)
+                    if unmapped is not None:
+                        harmonised["REJECT"] = harmonised["REJECT"].where(unmapped.isna(), "liftover_" + unmapped.astype(str))
+                    rejected = harmonised["REJECT"].notna().to_numpy()
+                    pd.DataFrame({
+                        "ROW": np.flatnonzero(rejected) + row_offset + 1,
+                        "SNP": chunk[snp_col].to_numpy()[rejected],
+                        "REASON": harmonised["REJECT"].to_numpy()[rejected],
+                    }).to_csv(rejects, sep="\t", index=False, header=first)
+                    n_rejected += int(rejected.sum())
+
+                    out.insert(0, "rsID", harmonised["rsID"].to_numpy())
+                    out.insert(1, "ALLELE_MATCH", harmonised["ALLELE_MATCH"].to_numpy())
+                    out = out[~rejected]
+                row_offset += len(chunk)
+                # Match csv.writer's default '\r\n' line terminator of the tabix path
+                out.to_csv(outfile, sep="\t", index=False, header=first, lineterminator="\r\n")
+                first = False
+    finally:
+        if rejects is not None:
+            rejects.close()
+
+    if rejects is not None:
+        print(f"Harmonised {row_offset - n_rejected} of {row_offset} variants; {n_rejected} rejects written to {rejects_file}.")
+
 def main():
     parser = argparse.ArgumentParser(description="Convert CHR:POS:REF_ALT to rsID using chromosome-split dbSNP VCFs.")
-    parser.add_argument("input_file", help="Input GWAS file with SNPs in CHR:POS:REF_ALT format")
-    parser.add_argument("output_file", help="Output file with rsIDs")
-    parser.add_argument("vcf_dir", help="Directory containing chromosome-specific VCF files (e.g., homo_sapiens_chr1.vcf.gz)")
+    parser.add_argument("input_file", help="Input GWAS file with SNPs in CHR:POS:REF_ALT format (plain, gzip or BGZF)")
+    parser.add_argument("output_file", help="Output file with rsIDs (written as BGZF if it ends in .gz or .bgz)")
+    parser.add_argument("vcf_dir", nargs="?", default=None, help="Directory containing chromosome-specific VCF files (e.g., homo_sapiens_chr1.vcf.gz)")
+    parser.add_argument("--index_dir", default=None, help="Directory with the dbSNP index built by dbsnp_index.py; replaces the tabix lookups.")
+    parser.add_argument("--rejects_file", default=None, help="With --index_dir: harmonise alleles against the reference and write unresolved rows here instead of the output.")
+    parser.add_argument("--chain", default=None, help="With --index_dir: UCSC chain file to lift variant IDs to the build of the index before annotation (e.g. hg38ToHg19.over.chain.gz).")
+    parser.add_argument("--sorted", action="store_true", help="Sort variants and walk each chromosome VCF once instead of one tabix lookup per row.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes for sorted-merge annotation (default: 1).")
+    parser.add_argument("--threads", type=int, default=4, help="Number of threads compressing BGZF output blocks (default: 4).")
+    parser.add_argument("--shard_size", type=int, default=500_000, help="Maximum number of variants per worker shard (default: 500000).")
 
     args = parser.parse_args()
-    process_gwas_file(args.input_file, args.output_file, args.vcf_dir)
+    if args.index_dir is None and args.vcf_dir is None:
+        parser.error("either vcf_dir or --index_dir is required")
+    if args.rejects_file and not args.index_dir:
+        parser.error("--rejects_file requires --index_dir")
+    if args.chain and not args.index_dir:
+        parser.error("--chain requires --index_dir")
+
+    if args.index_dir:
+        process_gwas_file_indexed(args.input_file, args.output_file, args.index_dir, threads=args.threads, rejects_file=args.rejects_file, chain_file=args.chain)
+    elif args.workers > 1:
+        process_gwas_file_parallel(args.input_file, args.output_file, args.vcf_dir, args.workers, args.shard_size, args.threads)
+    elif args.sorted:
+        process_gwas_file_sorted(args.input_file, args.output_file, args.vcf_dir, args.threads)
+    else:
+        process_gwas_file(args.input_file, args.output_file, args.vcf_dir, args.threads)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# Vectorized bootstrap confidence intervals for PRS evaluation metrics.
+# Resamples are drawn once per block of replicates as a (replicates x samples) matrix of
+# resample counts, so every metric is a weighted statistic of the full data:
+#   R^2 / incremental R^2  weighted normal equations, batched over replicates
+#   pseudo-R^2 (McFadden)  batched Newton-Raphson logistic fits
+#   AUC                    weighted Mann-Whitney statistic from one sort per PRS column
+# Replicate blocks are spread over a process pool; block seeds are derived from one
+# fixed seed, so results do not depend on the number of workers.
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from prs_table_io import expand_columns, read_table, table_columns, write_table
+
+METRICS = ("r2", "incremental_r2", "pseudo_r2", "auc")
+
+# Data shared with pool workers (set once per worker by init_worker)
+_shared = {}
+
+def replicate_counts(n, n_reps, rng):
+    """
+    Draw n_reps bootstrap resamples of n rows as a (n_reps x n) float matrix of resample counts.
+    """
+    idx = rng.integers(0, n, size=(n_reps, n))
+    return np.stack([np.bincount(row, minlength=n) for row in idx]).astype(np.float64)
+
+def weighted_r2(Wt, C, y, X):
+    """
+    Full-model and covariate-only R^2 of y ~ C + x for every PRS column x of X,
+    for every weight row of Wt. C must contain an intercept column.
+
+    Returns (r2_full, r2_null) arrays of shape (replicates x PRS columns).
+    """
+    n_reps, p = Wt.shape[0], C.shape[1]
+    # Covariate cross-products per replicate: C'WC, C'Wy, C'WX
+    CC = (Wt @ (C[:, :, None] * C[:, None, :]).reshape(len(y), p * p)).reshape(n_reps, p, p)
+    Cy = Wt @ (C * y[:, None])
+    CX = np.stack([Wt @ (C[:, [j]] * X) for j in range(p)], axis=1)
+
+    G_Cy = np.linalg.solve(CC, Cy[:, :, None])[:, :, 0]
+    G_CX = np.linalg.solve(CC, CX)
+
+    w_sum = Wt.sum(axis=1)
+    yy = Wt @ (y * y)
+    tss = yy - (Wt @ y) ** 2 / w_sum
+
+    yy_r = yy - np.einsum("bp,bp->b", Cy, G_Cy)
+    xx_r = Wt @ (X * X) - np.einsum("bpk,bpk->bk", CX, G_CX)
+    xy_r = Wt @ (X * y[:, None]) - np.einsum("bpk,bp->bk", CX, G_Cy)
+
+    rss = yy_r[:, None] - xy_r ** 2 / xx_r
+    r2_full = 1 - rss / tss[:, None]
+    r2_null = np.broadcast_to((1 - yy_r / tss)[:, None], r2_full.shape)
+    return r2_full, r2_null
+
+def weighted_auc(Wt, y, X):
+    """
+    AUC of every PRS column for every weight row, from one sort per column
+    (Mann-Whitney form, ties counted as one half).
+    """
+    case = y == 1
+    out = np.empty((Wt.shape[0], X.shape[1]))
+    for k in range(X.shape[1]):
+        order = np.argsort(X[:, k], kind="mergesort")
+        x_sorted = X[order, k]
+        w_case = Wt[:, order] * case[order]
+        w_ctrl = Wt[:, order] * ~case[order]
+
+        # Tie groups in the sorted scores
+        starts = np.r_[True, x_sorted[1:] != x_sorted[:-1]]
+        group = np.cumsum(starts) - 1
+        first = np.flatnonzero(starts)
+        last = np.r_[first[1:], len(x_sorted)] - 1
+
+        ctrl_cum = np.cumsum(w_ctrl, axis=1)
+        ctrl_before = np.concatenate([np.zeros((Wt.shape[0], 1)), ctrl_cum], axis=1)[:, first][:, group]
+        ctrl_tied = ctrl_cum[:, last][:, group] - ctrl_before
+
+        wins = (w_case * (ctrl_before + 0.5 * ctrl_tied)).sum(axis=1)
+        out[:, k] = wins / (w_case.sum(axis=1) * w_ctrl.sum(axis=1))
+    return out
+
+def weighted_pseudo_r2(Wt, y, X, n_iter=25):
+    """
+    McFadden pseudo-R^2 of logistic y ~ x for every PRS column and weight row,
+    fitted with Newton-Raphson batched over replicates.
+    """
+    eps = 1e-12
+    w_sum = Wt.sum(axis=1)
+    p0 = np.clip((Wt @ y) / w_sum, eps, 1 - eps)
+    ll_null = (Wt @ y) * np.log(p0) + (w_sum - Wt @ y) * np.log(1 - p0)
+
+    out = np.empty((Wt.shape[0], X.shape[1]))
+    for k in range(X.shape[1]):
+        x = X[:, k]
+        a = np.log(p0 / (1 - p0))
+        b = np.zeros(Wt.shape[0])
+        for _ in range(n_iter):
+            prob = 1 / (1 + np.exp(-(a[:, None] + b[:, None] * x[None, :])))
+            resid = Wt * (y[None, :] - prob)
+            curv = Wt * prob * (1 - prob)
+            g0, g1 = resid.sum(axis=1), resid @ x
+            h00, h01, h11 = curv.sum(axis=1), curv @ x, curv @ (x * x)
+            det = h00 * h11 - h01 ** 2
+            a = a + (h11 * g0 - h01 * g1) / det
+            b = b + (h00 * g1 - h01 * g0) / det
+        prob = np.clip(1 / (1 + np.exp(-(a[:, None] + b[:, None] * x[None, :]))), eps, 1 - eps)
+        ll_full = (Wt * (y[None, :] * np.log(prob) + (1 - y[None, :]) * np.log(1 - prob))).sum(axis=1)
+        out[:, k] = 1 - ll_full / ll_null
+    return out
+
+def compute_metrics(Wt, y, X, C, metrics):
+    """
+    Compute the requested metrics for every weight row of Wt.
+    """
+    results = {}
+    if "r2" in metrics or "incremental_r2" in metrics:
+        r2_full, r2_null = weighted_r2(Wt, C, y, X)
+        results["r2"] = r2_full
+        results["incremental_r2"] = r2_full - r2_null
+    if "auc" in metrics:
+        results["auc"] = weighted_auc(Wt, y, X)
+    if "pseudo_r2" in metrics:
+        results["pseudo_r2"] = weighted_pseudo_r2(Wt, y, X)
+    return {name: results[name] for name in metrics}
+
+def init_worker(y, X, C, metrics):
+    _shared.update(y=y, X=X, C=C, metrics=metrics)
+
+def run_block(seed, n_reps):
+    rng = np.random.default_rng(seed)
+    Wt = replicate_counts(len(_shared["y"]), n_reps, rng)
+    return compute_metrics(Wt, _shared["y"], _shared["X"], _shared["C"], _shared["metrics"])
+
+def bootstrap(y, X, C=None, metrics=("r2",), n_boot=1000, seed=12345, workers=1, block_size=50):
+    """
+    Bootstrap the requested metrics for every column of X.
+
+    Args:
+        y (np.ndarray): Phenotype (0/1 for auc and pseudo_r2).
+        X (np.ndarray): (samples x PRS columns) scores.
+        C (np.ndarray): Covariate design including an intercept (default: intercept only).
+        metrics (tuple): Any of METRICS.
+        n_boot (int): Number of bootstrap replicates.
+        seed (int): Seed; replicate blocks get fixed child seeds derived from it.
+        workers (int): Number of processes.
+        block_size (int): Replicates per block.
+
+    Returns:
+        dict: metric -> (n_boot x PRS columns) array of replicate values.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    X = np.asarray(X, dtype=np.float64).reshape(len(y), -1)
+    C = np.ones((len(y), 1)) if C is None else np.asarray(C, dtype=np.float64)
+    metrics = tuple(metrics)
+
+    sizes = [min(block_size, n_boot - start) for start in range(0, n_boot, block_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(y, X, C, metrics)) as pool:
+            blocks = list(pool.map(run_block, seeds, sizes))
+    else:
+        init_worker(y, X, C, metrics)
+        blocks = [run_block(s, size) for s, size in zip(seeds, sizes)]
+
+    return {name: np.concatenate([block[name] for block in blocks]) for name in metrics}
+
+def point_estimates(y, X, C=None, metrics=("r2",)):
+    """
+    Metrics on the original sample (all weights one), computed with the same code as the replicates.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    X = np.asarray(X, dtype=np.float64).reshape(len(y), -1)
+    C = np.ones((len(y), 1)) if C is None else np.asarray(C, dtype=np.float64)
+    return {name: values[0] for name, values in compute_metrics(np.ones((1, len(y))), y, X, C, tuple(metrics)).items()}
+
+def confidence_intervals(y, X, prs_cols, C=None, metrics=("r2",), n_boot=1000, seed=12345, workers=1, alpha=0.05):
+    """
+    Point estimates and percentile bootstrap CIs as a long table (one row per PRS x metric).
+    """
+    point = point_estimates(y, X, C, metrics)
+    reps = bootstrap(y, X, C, metrics, n_boot, seed, workers)
+    rows = []
+    for name in metrics:
+        low, high = np.nanpercentile(reps[name], [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+        for k, col in enumerate(prs_cols):
+            rows.append({
+                "PRS Column": col,
+                "Metric": name,
+                "Estimate": point[name][k],
+                "CI Lower": low[k],
+                "CI Upper": high[k],
+                "Bootstrap SE": np.nanstd(reps[name][:, k], ddof=1),
+                "Replicates": n_boot,
+            })
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals for PRS R^2, pseudo-R^2 and AUC.")
+    parser.add_argument("input_file", help="Merged PRS/phenotype file (CSV, TSV, Parquet or Arrow).")
+    parser.add_argument("phenotype_col", help="Phenotype column (-9 is treated as missing).")
+    parser.add_argument("prs_cols", help="Comma-separated PRS columns or patterns (e.g. 'SCORE1_AVG_*_std').")
+    parser.add_argument("--covariates", nargs="*", default=None, help="Covariate columns for (incremental) R^2.")
+    parser.add_argument("--metrics", nargs="*", choices=METRICS, default=None, help="Metrics to bootstrap (default: r2/incremental_r2 for continuous, auc/pseudo_r2 for binary phenotypes).")
+    parser.add_argument("--n_boot", type=int, default=1000, help="Number of bootstrap replicates (default: 1000).")
+    parser.add_argument("--seed", type=int, default=12345, help="Random seed (default: 12345).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (default: 1).")
+    parser.add_argument("--delimiter", default=",", help="Delimiter for text input (default: ',').")
+    parser.add_argument("--output_file", default=None, help="Path to save the CI table.")
+
+    args = parser.parse_args()
+
+    from prs_heritability import covariate_design
+
+    prs_cols = expand_columns(args.prs_cols, table_columns(args.input_file, sep=args.delimiter))
+    data = read_table(args.input_file, columns=[args.phenotype_col] + prs_cols + (args.covariates or []), sep=args.delimiter)
+    data[args.phenotype_col] = data[args.phenotype_col].replace(-9, np.nan)
+    data = data.dropna()
+
+    is_binary = data[args.phenotype_col].nunique() == 2
+    metrics = args.metrics or (("auc", "pseudo_r2") if is_binary else ("r2", "incremental_r2"))
+    y = data[args.phenotype_col]
+    if is_binary:
+        y = pd.Categorical(y).codes
+
+    results = confidence_intervals(
+        y, data[prs_cols].to_numpy(), prs_cols,
+        C=covariate_design(data, args.covariates),
+        metrics=metrics, n_boot=args.n_boot, seed=args.seed, workers=args.workers,
+    )
+    print(results.to_string(index=False))
+    if args.output_file:
+        write_table(results, args.output_file)
+        print(f"Bootstrap results saved to {args.output_file}")
+
+if __name__ == "__main__":
+    main()
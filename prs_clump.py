@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# Native LD clumping against a PLINK 1 binary target (.bed/.bim/.fam), as done by PRSice-2
+# and plink --clump: SNPs are visited in p-value order, each unclumped SNP becomes an index
+# SNP and removes the unclumped SNPs within --clump_kb whose r^2 with it is >= --clump_r2.
+# The .bed is memory-mapped; genotypes are turned into bit planes (dosage >= 1, dosage == 2,
+# non-missing) packed in 64-bit words, so r^2 over the pairwise non-missing samples comes
+# from popcounts of ANDed words. r^2 is only computed inside the window, encoded variants
+# are kept in an LRU cache, and chromosomes are clumped in parallel processes.
+# The clumped SNP list is written once per GWAS and reused by every threshold and scorer
+# (e.g. PRSice-2 --extract <out>.snplist --no-clump).
+
+import argparse
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from prs_score_bed import load_bim, load_fam, open_bed
+from prs_sumstats_ingest import detect_columns
+from prs_table_io import read_table, table_columns
+
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+
+def plane_mask(n_samples):
+    """
+    Byte mask with the low bit of every real sample set (padding samples of the last byte cleared).
+    """
+    n_bytes = (n_samples + 3) // 4
+    words = (n_bytes + 7) // 8
+    mask = np.zeros(words * 8, dtype=np.uint8)
+    mask[:n_bytes] = 0x55
+    if n_samples % 4:
+        mask[n_bytes - 1] = 0x55 & ((1 << (2 * (n_samples % 4))) - 1)
+    return mask
+
+class BitGenotypes:
+    """
+    Bit-plane encoding of target variants with an LRU cache bounded in bytes.
+    """
+
+    def __init__(self, bed, n_samples, cache_bytes=1024 ** 3):
+        self.bed = bed
+        self.mask = plane_mask(n_samples)
+        self.cache = OrderedDict()
+        self.cache_bytes = cache_bytes
+        self.variant_bytes = 3 * len(self.mask)
+
+    def encode(self, rows):
+        """
+        (x1, x2, v) uint64 arrays of shape (len(rows), words): dosage >= 1, dosage == 2 and
+        non-missing, one bit per sample. PLINK codes: 00 hom A1, 01 missing, 10 het, 11 hom A2.
+        """
+        packed = np.zeros((len(rows), len(self.mask)), dtype=np.uint8)
+        packed[:, :self.bed.shape[1]] = self.bed[rows]
+        lo = packed & 0x55
+        hi = (packed >> 1) & 0x55
+        x1 = (lo ^ 0x55) & self.mask
+        x2 = ((lo | hi) ^ 0x55) & self.mask
+        v = ((lo ^ 0x55) | hi) & self.mask
+        return tuple(plane.view(np.uint64) for plane in (x1, x2, v))
+
+    def get(self, rows):
+        """
+        Encoded planes of the given .bed rows, from the cache where possible.
+        """
+        missing = []
+        for row in rows:
+            if row in self.cache:
+                # Mark as recently used before anything is evicted
+                self.cache.move_to_end(row)
+            else:
+                missing.append(row)
+        if missing:
+            x1, x2, v = self.encode(np.asarray(missing))
+            for k, row in enumerate(missing):
+                self.cache[row] = (x1[k], x2[k], v[k])
+            # The requested rows are now the most recent ones, so only other rows are evicted
+            while len(self.cache) * self.variant_bytes > self.cache_bytes and len(self.cache) > len(rows):
+                self.cache.popitem(last=False)
+        return tuple(np.stack(plane) for plane in zip(*(self.cache[row] for row in rows)))
+
+def popcount(words):
+    return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+
+def r2_with(index_planes, planes):
+    """
+    r^2 between one variant and each of a set of variants, over pairwise non-missing samples.
+    """
+    x1i, x2i, vi = index_planes
+    x1, x2, v = planes
+    n = popcount(v & vi)
+    # Sums of dosages (x1 + x2) and squared dosages (x1 + 3 x2) where both are non-missing
+    c1i, c2i = popcount(x1i & v), popcount(x2i & v)
+    c1, c2 = popcount(x1 & vi), popcount(x2 & vi)
+    si, sj = c1i + c2i, c1 + c2
+    sii, sjj = c1i + 3 * c2i, c1 + 3 * c2
+    sij = popcount(x1i & x1) + popcount(x1i & x2) + popcount(x2i & x1) + popcount(x2i & x2)
+
+    cov = n * sij - si * sj
+    var_i = n * sii - si ** 2
+    var_j = n * sjj - sj ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = cov.astype(np.float64) ** 2 / (var_i.astype(np.float64) * var_j)
+    return np.nan_to_num(r2)
+
+def match_alleles(base, keep_ambiguous=False):
+    """
+    Keep base SNPs whose alleles match the target (either orientation, or strand-flipped);
+    ambiguous A/T and C/G SNPs are dropped unless keep_ambiguous.
+    """
+    if "A1" not in base or "A2" not in base:
+        return base
+    a1, a2 = base["A1"].str.upper(), base["A2"].str.upper()
+    t1, t2 = base["BIM_A1"].str.upper(), base["BIM_A2"].str.upper()
+    f1, f2 = a1.str.translate(COMPLEMENT), a2.str.translate(COMPLEMENT)
+    same = ((a1 == t1) & (a2 == t2)) | ((a1 == t2) & (a2 == t1))
+    flipped = ((f1 == t1) & (f2 == t2)) | ((f1 == t2) & (f2 == t1))
+    keep = same | flipped
+    if not keep_ambiguous:
+        keep &= a1 != f2
+    return base[keep]
+
+def clump_chrom(bfile, chrom, base, clump_kb=500, clump_r2=0.2, clump_p1=1.0, clump_p2=1.0, keep_ambiguous=False, cache_bytes=1024 ** 3):
+    """
+    Clump the base SNPs of one chromosome against one PLINK fileset.
+
+    Returns a DataFrame with one row per index SNP: CHR, SNP, BP, P and TOTAL (SNPs clumped to it).
+    """
+    bim = load_bim(bfile)
+    fam = load_fam(bfile)
+    bed = open_bed(bfile, len(fam), len(bim))
+
+    on_chrom = bim[bim["CHR"].astype(str).str.replace("chr", "", regex=False) == str(chrom)]
+    on_chrom = on_chrom[~on_chrom["SNP"].duplicated(keep=False)]
+    snps = base.merge(
+        pd.DataFrame({"SNP": on_chrom["SNP"], "ROW": on_chrom.index, "BP": on_chrom["BP"], "BIM_A1": on_chrom["A1"], "BIM_A2": on_chrom["A2"]}),
+        on="SNP",
+    )
+    snps = match_alleles(snps, keep_ambiguous)
+    snps = snps[snps["P"] <= clump_p2].sort_values("BP", kind="stable").reset_index(drop=True)
+    if snps.empty:
+        return pd.DataFrame(columns=["CHR", "SNP", "BP", "P", "TOTAL"])
+
+    bp = snps["BP"].to_numpy(dtype=np.int64)
+    p = snps["P"].to_numpy(dtype=np.float64)
+    rows = snps["ROW"].to_numpy(dtype=np.int64)
+    window = clump_kb * 1000
+    lo = np.searchsorted(bp, bp - window, side="left")
+    hi = np.searchsorted(bp, bp + window, side="right")
+
+    genotypes = BitGenotypes(bed, len(fam), cache_bytes)
+    available = np.ones(len(snps), dtype=bool)
+    index_snps, totals = [], []
+    for i in np.lexsort((bp, p)):
+        if not available[i] or p[i] > clump_p1:
+            continue
+        available[i] = False
+        candidates = lo[i] + np.flatnonzero(available[lo[i]:hi[i]])
+        n_clumped = 0
+        if len(candidates):
+            planes = genotypes.get(np.append(rows[candidates], rows[i]).tolist())
+            index_planes = tuple(plane[-1] for plane in planes)
+            r2 = r2_with(index_planes, tuple(plane[:-1] for plane in planes))
+            clumped = candidates[r2 >= clump_r2]
+            available[clumped] = False
+            n_clumped = len(clumped)
+        index_snps.append(i)
+        totals.append(n_clumped)
+
+    out = snps.loc[index_snps, ["SNP", "BP", "P"]].assign(CHR=str(chrom), TOTAL=totals)
+    return out[["CHR", "SNP", "BP", "P", "TOTAL"]]
+
+def load_base(sumstats_file, delimiter="\t", min_maf=None):
+    """
+    Base SNPs with SNP, P and, if present, A1/A2 columns; optionally MAF-filtered.
+    """
+    mapping = detect_columns(table_columns(sumstats_file, sep=delimiter), required=["SNP", "P"])
+    names = [col for col in ("SNP", "A1", "A2", "P", "FREQ", "MAF") if col in mapping]
+    base = read_table(sumstats_file, columns=[mapping[col] for col in names], sep=delimiter)
+    base = base.rename(columns={mapping[col]: col for col in names})
+    base["SNP"] = base["SNP"].astype(str)
+    base["P"] = pd.to_numeric(base["P"], errors="coerce")
+    base = base.dropna(subset=["P"]).drop_duplicates("SNP", keep=False)
+    if min_maf is not None and ("MAF" in base or "FREQ" in base):
+        if "MAF" in base:
+            maf = pd.to_numeric(base["MAF"], errors="coerce")
+        else:
+            freq = pd.to_numeric(base["FREQ"], errors="coerce")
+            maf = np.minimum(freq, 1 - freq)
+        base = base[maf >= min_maf]
+    return base.drop(columns=["FREQ", "MAF"], errors="ignore")
+
+def target_filesets(target, chroms):
+    """
+    (chromosome, PLINK prefix) pairs; '#' in the target prefix is replaced by the chromosome.
+    """
+    if "#" in target:
+        return [(chrom, target.replace("#", str(chrom))) for chrom in chroms if os.path.exists(target.replace("#", str(chrom)) + ".bed")]
+    return [(chrom, target) for chrom in chroms]
+
+def clump(sumstats_file, target, out_prefix, clump_kb=500, clump_r2=0.2, clump_p1=1.0, clump_p2=1.0, min_maf=None,
+          keep_ambiguous=False, chroms=None, workers=1, delimiter="\t", cache_gb=1.0):
+    """
+    Clump a GWAS against a target genotype set, one process per chromosome.
+
+    Writes <out_prefix>.clumped (CHR, SNP, BP, P, TOTAL) and <out_prefix>.snplist (index SNPs).
+    """
+    base = load_base(sumstats_file, delimiter, min_maf)
+    chroms = chroms or list(range(1, 23))
+    filesets = target_filesets(target, chroms)
+    print(f"Clumping {len(base)} base SNPs over {len(filesets)} chromosomes "
+          f"({clump_kb} kb, r2 {clump_r2}, p1 {clump_p1}) with {workers} workers...")
+
+    cache_bytes = int(cache_gb * 1024 ** 3)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(clump_chrom, bfile, chrom, base, clump_kb, clump_r2, clump_p1, clump_p2, keep_ambiguous, cache_bytes)
+            for chrom, bfile in filesets
+        ]
+        parts = [future.result() for future in futures]
+
+    clumped = pd.concat(parts, ignore_index=True)
+    clumped.to_csv(f"{out_prefix}.clumped", sep="\t", index=False)
+    clumped["SNP"].to_csv(f"{out_prefix}.snplist", index=False, header=False)
+    print(f"{len(clumped)} index SNPs written to {out_prefix}.clumped and {out_prefix}.snplist")
+    return clumped
+
+def main():
+    parser = argparse.ArgumentParser(description="Clump GWAS summary statistics against a PLINK .bed target (p-value ordered, windowed r^2).")
+    parser.add_argument("--base", required=True, help="GWAS sumstats with SNP and P (A1/A2 for allele checks) columns; TSV, Parquet or Arrow.")
+    parser.add_argument("--target", required=True, help="PLINK prefix of the target; '#' is replaced by the chromosome number.")
+    parser.add_argument("--out", required=True, help="Output prefix (<out>.clumped, <out>.snplist).")
+    parser.add_argument("--clump_kb", type=float, default=500, help="Clumping window in kb (default: 500).")
+    parser.add_argument("--clump_r2", type=float, default=0.2, help="r^2 threshold (default: 0.2).")
+    parser.add_argument("--clump_p1", type=float, default=1.0, help="P-value threshold for index SNPs (default: 1).")
+    parser.add_argument("--clump_p2", type=float, default=1.0, help="P-value threshold for clumped SNPs (default: 1).")
+    parser.add_argument("--min_maf", type=float, default=None, help="Minimum base MAF (FREQ/MAF column), like PRSice --base-maf.")
+    parser.add_argument("--keep_ambiguous", action="store_true", help="Keep ambiguous A/T and C/G SNPs.")
+    parser.add_argument("--chrom", nargs="*", default=None, help="Chromosomes (default: 1-22).")
+    parser.add_argument("--workers", type=int, default=1, help="Chromosomes clumped in parallel (default: 1).")
+    parser.add_argument("--cache_gb", type=float, default=1.0, help="Encoded genotype cache per worker in GB (default: 1).")
+    parser.add_argument("--delimiter", default="\t", help="Delimiter of a text base file (default: tab).")
+
+    args = parser.parse_args()
+    clump(
+        args.base, args.target, args.out, args.clump_kb, args.clump_r2, args.clump_p1, args.clump_p2, args.min_maf,
+        args.keep_ambiguous, args.chrom, args.workers, args.delimiter, args.cache_gb,
+    )
+
+if __name__ == "__main__":
+    main()
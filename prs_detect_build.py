@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# Offline genome build detection for GWAS summary statistics.
+# A few thousand variants are sampled from the sumstats and their positions and alleles are
+# looked up in memory-mapped GRCh37 and GRCh38 marker tables (dbsnp_index.py layout: a full
+# dbSNP index per build, or a compact marker table cut from it with the 'table' command).
+# The build whose table explains most sampled variants is reported with a confidence score.
+# Sampling never reads the whole file: BGZF and plain text files are sampled at random
+# offsets (one block read per offset); plain gzip, which cannot be seeked, is reservoir
+# sampled over its first --max_lines lines.
+
+import argparse
+import json
+import os
+import random
+import re
+import struct
+import sys
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import dbsnp_index
+from prs_sumstats_ingest import detect_columns
+from sumstats_io import BGZF_HEADER, is_gzipped, open_input
+
+WINDOW = 64 * 1024
+
+def reservoir_add(reservoir, seen, line, n_sample, rng):
+    """
+    Algorithm R: keep a uniform sample of n_sample lines out of the seen + 1 lines offered.
+    """
+    if len(reservoir) < n_sample:
+        reservoir.append(line)
+    else:
+        k = rng.randrange(seen + 1)
+        if k < n_sample:
+            reservoir[k] = line
+
+def is_bgzf(path):
+    with open(path, "rb") as f:
+        return f.read(len(BGZF_HEADER)) == BGZF_HEADER
+
+def read_window(f, path_is_bgzf, offset):
+    """
+    Complete lines from the data at a byte offset: the next BGZF block for BGZF files,
+    the next WINDOW bytes for plain text. The partial first and last lines are dropped.
+    """
+    f.seek(offset)
+    data = f.read(2 * WINDOW if path_is_bgzf else WINDOW)
+    if path_is_bgzf:
+        start = data.find(BGZF_HEADER)
+        if start < 0 or start + len(BGZF_HEADER) + 2 > len(data):
+            return []
+        block_size = struct.unpack("<H", data[start + len(BGZF_HEADER):start + len(BGZF_HEADER) + 2])[0] + 1
+        payload = data[start + len(BGZF_HEADER) + 2:start + block_size - 8]
+        try:
+            data = zlib.decompress(payload, -15)
+        except zlib.error:
+            return []
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    return [line.rstrip("\r") for line in lines[1:-1] if line.strip()]
+
+def sample_lines(path, n_sample=5000, n_windows=200, max_lines=1_000_000, seed=1):
+    """
+    Sample data lines from a sumstats file. Returns (header line, sampled lines, method).
+    """
+    rng = random.Random(seed)
+    with open_input(path) as infile:
+        header = infile.readline().rstrip("\r\n")
+        if is_gzipped(path) and not is_bgzf(path):
+            reservoir = []
+            for seen, line in enumerate(infile):
+                if seen >= max_lines:
+                    break
+                reservoir_add(reservoir, seen, line.rstrip("\r\n"), n_sample, rng)
+            return header, reservoir, f"reservoir sample of the first {max_lines} lines (plain gzip)"
+
+    path_is_bgzf = is_bgzf(path)
+    size = os.path.getsize(path)
+    reservoir, seen = [], 0
+    with open(path, "rb") as f:
+        for offset in sorted(rng.randrange(size) for _ in range(n_windows)):
+            for line in read_window(f, path_is_bgzf, offset):
+                if line == header:
+                    continue
+                reservoir_add(reservoir, seen, line, n_sample, rng)
+                seen += 1
+    return header, reservoir, f"{n_windows} random {'BGZF blocks' if path_is_bgzf else 'windows'}"
+
+def parse_sample(header, lines):
+    """
+    Turn sampled lines into a DataFrame with CHR, POS and (if available) A1, A2 and SNP columns.
+    """
+    sep = "\t" if "\t" in header else None
+    names = header.split(sep)
+    rows = [fields for fields in (line.split(sep) for line in lines) if len(fields) == len(names)]
+    df = pd.DataFrame(rows, columns=names)
+
+    try:
+        mapping = detect_columns(names, required=["CHR", "POS"])
+    except ValueError:
+        # No CHR/POS columns: fall back to CHR:POS[:A1[_:]A2] variant IDs
+        mapping = detect_columns(names, required=["SNP"])
+        parts = df[mapping["SNP"]].str.split(r"[:_]", expand=True, n=3).reindex(columns=range(4))
+        out = pd.DataFrame({"CHR": parts[0].map(dbsnp_index.normalize_chrom), "POS": parts[1], "A1": parts[2], "A2": parts[3], "SNP": None})
+        return out.assign(POS=pd.to_numeric(out["POS"], errors="coerce")).dropna(subset=["POS"])
+
+    out = pd.DataFrame({
+        "CHR": df[mapping["CHR"]].map(dbsnp_index.normalize_chrom),
+        "POS": pd.to_numeric(df[mapping["POS"]], errors="coerce"),
+    })
+    for col in ("A1", "A2", "SNP"):
+        out[col] = df[mapping[col]].str.upper() if col in mapping else None
+    return out.dropna(subset=["POS"])
+
+def score_build(sample, index_dir):
+    """
+    Fraction of sampled variants found in one build's marker table: on position and alleles
+    (either orientation) where alleles are given, else on position only. Rows with an rs ID
+    also count whether the table has that rs ID at the position.
+    """
+    hits = np.zeros(len(sample), dtype=bool)
+    rsid_hits = np.zeros(len(sample), dtype=bool)
+    has_alleles = sample["A1"].notna().all() and sample["A2"].notna().all()
+    rs_numbers = pd.to_numeric(sample["SNP"].str.extract(r"^RS(\d+)$", expand=False), errors="coerce") if sample["SNP"].notna().any() else pd.Series(np.nan, index=sample.index)
+
+    for chrom, rows in sample.groupby("CHR").indices.items():
+        index = dbsnp_index.load_chrom_index(index_dir, chrom)
+        pos = sample["POS"].to_numpy()[rows].astype(np.int64)
+        if has_alleles:
+            a1, a2 = sample["A1"].to_numpy()[rows], sample["A2"].to_numpy()[rows]
+            found = dbsnp_index.lookup_chrom(index, pos, a2, a1)
+            missing = found == 0
+            found[missing] = dbsnp_index.lookup_chrom(index, pos[missing], a1[missing], a2[missing])
+        else:
+            found = dbsnp_index.lookup_chrom(index, pos)
+        hits[rows] = found > 0
+        rsid_hits[rows] = found == rs_numbers.to_numpy()[rows]
+
+    n_rs = int(rs_numbers.notna().sum())
+    return {
+        "match_rate": float(hits.mean()) if len(hits) else 0.0,
+        "rsid_match_rate": float(rsid_hits.sum() / n_rs) if n_rs else None,
+        "matched_on": "position+alleles" if has_alleles else "position",
+    }
+
+def detect_build(path, index_dirs, n_sample=5000, n_windows=200, max_lines=1_000_000, seed=1, min_rate=0.2, min_confidence=0.5):
+    """
+    Detect the genome build of a sumstats file.
+
+    Args:
+        path (str): Sumstats file (plain, gzip or BGZF).
+        index_dirs (dict): Build name -> marker table directory (dbsnp_index.py layout).
+        min_rate (float): Minimum match rate of the best build to call it.
+        min_confidence (float): Minimum confidence to call a build.
+
+    Returns:
+        dict: Report with the called build (None if undetermined), confidence and per-build scores.
+    """
+    header, lines, method = sample_lines(path, n_sample, n_windows, max_lines, seed)
+    sample = parse_sample(header, lines)
+    if sample.empty:
+        raise ValueError(f"No variants with a position could be sampled from {path}")
+
+    scores = {build: score_build(sample, index_dir) for build, index_dir in index_dirs.items()}
+    # Decide on rs ID agreement when most sampled variants carry an rs ID, else on the match rate
+    use_rsid = all(score["rsid_match_rate"] is not None for score in scores.values()) and sample["SNP"].str.startswith("RS", na=False).mean() > 0.5
+    metric = "rsid_match_rate" if use_rsid else "match_rate"
+    ranked = sorted(scores, key=lambda build: scores[build][metric], reverse=True)
+    best = scores[ranked[0]][metric]
+    runner_up = scores[ranked[1]][metric] if len(ranked) > 1 else 0.0
+    # Share of the best build's matches that the other build does not also explain
+    confidence = (best - runner_up) / best if best > 0 else 0.0
+    called = ranked[0] if best >= min_rate and confidence >= min_confidence else None
+
+    return {
+        "input": path,
+        "build": called,
+        "confidence": round(confidence, 4),
+        "metric": metric,
+        "n_sampled": len(sample),
+        "sampling": method,
+        "scores": scores,
+    }
+
+def make_marker_table(index_dir, snplist, out_dir):
+    """
+    Cut a compact marker table (same layout as the dbSNP index) for the rs IDs in snplist,
+    e.g. the HapMap3 SNPs or the SNPs of an LD reference.
+    """
+    keep = pd.read_csv(snplist, sep=r"\s+", header=None, usecols=[0], dtype=str)[0]
+    keep = np.unique(pd.to_numeric(keep.str.replace(r"^rs", "", regex=True), errors="coerce").dropna().astype(np.uint64))
+    os.makedirs(out_dir, exist_ok=True)
+    total = 0
+    for pos_file in sorted(os.listdir(index_dir)):
+        match = re.fullmatch(r"chr(.+)\.pos\.npy", pos_file)
+        if not match:
+            continue
+        chrom = match.group(1)
+        index = dbsnp_index.load_chrom_index(index_dir, chrom)
+        selected = np.isin(index["rsid"], keep)
+        paths = dbsnp_index.index_paths(out_dir, chrom)
+        for name in dbsnp_index.INDEX_ARRAYS:
+            np.save(paths[name], np.asarray(index[name][selected]))
+        total += int(selected.sum())
+        print(f"chr{chrom}: {int(selected.sum())} markers")
+    print(f"Marker table with {total} entries written to {out_dir}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect the genome build (GRCh37/GRCh38) of GWAS summary statistics offline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    detect = subparsers.add_parser("detect", help="Detect the build of a sumstats file.")
+    detect.add_argument("input_file", help="Sumstats file (plain, gzip or BGZF) with CHR/POS columns or CHR:POS:REF_ALT IDs.")
+    detect.add_argument("--index37", required=True, help="GRCh37 marker table directory (dbsnp_index.py layout).")
+    detect.add_argument("--index38", required=True, help="GRCh38 marker table directory (dbsnp_index.py layout).")
+    detect.add_argument("--n_sample", type=int, default=5000, help="Variants to sample (default: 5000).")
+    detect.add_argument("--n_windows", type=int, default=200, help="Random offsets read from BGZF/plain files (default: 200).")
+    detect.add_argument("--max_lines", type=int, default=1_000_000, help="Lines scanned in plain gzip files (default: 1000000).")
+    detect.add_argument("--seed", type=int, default=1, help="Random seed (default: 1).")
+    detect.add_argument("--min_confidence", type=float, default=0.5, help="Minimum confidence to call a build (default: 0.5).")
+    detect.add_argument("--output", default=None, help="Write the report as JSON to this file.")
+
+    table = subparsers.add_parser("table", help="Cut a compact marker table from a dbSNP index.")
+    table.add_argument("index_dir", help="dbSNP index directory (dbsnp_index.py).")
+    table.add_argument("snplist", help="File with rs IDs in the first column.")
+    table.add_argument("out_dir", help="Output directory for the marker table.")
+
+    args = parser.parse_args()
+
+    if args.command == "table":
+        make_marker_table(args.index_dir, args.snplist, args.out_dir)
+        return
+
+    report = detect_build(
+        args.input_file, {"GRCh37": args.index37, "GRCh38": args.index38},
+        args.n_sample, args.n_windows, args.max_lines, args.seed, min_confidence=args.min_confidence,
+    )
+    for build, score in report["scores"].items():
+        rsid = f", rsID agreement {score['rsid_match_rate']:.3f}" if score["rsid_match_rate"] is not None else ""
+        print(f"{build}: match rate {score['match_rate']:.3f} ({score['matched_on']}){rsid}")
+    print(f"Sampled {report['n_sampled']} variants ({report['sampling']})")
+    print(f"Build: {report['build'] or 'undetermined'} (confidence {report['confidence']:.2f})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["build"] is None:
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# Unified PRS evaluation: loads the merged PRS/phenotype/covariate/PC table once and computes,
+# for every requested PRS x phenotype pair,
+#   continuous phenotypes: R^2 and incremental R^2 over covariates, beta/SE/p, Pearson correlation
+#   binary phenotypes:     AUC with DeLong SE, McFadden pseudo-R^2, point-biserial correlation
+# plus the association of every PRS with the leading PCs (population stratification check).
+# Everything is written to one report table; plots are optional.
+# Replaces separate runs of prs_heritability.py, prs_pheno_correlation.py,
+# prs_plot_roc_auc.py and prs_plot_prs_pc1.py.
+
+import argparse
+import os
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.metrics import roc_curve
+
+from prs_bootstrap import confidence_intervals, weighted_pseudo_r2
+from prs_heritability import batch_ols, covariate_design
+from prs_plot_roc_auc import delong_auc
+from prs_table_io import expand_columns, read_table, table_columns, write_table
+
+def pearson(y, X):
+    """
+    Pearson correlation and two-sided p-value of y with every column of X.
+    """
+    n = len(y)
+    yc = y - y.mean()
+    Xc = X - X.mean(axis=0)
+    r = (Xc.T @ yc) / np.sqrt((Xc ** 2).sum(axis=0) * (yc ** 2).sum())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = r * np.sqrt((n - 2) / (1 - r ** 2))
+    return r, 2 * stats.t.sf(np.abs(t), n - 2)
+
+def evaluate_phenotype(data, pheno, prs_cols, covariate_cols, n_boot=0, seed=12345, workers=1):
+    """
+    All metrics of every PRS column for one phenotype.
+    """
+    cols = [pheno] + prs_cols + (covariate_cols or [])
+    subset = data[cols].replace({pheno: {-9: np.nan}}).dropna()
+    y = subset[pheno]
+    X = subset[prs_cols].to_numpy(dtype=float)
+
+    is_binary = y.nunique() == 2
+    if is_binary:
+        y = pd.Series(pd.Categorical(y).codes, index=y.index)
+    y = y.to_numpy(dtype=float)
+
+    r, r_p = pearson(y, X)
+    report = pd.DataFrame({
+        "Phenotype": pheno,
+        "PRS": prs_cols,
+        "Trait Type": "binary" if is_binary else "continuous",
+        "N": len(y),
+        "Correlation": r,
+        "Correlation P": r_p,
+    })
+
+    C = covariate_design(subset, covariate_cols)
+    if is_binary:
+        auc, cov = delong_auc(y, X)
+        report["N Cases"] = int(y.sum())
+        report["AUC"] = auc
+        report["AUC SE"] = np.sqrt(np.diag(cov))
+        report["Pseudo R^2"] = weighted_pseudo_r2(np.ones((1, len(y))), y, X)[0]
+        metrics = ("auc", "pseudo_r2")
+    else:
+        fit = batch_ols(C, y[:, None], X)
+        report["R^2"] = fit["r2"][:, 0]
+        report["Incremental R^2"] = fit["r2"][:, 0] - fit["r2_null"][:, 0]
+        report["Beta"] = fit["beta"][:, 0]
+        report["SE"] = fit["se"][:, 0]
+        report["P"] = fit["p"][:, 0]
+        metrics = ("r2", "incremental_r2")
+
+    if n_boot:
+        ci = confidence_intervals(y, X, prs_cols, C=C, metrics=metrics, n_boot=n_boot, seed=seed, workers=workers)
+        for metric, label in {"auc": "AUC", "pseudo_r2": "Pseudo R^2", "r2": "R^2", "incremental_r2": "Incremental R^2"}.items():
+            if metric in metrics:
+                rows = ci[ci["Metric"] == metric].set_index("PRS Column").reindex(prs_cols)
+                report[f"{label} CI Lower"] = rows["CI Lower"].to_numpy()
+                report[f"{label} CI Upper"] = rows["CI Upper"].to_numpy()
+
+    return report, subset, y, X, is_binary
+
+def pc_association(data, prs_cols, pc_cols):
+    """
+    R^2 and p-value of every PRS with each PC.
+    """
+    out = pd.DataFrame({"PRS": prs_cols})
+    for pc in pc_cols:
+        subset = data[[pc] + prs_cols].dropna()
+        r, p = pearson(subset[pc].to_numpy(dtype=float), subset[prs_cols].to_numpy(dtype=float))
+        out[f"{pc} R^2"] = r ** 2
+        out[f"{pc} P"] = p
+    return out
+
+def plot_phenotype(pheno, prs_cols, y, X, is_binary, report, output_dir):
+    for k, prs in enumerate(prs_cols):
+        name = f"{prs}_vs_{pheno}".replace(" ", "_").replace("-", "_")
+        plt.figure(figsize=(8, 6))
+        if is_binary:
+            fpr, tpr, _ = roc_curve(y, X[:, k])
+            plt.plot(fpr, tpr, color='b', label=f"ROC curve (AUC = {report['AUC'].iloc[k]:.2f})")
+            plt.plot([0, 1], [0, 1], color='gray', linestyle='--')
+            plt.xlabel("False Positive Rate")
+            plt.ylabel("True Positive Rate")
+            plt.legend(loc="lower right")
+            plt.title(f"ROC Curve for {prs} vs {pheno}")
+            path = os.path.join(output_dir, f"roc_curve_{name}.png")
+        else:
+            m, b = np.polyfit(X[:, k], y, 1)
+            plt.scatter(X[:, k], y, alpha=0.5, edgecolor='k', label="Data points")
+            order = np.argsort(X[:, k])
+            plt.plot(X[order, k], m * X[order, k] + b, color='red', label=f"Regression line (y={m:.2f}x + {b:.2f})")
+            plt.xlabel(prs)
+            plt.ylabel(pheno)
+            plt.legend()
+            plt.title(f"{prs} vs {pheno}\nR-squared: {report['Correlation'].iloc[k] ** 2:.4f}")
+            path = os.path.join(output_dir, f"scatter_plot_{name}.png")
+        plt.grid(alpha=0.5)
+        plt.savefig(path, dpi=150, bbox_inches='tight')
+        plt.close()
+
+def plot_pc1(data, prs_cols, output_dir):
+    for prs in prs_cols:
+        subset = data[["PC1", prs]].dropna()
+        plt.figure(figsize=(10, 6))
+        plt.scatter(subset["PC1"], subset[prs], alpha=0.5, label="Data points")
+        m, b = np.polyfit(subset["PC1"], subset[prs], 1)
+        order = np.argsort(subset["PC1"].to_numpy())
+        plt.plot(subset["PC1"].to_numpy()[order], m * subset["PC1"].to_numpy()[order] + b, color='red', label="Regression line")
+        plt.title("PRS vs PC1 (Population Stratification Check)")
+        plt.xlabel("PC1")
+        plt.ylabel(f"Polygenic Risk Score ({prs})")
+        plt.legend()
+        plt.savefig(os.path.join(output_dir, f"{prs}_PRS_vs_PC1.png".replace(" ", "_")))
+        plt.close()
+
+def evaluate(input_file, phenotype_cols, prs_cols, output_file, covariate_cols=None, pc_cols=None,
+             pca_file=None, delimiter=',', phase=1, n_boot=0, seed=12345, workers=1, plot_dir=None):
+    """
+    Evaluate every PRS x phenotype pair from a single load of the merged table and write one report.
+
+    Args:
+        input_file (str): Merged PRS/phenotype/covariate file (CSV, TSV, Parquet or Arrow).
+        phenotype_cols (list): Phenotype columns (binary or continuous is detected per phenotype).
+        prs_cols (list): PRS columns.
+        output_file (str): Report path (.parquet/.arrow or delimited text).
+        covariate_cols (list): Covariates for (incremental) R^2 (optional).
+        pc_cols (list): PC columns to test PRS association with (optional).
+        pca_file (str): Tab-delimited PCA file with IID and PC columns, merged on IID if
+            the PCs are not in the input file (optional).
+        delimiter (str): Delimiter for text input (default: ',').
+        phase (int): Keep only rows with this value in the 'Phase' column, if there is one
+            (default: 1, as prs_heritability.py; None keeps all rows).
+        n_boot (int): Bootstrap replicates for confidence intervals (0 = none).
+        seed (int): Bootstrap random seed.
+        workers (int): Bootstrap worker processes.
+        plot_dir (str): Directory for ROC/scatter/PC1 plots (optional; no plots if None).
+
+    Returns:
+        pd.DataFrame: The report.
+    """
+    pc_cols = pc_cols or []
+    columns = phenotype_cols + prs_cols + (covariate_cols or []) + pc_cols + ["IID", "Phase"]
+
+    # Load the merged table once, with only the needed columns
+    print("Loading input file...")
+    data = read_table(input_file, columns=columns, sep=delimiter)
+    if pca_file and any(pc not in data.columns for pc in pc_cols):
+        pcs = read_table(pca_file, columns=["IID"] + pc_cols, sep="\t")
+        data["IID"] = data["IID"].astype(str)
+        pcs["IID"] = pcs["IID"].astype(str)
+        data = data.merge(pcs, on="IID", how="left", suffixes=("_input", ""))
+    if phase is not None and "Phase" in data.columns:
+        data = data[data["Phase"] == phase]
+        print(f"Filtered data to Phase == {phase}: {data.shape[0]} rows remaining.")
+
+    missing_cols = [col for col in phenotype_cols + prs_cols + (covariate_cols or []) + pc_cols if col not in data.columns]
+    if missing_cols:
+        raise ValueError(f"Missing columns in input file: {', '.join(missing_cols)}")
+
+    if plot_dir:
+        os.makedirs(plot_dir, exist_ok=True)
+
+    reports = []
+    for pheno in phenotype_cols:
+        report, subset, y, X, is_binary = evaluate_phenotype(data, pheno, prs_cols, covariate_cols, n_boot, seed, workers)
+        print(f"{pheno}: {'binary' if is_binary else 'continuous'} phenotype, {len(y)} samples.")
+        reports.append(report)
+        if plot_dir:
+            plot_phenotype(pheno, prs_cols, y, X, is_binary, report, plot_dir)
+
+    report = pd.concat(reports, ignore_index=True)
+    if pc_cols:
+        report = report.merge(pc_association(data, prs_cols, pc_cols), on="PRS", how="left")
+        if plot_dir and "PC1" in pc_cols:
+            plot_pc1(data, prs_cols, plot_dir)
+
+    write_table(report, output_file, sep="\t")
+    print(f"Evaluation report with {len(report)} PRS x phenotype rows saved to {output_file}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate many PRS columns against many phenotypes from one load of the merged table.")
+    parser.add_argument("-i", "--input_file", required=True, help="Merged PRS/phenotype/covariate file (CSV, TSV, Parquet or Arrow).")
+    parser.add_argument("-pheno", "--phenotypes", required=True, help="Comma-separated phenotype columns or patterns.")
+    parser.add_argument("-prs", "--prs_columns", required=True, help="Comma-separated PRS columns or patterns (e.g. 'SCORE1_AVG_*_std').")
+    parser.add_argument("-o", "--output_file", required=True, help="Report file (.parquet/.arrow, otherwise TSV).")
+    parser.add_argument("--covariates", nargs="*", default=None, help="Covariate columns for (incremental) R^2.")
+    parser.add_argument("--pcs", default="", help="Comma-separated PC columns or patterns to test PRS association with (e.g. 'PC1,PC2').")
+    parser.add_argument("--pca_file", default=None, help="PCA file with IID and PC columns, if the PCs are not in the input file.")
+    parser.add_argument("--delimiter", default=",", help="Delimiter for text input (default: ',').")
+    parser.add_argument("--phase", type=int, default=1, help="Keep only rows with this 'Phase' value, if the column exists (default: 1, as prs_heritability.py).")
+    parser.add_argument("--all_phases", action="store_true", help="Keep all rows regardless of 'Phase'.")
+    parser.add_argument("--bootstrap", type=int, default=0, help="Number of bootstrap replicates for confidence intervals (default: 0).")
+    parser.add_argument("--seed", type=int, default=12345, help="Bootstrap random seed (default: 12345).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of bootstrap worker processes (default: 1).")
+    parser.add_argument("--plot_dir", default=None, help="Directory to save ROC/scatter/PC1 plots (default: no plots).")
+
+    args = parser.parse_args()
+
+    columns = table_columns(args.input_file, sep=args.delimiter)
+    pc_source = columns + (table_columns(args.pca_file, sep="\t") if args.pca_file else [])
+    evaluate(
+        args.input_file,
+        expand_columns(args.phenotypes, columns),
+        expand_columns(args.prs_columns, columns),
+        args.output_file,
+        covariate_cols=args.covariates,
+        pc_cols=expand_columns(args.pcs, pc_source) if args.pcs else [],
+        pca_file=args.pca_file,
+        delimiter=args.delimiter,
+        phase=None if args.all_phases else args.phase,
+        n_boot=args.bootstrap,
+        seed=args.seed,
+        workers=args.workers,
+        plot_dir=args.plot_dir,
+    )
+
+if __name__ == "__main__":
+    main()
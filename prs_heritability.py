@@ -1,23 +1,34 @@
 import pandas as pd
+import numpy as np
 import statsmodels.api as sm
+from scipy import stats
 import argparse
 import os
 
-def calculate_prs_heritability(input_file, phenotype_col, prs_col, covariate_cols=None, delimiter=',', output_file=None):
+from prs_bootstrap import confidence_intervals
+from prs_ld_store import LDStore
+from prs_sumstats_ingest import detect_columns
+from prs_table_io import expand_columns, read_table, table_columns, write_table
+
+def calculate_prs_heritability(input_file, phenotype_col, prs_col, covariate_cols=None, delimiter=',', output_file=None, n_boot=0, seed=12345, workers=1, snp_h2=None):
     """
     Calculate heritability explained (R^2) by a Polygenic Risk Score (PRS).
     
     Args:
-        input_file (str): Path to the input TSV/CSV file.
+        input_file (str): Path to the input TSV/CSV, Parquet or Arrow file.
         phenotype_col (str): Column name for the phenotype (continuous).
         prs_col (str): Column name for the PRS.
         covariate_cols (list): List of column names for covariates (optional).
         delimiter (str): Delimiter for the input file (default: ',').
         output_file (str): Path to save results (optional, without extension).
+        n_boot (int): Number of bootstrap replicates for R^2 confidence intervals (0 = none).
+        seed (int): Bootstrap random seed.
+        workers (int): Number of bootstrap worker processes.
+        snp_h2 (dict): LDSC SNP-heritability estimate (see ldsc_h2) to report next to R^2 (optional).
     """
     # Load data
     print("Loading input file...")
-    data = pd.read_csv(input_file, delimiter=delimiter)
+    data = read_table(input_file, columns=[phenotype_col, prs_col, 'Phase'] + (covariate_cols or []), sep=delimiter)
     
     # Filter data: Keep only rows where Phase == 1
     if 'Phase' in data.columns:
@@ -63,6 +74,19 @@ def calculate_prs_heritability(input_file, phenotype_col, prs_col, covariate_col
     # Extract R-squared
     r2 = model.rsquared
     print(f"Heritability explained by PRS (R^2): {r2:.4f}")
+    if snp_h2:
+        print(f"SNP heritability (LDSC): {snp_h2['h2']:.4f} (SE {snp_h2['h2_se']:.4f}); R^2 / SNP h^2: {r2 / snp_h2['h2']:.3f}")
+
+    # Bootstrap confidence intervals
+    ci = None
+    if n_boot:
+        print(f"Bootstrapping R^2 with {n_boot} replicates...")
+        ci = confidence_intervals(
+            y, data[[prs_col]].to_numpy(), [prs_col], C=covariate_design(data, covariate_cols),
+            metrics=("r2", "incremental_r2"), n_boot=n_boot, seed=seed, workers=workers,
+        ).set_index("Metric")
+        print(f"R^2 95% CI: [{ci.loc['r2', 'CI Lower']:.4f}, {ci.loc['r2', 'CI Upper']:.4f}]")
+        print(f"Incremental R^2: {ci.loc['incremental_r2', 'Estimate']:.4f}, 95% CI: [{ci.loc['incremental_r2', 'CI Lower']:.4f}, {ci.loc['incremental_r2', 'CI Upper']:.4f}]")
     
     # Save results if output_file is specified
     if output_file:
@@ -74,6 +98,11 @@ def calculate_prs_heritability(input_file, phenotype_col, prs_col, covariate_col
         # Write to text file
         with open(txt_output, 'w') as f:
             f.write(f"Heritability explained (R^2): {r2:.4f}\n")
+            if ci is not None:
+                f.write(f"R^2 95% CI: [{ci.loc['r2', 'CI Lower']:.4f}, {ci.loc['r2', 'CI Upper']:.4f}]\n")
+                f.write(f"Incremental R^2: {ci.loc['incremental_r2', 'Estimate']:.4f}, 95% CI: [{ci.loc['incremental_r2', 'CI Lower']:.4f}, {ci.loc['incremental_r2', 'CI Upper']:.4f}]\n")
+            if snp_h2:
+                f.write(f"SNP heritability (LDSC): {snp_h2['h2']:.4f} (SE {snp_h2['h2_se']:.4f}), intercept {snp_h2['intercept']:.4f}\n")
         
         # Write to CSV file
         output_data = {
@@ -82,6 +111,16 @@ def calculate_prs_heritability(input_file, phenotype_col, prs_col, covariate_col
             "Covariates": ', '.join(covariate_cols) if covariate_cols else "None",
             "Heritability Explained (R^2)": r2
         }
+        if ci is not None:
+            output_data.update({
+                "R^2 CI Lower": ci.loc["r2", "CI Lower"],
+                "R^2 CI Upper": ci.loc["r2", "CI Upper"],
+                "Incremental R^2": ci.loc["incremental_r2", "Estimate"],
+                "Incremental R^2 CI Lower": ci.loc["incremental_r2", "CI Lower"],
+                "Incremental R^2 CI Upper": ci.loc["incremental_r2", "CI Upper"],
+            })
+        if snp_h2:
+            output_data.update(snp_h2_columns(snp_h2, r2))
         output_df = pd.DataFrame([output_data])
         output_df.to_csv(csv_output, index=False)
         
@@ -93,29 +132,299 @@ def calculate_prs_heritability(input_file, phenotype_col, prs_col, covariate_col
     
     return r2
 
+def covariate_design(data, covariate_cols):
+    """
+    Build the covariate design matrix (intercept + covariates, integer covariates as dummies).
+    """
+    design = pd.DataFrame({"const": np.ones(len(data))}, index=data.index)
+    for col in covariate_cols or []:
+        if pd.api.types.is_integer_dtype(data[col]):
+            print(f"Converting integer covariate '{col}' to dummy variables...")
+            design = pd.concat([design, pd.get_dummies(data[col], prefix=col, drop_first=True)], axis=1)
+        else:
+            design[col] = data[col]
+    return design.astype(float).to_numpy()
+
+def batch_ols(C, Y, X):
+    """
+    Fit y ~ C + x for every phenotype column of Y and PRS column of X at once.
+
+    The covariate matrix C is factorised once; Y and X are residualised against it
+    in one pass (Frisch-Waugh-Lovell), so each PRS x phenotype fit reduces to dot products.
+
+    Returns a dict of (n_prs x n_pheno) arrays: beta, se, p, r2 (full model) and r2_null.
+    """
+    n, p = C.shape
+    Q, _ = np.linalg.qr(C)
+    Yr = Y - Q @ (Q.T @ Y)
+    Xr = X - Q @ (Q.T @ X)
+
+    xx = np.einsum("ij,ij->j", Xr, Xr)[:, None]
+    yy = np.einsum("ij,ij->j", Yr, Yr)[None, :]
+    xy = Xr.T @ Yr
+    tss = ((Y - Y.mean(axis=0)) ** 2).sum(axis=0)[None, :]
+
+    beta = xy / xx
+    rss = yy - beta * xy
+    df_resid = n - p - 1
+    se = np.sqrt(rss / df_resid / xx)
+    pval = 2 * stats.t.sf(np.abs(beta / se), df_resid)
+
+    return {
+        "beta": beta,
+        "se": se,
+        "p": pval,
+        "r2": 1 - rss / tss,
+        "r2_null": np.broadcast_to(1 - yy / tss, beta.shape),
+    }
+
+def calculate_prs_heritability_batch(input_file, phenotype_cols, prs_cols, covariate_cols=None, delimiter=',', output_file=None, n_boot=0, seed=12345, workers=1, snp_h2=None):
+    """
+    Batch version of calculate_prs_heritability for many PRS x phenotype pairs.
+
+    Args:
+        input_file (str): Path to the input TSV/CSV, Parquet or Arrow file.
+        phenotype_cols (list): Column names for the phenotypes (continuous).
+        prs_cols (list): Column names for the PRS.
+        covariate_cols (list): List of column names for covariates (optional).
+        delimiter (str): Delimiter for the input file (default: ',').
+        output_file (str): Path to save results (optional, without extension).
+        n_boot (int): Number of bootstrap replicates for R^2 confidence intervals (0 = none).
+        seed (int): Bootstrap random seed.
+        workers (int): Number of bootstrap worker processes.
+        snp_h2 (dict): LDSC SNP-heritability estimate (see ldsc_h2) to report next to R^2 (optional).
+
+    Returns:
+        pd.DataFrame: One row per PRS x phenotype pair with R^2, incremental R^2, beta, SE and p.
+    """
+    print("Loading input file...")
+    data = read_table(input_file, columns=phenotype_cols + prs_cols + ['Phase'] + (covariate_cols or []), sep=delimiter)
+
+    if 'Phase' in data.columns:
+        print("Filtering data to keep only rows where Phase == 1...")
+        data = data[data['Phase'] == 1]
+        print(f"Filtered data has {data.shape[0]} rows remaining.")
+    else:
+        print("Warning: Column 'Phase' not found. Skipping filtering.")
+
+    required_cols = phenotype_cols + prs_cols + (covariate_cols or [])
+    missing_cols = [col for col in required_cols if col not in data.columns]
+    if missing_cols:
+        raise ValueError(f"Missing columns in input file: {', '.join(missing_cols)}")
+
+    # A single covariate factorisation needs one common set of complete rows
+    complete = data[required_cols].notna().all(axis=1)
+    if not complete.all():
+        print(f"Dropping {(~complete).sum()} rows with missing values.")
+        data = data[complete]
+
+    print(f"Fitting {len(prs_cols) * len(phenotype_cols)} PRS x phenotype models on {len(data)} rows...")
+    C = covariate_design(data, covariate_cols)
+    X = data[prs_cols].astype(float).to_numpy()
+    fit = batch_ols(C, data[phenotype_cols].astype(float).to_numpy(), X)
+
+    results = pd.DataFrame({
+        "Phenotype Column": np.tile(phenotype_cols, len(prs_cols)),
+        "PRS Column": np.repeat(prs_cols, len(phenotype_cols)),
+        "Covariates": ', '.join(covariate_cols) if covariate_cols else "None",
+        "N": len(data),
+        "Heritability Explained (R^2)": fit["r2"].ravel(),
+        "Null R^2": fit["r2_null"].ravel(),
+        "Incremental R^2": (fit["r2"] - fit["r2_null"]).ravel(),
+        "Beta": fit["beta"].ravel(),
+        "SE": fit["se"].ravel(),
+        "P": fit["p"].ravel(),
+    })
+
+    # Bootstrap confidence intervals, one engine call per phenotype for all PRS columns
+    if n_boot:
+        print(f"Bootstrapping R^2 with {n_boot} replicates...")
+        ci = pd.concat([
+            confidence_intervals(
+                data[pheno].astype(float).to_numpy(), X, prs_cols, C=C,
+                metrics=("r2", "incremental_r2"), n_boot=n_boot, seed=seed, workers=workers,
+            ).assign(**{"Phenotype Column": pheno})
+            for pheno in phenotype_cols
+        ])
+        ci = ci.pivot_table(index=["Phenotype Column", "PRS Column"], columns="Metric", values=["CI Lower", "CI Upper"])
+        key = pd.MultiIndex.from_frame(results[["Phenotype Column", "PRS Column"]])
+        results["R^2 CI Lower"] = ci[("CI Lower", "r2")].reindex(key).to_numpy()
+        results["R^2 CI Upper"] = ci[("CI Upper", "r2")].reindex(key).to_numpy()
+        results["Incremental R^2 CI Lower"] = ci[("CI Lower", "incremental_r2")].reindex(key).to_numpy()
+        results["Incremental R^2 CI Upper"] = ci[("CI Upper", "incremental_r2")].reindex(key).to_numpy()
+
+    if snp_h2:
+        for name, values in snp_h2_columns(snp_h2, results["Heritability Explained (R^2)"]).items():
+            results[name] = values
+
+    print(results.to_string(index=False))
+
+    if output_file:
+        csv_output = output_file + ".csv"
+        print(f"Saving results to {csv_output}...")
+        write_table(results, csv_output)
+        print("Results saved successfully.")
+
+    return results
+
+def snp_h2_columns(snp_h2, r2):
+    return {
+        "SNP h^2 (LDSC)": snp_h2["h2"],
+        "SNP h^2 SE": snp_h2["h2_se"],
+        "LDSC Intercept": snp_h2["intercept"],
+        "R^2 / SNP h^2": r2 / snp_h2["h2"],
+    }
+
+def ldsc_weighted_sums(chi2, l2, n, m, h2, intercept):
+    """
+    Per-SNP terms of the weighted LDSC normal equations for chi2 = intercept + h2 * N * l2 / M.
+    Weights correct for heteroscedasticity and for SNPs counted in many LD scores.
+    """
+    x = n * l2 / m
+    expected = np.maximum(intercept + h2 * x, 1)
+    w = 1 / (np.maximum(l2, 1) * 2 * expected ** 2)
+    X = np.column_stack([np.ones_like(x), x])
+    return X * w[:, None], X, chi2
+
+def ldsc_h2(sumstats_file, ld_dir=None, n=None, n_blocks=200, source="eigen", delimiter="\t", ld_scores_file=None):
+    """
+    LDSC-style SNP heritability from GWAS summary statistics and the LD scores of an
+    SBayesRC LD reference (prs_ld_store.py), with a block-jackknife standard error.
+
+    Args:
+        sumstats_file (str): Sumstats with SNP, BETA/OR and SE (or Z) columns, and N (or n);
+            e.g. the canonical Parquet file of prs_sumstats_ingest.py.
+        ld_dir (str): SBayesRC LD directory (LD scores computed on the fly).
+        n (float): GWAS sample size for sumstats without an N column.
+        n_blocks (int): Number of jackknife blocks.
+        source (str): LD block files to use ('eigen' or 'full').
+        ld_scores_file (str): LD score table written by prs_ld_store.py (SNP, L2), used
+            instead of computing the LD scores from ld_dir.
+
+    Returns:
+        dict: h2, h2_se, intercept, intercept_se, mean_chi2, n_snps and m.
+    """
+    if ld_scores_file:
+        print(f"Reading LD scores from {ld_scores_file}...")
+        scores = read_table(ld_scores_file, columns=["SNP", "L2"], sep="\t")
+        l2 = pd.Series(scores["L2"].to_numpy(dtype=float), index=scores["SNP"].astype(str).to_numpy(), name="L2")
+    else:
+        print("Computing LD scores from the LD reference...")
+        l2 = LDStore(ld_dir, source=source).ld_scores()
+    m = len(l2)
+
+    columns = table_columns(sumstats_file, sep=delimiter)
+    z_col = next((col for col in columns if col.lower() in ("z", "zscore", "z_score")), None)
+    mapping = detect_columns(columns, required=["SNP"] if z_col else ["SNP", "SE"])
+    needed = [mapping[col] for col in ("SNP", "BETA", "OR", "SE", "N") if col in mapping]
+    sumstats = read_table(sumstats_file, columns=needed + ([z_col] if z_col else []), sep=delimiter)
+
+    if z_col:
+        z = sumstats[z_col].astype(float)
+    else:
+        beta = sumstats[mapping["BETA"]].astype(float) if "BETA" in mapping else np.log(sumstats[mapping["OR"]].astype(float))
+        z = beta / sumstats[mapping["SE"]].astype(float)
+    n_snp = sumstats[mapping["N"]].astype(float) if "N" in mapping else pd.Series(np.nan, index=sumstats.index)
+    if n is not None:
+        n_snp = n_snp.fillna(n)
+    if n_snp.isna().all():
+        raise ValueError("GWAS sample size unknown: the sumstats have no N column and no --ldsc_n was given")
+
+    # Regression SNPs in reference order (the order of the LD scores), so jackknife blocks are contiguous in the genome
+    data = pd.DataFrame({"chi2": z.to_numpy() ** 2, "N": n_snp.to_numpy()}, index=sumstats[mapping["SNP"]].astype(str).to_numpy())
+    data = data[~data.index.duplicated()].dropna()
+    data = data.join(l2, how="inner")
+    data = data.iloc[np.argsort(l2.index.get_indexer(data.index), kind="stable")]
+    # Remove very large chi^2 (LDSC default)
+    data = data[data["chi2"] <= max(80, 0.001 * data["N"].max())]
+    if len(data) < n_blocks:
+        raise ValueError(f"Only {len(data)} sumstats SNPs in the LD reference")
+    print(f"LDSC regression on {len(data)} SNPs (M = {m} reference SNPs)...")
+
+    chi2, l2_reg, n_reg = data["chi2"].to_numpy(), data["L2"].to_numpy(), data["N"].to_numpy()
+    h2 = np.clip(m * (chi2.mean() - 1) / np.mean(n_reg * l2_reg), 0, 1)
+    intercept = 1.0
+    # Two rounds of reweighting with the current estimate, as in LDSC
+    for _ in range(2):
+        WX, X, y = ldsc_weighted_sums(chi2, l2_reg, n_reg, m, h2, intercept)
+        intercept, h2 = np.linalg.solve(WX.T @ X, WX.T @ y)
+
+    # Delete-one block jackknife over contiguous SNP blocks
+    bounds = np.linspace(0, len(data), n_blocks + 1).astype(int)
+    XtWX = np.array([WX[a:b].T @ X[a:b] for a, b in zip(bounds[:-1], bounds[1:])])
+    XtWy = np.array([WX[a:b].T @ y[a:b] for a, b in zip(bounds[:-1], bounds[1:])])
+    full = np.linalg.solve(XtWX.sum(0), XtWy.sum(0))
+    delete = np.array([np.linalg.solve(XtWX.sum(0) - XtWX[k], XtWy.sum(0) - XtWy[k]) for k in range(n_blocks)])
+    pseudo = n_blocks * full - (n_blocks - 1) * delete
+    se = np.sqrt(pseudo.var(axis=0, ddof=1) / n_blocks)
+
+    result = {
+        "h2": float(full[1]),
+        "h2_se": float(se[1]),
+        "intercept": float(full[0]),
+        "intercept_se": float(se[0]),
+        "mean_chi2": float(chi2.mean()),
+        "n_snps": int(len(data)),
+        "m": int(m),
+    }
+    print(f"SNP h^2 (LDSC): {result['h2']:.4f} (SE {result['h2_se']:.4f}), intercept {result['intercept']:.4f} (SE {result['intercept_se']:.4f}), mean chi^2 {result['mean_chi2']:.3f}")
+    return result
+
+
 if __name__ == "__main__":
     # Command-line argument parser
     parser = argparse.ArgumentParser(description="Calculate heritability explained (R^2) by PRS using linear regression.")
     
-    parser.add_argument("input_file", help="Path to input file (TSV or CSV).")
+    parser.add_argument("input_file", help="Path to input file (TSV, CSV, Parquet or Arrow).")
     parser.add_argument("phenotype_col", help="Column name for the phenotype.")
     parser.add_argument("prs_col", help="Column name for the PRS.")
     parser.add_argument("--covariates", nargs='*', help="List of covariate column names (optional).", default=None)
     parser.add_argument("--delimiter", help="Delimiter for the input file (default: ','). Use '\\t' for TSV files.", default=',')
     parser.add_argument("--output_file", help="Base path to save results (without extension).", default=None)
+    parser.add_argument("--bootstrap", type=int, default=0, help="Number of bootstrap replicates for R^2 confidence intervals (default: 0, no bootstrap).")
+    parser.add_argument("--seed", type=int, default=12345, help="Bootstrap random seed (default: 12345).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of bootstrap worker processes (default: 1).")
+    parser.add_argument("--ldsc_sumstats", default=None, help="GWAS sumstats for an LDSC-style SNP h^2 estimate reported next to the PRS R^2 (requires --ld_dir or --ld_scores).")
+    parser.add_argument("--ld_dir", default=None, help="SBayesRC LD reference directory providing the LD scores (see prs_ld_store.py).")
+    parser.add_argument("--ld_scores", default=None, help="LD score table written by prs_ld_store.py (SNP, L2), instead of computing them from --ld_dir.")
+    parser.add_argument("--ldsc_n", type=float, default=None, help="GWAS sample size for sumstats without an N column.")
+    parser.add_argument("--batch", action="store_true", help="Fit all PRS x phenotype pairs at once; phenotype_col and prs_col may then be comma-separated lists or patterns (e.g. 'SCORE1_AVG_*_std').")
     
     # Parse arguments
     args = parser.parse_args()
     
+    if args.ldsc_sumstats and not (args.ld_dir or args.ld_scores):
+        parser.error("--ldsc_sumstats requires --ld_dir or --ld_scores")
+
     # Run the function
     try:
-        calculate_prs_heritability(
-            input_file=args.input_file,
-            phenotype_col=args.phenotype_col,
-            prs_col=args.prs_col,
-            covariate_cols=args.covariates,
-            delimiter=args.delimiter,
-            output_file=args.output_file
-        )
+        snp_h2 = ldsc_h2(args.ldsc_sumstats, args.ld_dir, n=args.ldsc_n, ld_scores_file=args.ld_scores) if args.ldsc_sumstats else None
+        if args.batch:
+            columns = table_columns(args.input_file, sep=args.delimiter)
+            calculate_prs_heritability_batch(
+                input_file=args.input_file,
+                phenotype_cols=expand_columns(args.phenotype_col, columns),
+                prs_cols=expand_columns(args.prs_col, columns),
+                covariate_cols=args.covariates,
+                delimiter=args.delimiter,
+                output_file=args.output_file,
+                n_boot=args.bootstrap,
+                seed=args.seed,
+                workers=args.workers,
+                snp_h2=snp_h2
+            )
+        else:
+            calculate_prs_heritability(
+                input_file=args.input_file,
+                phenotype_col=args.phenotype_col,
+                prs_col=args.prs_col,
+                covariate_cols=args.covariates,
+                delimiter=args.delimiter,
+                output_file=args.output_file,
+                n_boot=args.bootstrap,
+                seed=args.seed,
+                workers=args.workers,
+                snp_h2=snp_h2
+            )
     except Exception as e:
         print(f"Error: {e}")
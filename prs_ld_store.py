@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# Python access to the SBayesRC LD reference built by prs_prepare_sbayesrc_ld.sh.
+# Block files are memory-mapped and decoded blocks are kept in an LRU cache bounded in bytes:
+#   b{idx}.ldm.full.bin    full LD (correlation) matrix of block idx, float32 m x m (LDstep2)
+#   block{idx}.eigen.bin   eigen decomposition of block idx (LDstep3):
+#                          int32 m, int32 k, float32 sumPos, float32 cutThresh,
+#                          float32 values[k], float32 vectors[m x k] (column-major)
+# The SNPs of block idx, in matrix order, are read from snplist/{idx}.snplist, or from the
+# Block column of snp.info (LDstep4) when the snplists are gone.
+# LD scores (sum of r^2 over the SNPs of the same block) are computed per block: in closed
+# form from the eigen decomposition (sum_j r_ij^2 = sum_k U_ik^2 values_k^2, O(m k)), or in
+# row chunks of the full matrix.
+
+import argparse
+import glob
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from prs_table_io import write_table
+
+class LDStore:
+    """
+    SNP -> block lookup and LRU-cached access to the LD blocks of an SBayesRC LD directory.
+    """
+
+    def __init__(self, ld_dir, cache_bytes=2 * 1024 ** 3, source="eigen"):
+        """
+        Args:
+            ld_dir (str): SBayesRC LD directory.
+            cache_bytes (int): Maximum size of the decoded blocks kept in memory.
+            source (str): 'eigen' (block*.eigen.bin) or 'full' (b*.ldm.full.bin); falls back
+                to the other when a block file is missing.
+        """
+        self.ld_dir = ld_dir
+        self.cache_bytes = cache_bytes
+        self.source = source
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.snps = self.load_snps()
+        self.blocks = np.sort(self.snps["Block"].unique())
+        self.block_sizes = self.snps.groupby("Block").size()
+        # SNPs are sorted by block: block idx is rows block_start[idx]:block_start[idx] + size
+        self.block_start = self.block_sizes.cumsum() - self.block_sizes
+        self.index = pd.Index(self.snps["SNP"])
+
+    def load_snps(self):
+        """
+        SNP table with SNP, Block and Index (row within the block), plus the snp.info
+        columns (Chrom, PhysPos, A1, A2, A1Freq, N) when available.
+        """
+        info_file = os.path.join(self.ld_dir, "snp.info")
+        info = pd.read_csv(info_file, sep=r"\s+") if os.path.exists(info_file) else None
+
+        snplists = glob.glob(os.path.join(self.ld_dir, "snplist", "*.snplist"))
+        if snplists:
+            parts = []
+            for path in snplists:
+                idx = int(re.fullmatch(r"(\d+)\.snplist", os.path.basename(path)).group(1))
+                ids = pd.read_csv(path, header=None, usecols=[0], names=["SNP"], dtype=str, sep=r"\s+")["SNP"]
+                parts.append(pd.DataFrame({"SNP": ids.to_numpy(), "Block": idx, "Index": np.arange(len(ids))}))
+            snps = pd.concat(parts, ignore_index=True)
+            if info is not None:
+                snps = snps.merge(info.drop(columns=["Block", "Index"], errors="ignore").rename(columns={"ID": "SNP"}), on="SNP", how="left")
+        elif info is not None:
+            snps = info.rename(columns={"ID": "SNP"})
+            snps["Index"] = snps.groupby("Block").cumcount()
+        else:
+            raise FileNotFoundError(f"Neither snplist/*.snplist nor snp.info found in {self.ld_dir}")
+        return snps.sort_values(["Block", "Index"], kind="stable").reset_index(drop=True)
+
+    def locate(self, snp_ids):
+        """
+        Vectorized SNP -> (block, row within block) lookup; -1 for SNPs not in the reference.
+        """
+        rows = self.index.get_indexer(pd.Index(snp_ids))
+        found = rows >= 0
+        block = np.full(len(rows), -1, dtype=np.int64)
+        index = np.full(len(rows), -1, dtype=np.int64)
+        block[found] = self.snps["Block"].to_numpy()[rows[found]]
+        index[found] = self.snps["Index"].to_numpy()[rows[found]]
+        return block, index
+
+    def block_files(self, idx):
+        return {
+            "eigen": os.path.join(self.ld_dir, f"block{idx}.eigen.bin"),
+            "full": os.path.join(self.ld_dir, f"b{idx}.ldm.full.bin"),
+        }
+
+    def decode(self, idx):
+        """
+        Decode one block: ('full', m x m memmap) or ('eigen', m x k factor B with R = B B').
+        """
+        files = self.block_files(idx)
+        order = ["eigen", "full"] if self.source == "eigen" else ["full", "eigen"]
+        kind = next((kind for kind in order if os.path.exists(files[kind])), None)
+        if kind is None:
+            raise FileNotFoundError(f"No LD file for block {idx} in {self.ld_dir}")
+
+        m = int(self.block_sizes[idx])
+        if kind == "full":
+            return "full", np.memmap(files["full"], dtype=np.float32, mode="r", shape=(m, m))
+
+        header = np.fromfile(files["eigen"], dtype=np.int32, count=2)
+        m_file, k = int(header[0]), int(header[1])
+        if m_file != m:
+            raise ValueError(f"Block {idx}: {m_file} SNPs in {files['eigen']}, {m} in the SNP list")
+        data = np.memmap(files["eigen"], dtype=np.float32, mode="r", offset=16, shape=(k + m * k,))
+        values = np.clip(np.asarray(data[:k]), 0, None)
+        vectors = np.asarray(data[k:]).reshape(k, m).T
+        return "eigen", vectors * np.sqrt(values)
+
+    def block(self, idx):
+        """
+        Decoded block from the LRU cache, decoding (and evicting) as needed.
+        """
+        if idx in self.cache:
+            self.cache.move_to_end(idx)
+            return self.cache[idx]
+        decoded = self.decode(idx)
+        # Memory-mapped full matrices are paged in by the OS and cost nothing here
+        size = decoded[1].nbytes if decoded[0] == "eigen" else 0
+        while self.cache and self.cached_bytes + size > self.cache_bytes:
+            _, (kind, old) = self.cache.popitem(last=False)
+            self.cached_bytes -= old.nbytes if kind == "eigen" else 0
+        self.cache[idx] = decoded
+        self.cached_bytes += size
+        return decoded
+
+    def ld_rows(self, idx, rows):
+        """
+        Correlations of the given rows of block idx with all SNPs of the block (len(rows) x m).
+        """
+        kind, data = self.block(idx)
+        if kind == "full":
+            return np.asarray(data[rows], dtype=np.float64)
+        return (data[rows] @ data.T).astype(np.float64)
+
+    def block_ld_scores(self, idx, n_ref=None, chunk=2048):
+        """
+        LD scores of all SNPs of block idx, optionally with the r^2 bias correction
+        r^2 - (1 - r^2) / (n_ref - 2) used by LDSC.
+        """
+        m = int(self.block_sizes[idx])
+        kind, data = self.block(idx)
+        if kind == "eigen":
+            # R^2 = U diag(values^2) U' and B = U diag(sqrt(values)), so values = colSums(B^2)
+            # and sum_j r_ij^2 = sum_k B_ik^2 values_k
+            b2 = np.asarray(data, dtype=np.float64) ** 2
+            scores = b2 @ b2.sum(axis=0)
+        else:
+            scores = np.empty(m)
+            for start in range(0, m, chunk):
+                scores[start:start + chunk] = (self.ld_rows(idx, np.arange(start, min(start + chunk, m))) ** 2).sum(axis=1)
+        if n_ref:
+            # Summed over the m SNPs of the block: sum (r^2 - (1 - r^2) / (n_ref - 2))
+            scores -= (m - scores) / (n_ref - 2)
+        return scores
+
+    def ld_scores(self, blocks=None, n_ref=None, chunk=2048):
+        """
+        LD scores of all SNPs (of the given blocks), as a Series indexed by SNP ID.
+        """
+        blocks = self.blocks if blocks is None else blocks
+        if n_ref is None and "N" in self.snps.columns:
+            n_ref = float(self.snps["N"].median())
+        parts = []
+        for idx in blocks:
+            start = int(self.block_start[idx])
+            ids = self.snps["SNP"].to_numpy()[start:start + int(self.block_sizes[idx])]
+            parts.append(pd.Series(self.block_ld_scores(idx, n_ref, chunk), index=ids))
+        return pd.concat(parts).rename("L2")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute LD scores from an SBayesRC LD reference (eigen or full LD blocks).")
+    parser.add_argument("ld_dir", help="SBayesRC LD directory (prs_prepare_sbayesrc_ld.sh output or a downloaded reference).")
+    parser.add_argument("output_file", help="Output LD score table (SNP, Block, L2; TSV, Parquet or Arrow).")
+    parser.add_argument("--source", choices=["eigen", "full"], default="eigen", help="Block files to use (default: eigen).")
+    parser.add_argument("--n_ref", type=float, default=None, help="LD reference sample size for the r^2 bias correction (default: median N of snp.info, else none).")
+    parser.add_argument("--cache_gb", type=float, default=2, help="LRU cache size for decoded blocks in GB (default: 2).")
+
+    args = parser.parse_args()
+
+    store = LDStore(args.ld_dir, cache_bytes=int(args.cache_gb * 1024 ** 3), source=args.source)
+    print(f"{len(store.snps)} SNPs in {len(store.blocks)} blocks")
+    scores = store.ld_scores(n_ref=args.n_ref)
+    out = store.snps[["SNP", "Block"]].assign(L2=scores.reindex(store.snps["SNP"]).to_numpy())
+    write_table(out, args.output_file, sep="\t")
+    print(f"LD scores written to {args.output_file} (mean L2 {out['L2'].mean():.2f})")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
 import pandas as pd
 import argparse
 
+from prs_table_io import read_table, write_table
+
 def merge_prscs_with_covariates_and_phenotype(prscs_file, covariate_file, phenotype_file, output_file):
     try:
         # Load the PRScs, covariate, and phenotype files into pandas DataFrames
-        df_prscs = pd.read_csv(prscs_file, sep='\t')
-        df_covariates = pd.read_csv(covariate_file)
-        df_phenotype = pd.read_csv(phenotype_file, sep='\t')
+        df_prscs = read_table(prscs_file, sep='\t')
+        df_covariates = read_table(covariate_file)
+        df_phenotype = read_table(phenotype_file, sep='\t')
         
         # Print column names for debugging
         print("PRScs columns:", df_prscs.columns)
@@ -54,7 +56,7 @@ def merge_prscs_with_covariates_and_phenotype(prscs_file, covariate_file, phenot
     df_merged = df_merged.sort_values(by=[col for col in sort_columns if col in df_merged.columns])
 
     # Save the merged file
-    df_merged.to_csv(output_file, index=False) #sep='\t', 
+    write_table(df_merged, output_file) #sep='\t', 
     print(f"Merged data saved to: {output_file}")
 
 def main():
@@ -63,7 +65,7 @@ def main():
     parser.add_argument('-prscs', '--prscs_file', required=True, help="Path to PRScs file")
     parser.add_argument('-cov', '--covariate_file', required=True, help="Path to covariate file")
     parser.add_argument('-pheno', '--phenotype_file', required=True, help="Path to phenotype file")
-    parser.add_argument('-o', '--output_file', required=True, help="Path to save the merged output")
+    parser.add_argument('-o', '--output_file', required=True, help="Path to save the merged output (.parquet/.arrow for columnar output, otherwise CSV)")
     #prscs_file = 'path/to/PRScs_merged_sscore.tsv'
     #covariate_file = 'path/to/covariate_data.csv'
     #phenotype_file = 'path/to/phenotype_data.csv'
@@ -4,8 +4,26 @@ import pandas as pd
 from glob import glob
 import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.preprocessing import StandardScaler
 
+from prs_table_io import write_table
+
+# Columns renamed per input file so they stay distinguishable after merging
+RENAME_COLUMNS = [
+    "SCORE1_AVG",
+    "ALLELE_CT",
+    "NAMED_ALLELE_DOSAGE_SUM",
+]
+KEY_COLUMNS = ["FID", "IID"]
+SSCORE_DTYPES = {
+    "FID": str,
+    "IID": str,
+    "SCORE1_AVG": "float64",
+    "ALLELE_CT": "float64",
+    "NAMED_ALLELE_DOSAGE_SUM": "float64",
+}
+
 def merge_sscore_files(input_dir, output_file):
     # Step 1: Get all .sscore files in the input directory
     sscore_files = glob(os.path.join(input_dir, "*.sscore"))
@@ -19,7 +37,7 @@ def merge_sscore_files(input_dir, output_file):
 
     for file in sscore_files:
         # Read the current .sscore file
-        df = pd.read_csv(file, delim_whitespace=True)
+        df = pd.read_csv(file, sep=r"\s+")
 
         # Ensure the FID column doesn't have a hashtag (#) at the beginning
         if '#FID' in df.columns:
@@ -57,7 +75,69 @@ def merge_sscore_files(input_dir, output_file):
     merged_scores = remove_duplicate_columns(merged_scores, "PHENO1")
 
     # Step 5: Save the merged result to the output file
-    merged_scores.to_csv(output_file, sep="\t", index=False)
+    write_table(merged_scores, output_file, sep="\t")
+    print(f"Merged .sscore files saved to: {output_file}")
+
+def read_sscore(file):
+    """
+    Read only the key, PHENO1 and score columns of one .sscore file, with explicit
+    dtypes, indexed on FID/IID and with score columns suffixed by the file name.
+    """
+    wanted = set(KEY_COLUMNS + ["PHENO1"] + RENAME_COLUMNS)
+    df = pd.read_csv(
+        file,
+        sep=r"\s+",
+        usecols=lambda col: col.lstrip("#") in wanted,
+        dtype={**SSCORE_DTYPES, **{f"#{k}": v for k, v in SSCORE_DTYPES.items()}},
+    )
+    df.columns = [col.lstrip("#") for col in df.columns]
+    df = df.set_index(KEY_COLUMNS)
+    return df.rename(columns={col: f"{col}_{os.path.basename(file)}" for col in RENAME_COLUMNS if col in df.columns})
+
+def standardize_columns(df, columns):
+    """
+    Standardize columns to mean=0, SD=1 in one vectorized pass
+    (population SD, NaNs ignored, as StandardScaler does).
+    """
+    values = df[columns]
+    std = values.std(ddof=0).replace(0, 1)
+    return ((values - values.mean()) / std).add_suffix("_std")
+
+def merge_sscore_files_single_pass(input_dir, output_file, threads=8):
+    """
+    Merge .sscore files by aligning them on one shared FID/IID index and
+    concatenating once, instead of folding repeated outer merges.
+    """
+    sscore_files = sorted(glob(os.path.join(input_dir, "*.sscore")))
+
+    if not sscore_files:
+        print(f"No .sscore files found in directory: {input_dir}")
+        return
+
+    # Step 1: Read all .sscore files concurrently
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        frames = list(pool.map(read_sscore, sscore_files))
+    print(f"Read {len(frames)} .sscore files.")
+
+    # Step 2: Keep a single PHENO1 column, taking the first non-missing value per sample
+    phenos = [df.pop("PHENO1") for df in frames if "PHENO1" in df.columns]
+
+    # Step 3: Align everything on the shared sample index with one concat
+    merged_scores = pd.concat(frames, axis=1, join="outer")
+    if phenos:
+        pheno = pd.concat(phenos, axis=1, join="outer").bfill(axis=1).iloc[:, 0]
+        merged_scores.insert(0, "PHENO1", pheno.reindex(merged_scores.index))
+
+    # Step 4: Standardize all PRS columns at once
+    prs_columns = [col for col in merged_scores.columns if 'SCORE1_AVG' in col]
+    if prs_columns:
+        merged_scores = pd.concat([merged_scores, standardize_columns(merged_scores, prs_columns)], axis=1)
+        print(f"Standardized {len(prs_columns)} PRS columns to mean = 0, SD = 1.")
+    else:
+        print("No PRS columns found to standardize.")
+
+    # Step 5: Save the merged result to the output file
+    write_table(merged_scores.reset_index(), output_file, sep="\t")
     print(f"Merged .sscore files saved to: {output_file}")
 
 def remove_duplicate_columns(df, column_name):
@@ -80,14 +160,23 @@ def main():
         "-i", "--input_dir", required=True, help="Directory containing .sscore files to merge."
     )
     parser.add_argument(
-        "-o", "--output_file", required=True, help="Name of the output merged file."
+        "-o", "--output_file", required=True, help="Name of the output merged file (.parquet/.arrow for columnar output, otherwise TSV)."
+    )
+    parser.add_argument(
+        "--single_pass", action="store_true", help="Read files concurrently and align them on one sample index instead of repeated merges."
+    )
+    parser.add_argument(
+        "--threads", type=int, default=8, help="Number of files read concurrently in --single_pass mode (default: 8)."
     )
     
     # Parse the arguments
     args = parser.parse_args()
     
     # Call the merge function
-    merge_sscore_files(args.input_dir, args.output_file)
+    if args.single_pass:
+        merge_sscore_files_single_pass(args.input_dir, args.output_file, args.threads)
+    else:
+        merge_sscore_files(args.input_dir, args.output_file)
 
 if __name__ == "__main__":
     main()
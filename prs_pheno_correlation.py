@@ -6,13 +6,14 @@ import matplotlib.pyplot as plt
 import os
 import numpy as np
 from scipy.stats import pearsonr, pointbiserialr
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import log_loss
 
-def calculate_correlation_and_plot(prs_file, prs_column, phenotype_column, output_dir):
+from prs_bootstrap import confidence_intervals, weighted_pseudo_r2
+from prs_table_io import read_table
+
+def calculate_correlation_and_plot(prs_file, prs_column, phenotype_column, output_dir, n_boot=0, seed=12345, workers=1):
     # Load the PRS data
     try:
-        df_prs = pd.read_csv(prs_file)
+        df_prs = read_table(prs_file, columns=[prs_column, phenotype_column])
     except Exception as e:
         print(f"Error reading file: {e}")
         return
@@ -40,14 +41,11 @@ def calculate_correlation_and_plot(prs_file, prs_column, phenotype_column, outpu
         # Convert binary phenotype to 0 and 1 if not already
         df_prs[phenotype_column] = pd.Categorical(df_prs[phenotype_column]).codes
 
-        # Logistic regression for pseudo-R-squared
-        model = LogisticRegression()
-        model.fit(df_prs[[prs_column]], df_prs[phenotype_column])
-
-        # Calculate pseudo-R-squared (McFadden's)
-        log_likelihood_full = -log_loss(df_prs[phenotype_column], model.predict_proba(df_prs[[prs_column]]), normalize=False)
-        log_likelihood_null = -log_loss(df_prs[phenotype_column], [df_prs[phenotype_column].mean()] * len(df_prs), normalize=False)
-        pseudo_r_squared = 1 - (log_likelihood_full / log_likelihood_null)
+        # Pseudo-R-squared (McFadden's) of an unpenalised logistic regression, fitted by the
+        # bootstrap engine with unit weights so that a bootstrap CI belongs to this estimate
+        pseudo_r_squared = weighted_pseudo_r2(
+            np.ones((1, len(df_prs))), df_prs[phenotype_column].to_numpy(dtype=float), df_prs[[prs_column]].to_numpy(dtype=float)
+        )[0, 0]
 
         # Calculate point-biserial correlation
         corr, p_value = pointbiserialr(df_prs[prs_column], df_prs[phenotype_column])
@@ -62,6 +60,19 @@ def calculate_correlation_and_plot(prs_file, prs_column, phenotype_column, outpu
         print(f"Correlation: {corr:.4f}, R-squared: {r_squared:.4f}, P-value: {p_value:.4e}")
         correlation_metric = f"R-squared: {r_squared:.4f}\nP-value: {p_value:.4e}"
 
+    # Bootstrap a confidence interval for the (pseudo-)R-squared
+    ci_text = ""
+    if n_boot:
+        metric = "pseudo_r2" if is_binary else "r2"
+        ci = confidence_intervals(
+            df_prs[phenotype_column].to_numpy(), df_prs[[prs_column]].to_numpy(), [prs_column],
+            metrics=(metric,), n_boot=n_boot, seed=seed, workers=workers,
+        ).iloc[0]
+        label = "Pseudo-R-squared" if is_binary else "R-squared"
+        ci_text = f"{label} 95% CI: [{ci['CI Lower']:.4f}, {ci['CI Upper']:.4f}]"
+        print(f"{ci_text} ({n_boot} bootstrap replicates)")
+        correlation_metric += f"\n{ci_text}"
+
     # Ensure the output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
@@ -76,6 +87,8 @@ def calculate_correlation_and_plot(prs_file, prs_column, phenotype_column, outpu
             f.write(f"Correlation between {prs_column} and {phenotype_column}: Pearson Correlation: {corr:.4f}\n")
             f.write(f"Correlation between {prs_column} and {phenotype_column}: R-squared: {r_squared:.4f}\n")
             f.write(f"Correlation between {prs_column} and {phenotype_column}: P-value: {p_value:.4e}\n")
+        if ci_text:
+            f.write(f"Correlation between {prs_column} and {phenotype_column}: {ci_text}\n")
     print(f"Correlation result saved to: {correlation_file}")
 
     # Plot scatter plot
@@ -126,11 +139,22 @@ def main():
         "-out", "--output_dir", required=True, help="Directory to save the output files (correlation result and scatter plot)."
     )
     
+    # Define the optional bootstrap arguments
+    parser.add_argument(
+        "--bootstrap", type=int, default=0, help="Number of bootstrap replicates for a (pseudo-)R-squared confidence interval (default: 0, no bootstrap)."
+    )
+    parser.add_argument(
+        "--seed", type=int, default=12345, help="Bootstrap random seed (default: 12345)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of bootstrap worker processes (default: 1)."
+    )
+    
     # Parse the arguments
     args = parser.parse_args()
 
     # Call the calculate_correlation_and_plot function with the parsed arguments
-    calculate_correlation_and_plot(args.prs_file, args.prs_column, args.phenotype_column, args.output_dir)
+    calculate_correlation_and_plot(args.prs_file, args.prs_column, args.phenotype_column, args.output_dir, args.bootstrap, args.seed, args.workers)
 
 if __name__ == "__main__":
     main()
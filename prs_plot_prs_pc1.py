@@ -8,11 +8,13 @@ from scipy.stats import pearsonr
 from sklearn.linear_model import LinearRegression
 import argparse
 
+from prs_table_io import read_table
+
 def plot_prs_vs_pc1(pca_file, prs_file, prs_column, output_dir):
     try:
         # Load the PCA and PRS data
-        df_pca = pd.read_csv(pca_file, sep="\t")
-        df_prs = pd.read_csv(prs_file, sep="\t")
+        df_pca = read_table(pca_file, columns=['IID', 'PC1'], sep="\t")
+        df_prs = read_table(prs_file, columns=['IID', prs_column], sep="\t")
     except Exception as e:
         print(f"Error reading files: {e}")
         return
@@ -10,19 +10,23 @@ import numpy as np
 import argparse
 import os
 import scipy.stats as stats
+from scipy.signal import fftconvolve
 import datashader as ds
 from datashader import transfer_functions as tf
 
+# Columns of the PRScs.py _pst_eff output (no header line)
+PRSCS_COLUMNS = ["CHR", "SNP", "BP", "A1", "A2", "BETA"]
+
 def plot_prscs_betas(prscs_file, output_dir, has_headers):
     # Step 1: Define column names for PRScs output
-    column_names = ["CHR", "BP", "SNP", "A1", "A2", "BETA"]
+    column_names = PRSCS_COLUMNS
 
     # Step 2: Load PRScs output with or without headers
     try:
         if has_headers:
-            df = pd.read_csv(prscs_file, delim_whitespace=True)
+            df = pd.read_csv(prscs_file, sep=r"\s+")
         else:
-            df = pd.read_csv(prscs_file, delim_whitespace=True, header=None, names=column_names)
+            df = pd.read_csv(prscs_file, sep=r"\s+", header=None, names=column_names)
     except FileNotFoundError:
         print(f"Error: The file {prscs_file} was not found.")
         return
@@ -111,6 +115,158 @@ def plot_prscs_betas(prscs_file, output_dir, has_headers):
     plt.close()
     print(f"Beta scatter plot saved: {scatter_output_path}")
     
+def read_chunks(prscs_file, has_headers, chunksize):
+    """
+    Stream the CHR, BP and BETA columns of a weight file in numeric chunks.
+    """
+    if has_headers:
+        reader = pd.read_csv(prscs_file, sep=r"\s+", usecols=["CHR", "BP", "BETA"], chunksize=chunksize)
+    else:
+        reader = pd.read_csv(prscs_file, sep=r"\s+", header=None, names=PRSCS_COLUMNS, usecols=["CHR", "BP", "BETA"], chunksize=chunksize)
+    for chunk in reader:
+        yield chunk.apply(pd.to_numeric, errors='coerce')
+
+def sketch_quantiles(counts, edges, ranks):
+    """
+    Values at the given 1-based ranks, interpolated within the bins of a fine-grained histogram.
+    """
+    cum = np.cumsum(counts)
+    j = np.clip(np.searchsorted(cum, ranks), 0, len(counts) - 1)
+    before = np.where(j > 0, cum[j - 1], 0)
+    frac = (ranks - before) / np.maximum(counts[j], 1)
+    return edges[j] + frac * (edges[j + 1] - edges[j])
+
+def plot_prscs_betas_chunked(prscs_file, output_dir, has_headers, chunksize=1_000_000, bins=100, sketch_resolution=1000, n_quantiles=2000):
+    """
+    Out-of-core version of plot_prscs_betas for weight files too large to load at once.
+
+    A first pass over CHR/BP/BETA collects the beta range, moments and per-chromosome
+    position ranges (for the genome offsets). A second pass accumulates a fine-grained beta
+    histogram, which serves as quantile sketch for the QQ plot and is binned down for the
+    histogram and KDE, and the datashader aggregate of the genome-position scatter.
+    Memory is bounded by the chunk size, not the number of SNPs.
+
+    Args:
+        prscs_file (str): PRS-CS (or other) weight file.
+        output_dir (str): Directory to save the plots.
+        has_headers (bool): Whether the file has a header line.
+        chunksize (int): Rows per chunk.
+        bins (int): Histogram bins.
+        sketch_resolution (int): Sketch bins per histogram bin.
+        n_quantiles (int): Points on the QQ plot.
+    """
+    # Pass 1: ranges, moments and chromosome offsets
+    n_beta, beta_sum, beta_sq = 0, 0.0, 0.0
+    beta_min, beta_max = np.inf, -np.inf
+    chr_ranges = []
+    try:
+        for chunk in read_chunks(prscs_file, has_headers, chunksize):
+            beta = chunk['BETA'].dropna().to_numpy(dtype=float)
+            if len(beta):
+                n_beta += len(beta)
+                beta_sum += beta.sum()
+                beta_sq += (beta ** 2).sum()
+                beta_min, beta_max = min(beta_min, beta.min()), max(beta_max, beta.max())
+            chunk = chunk.dropna(subset=['CHR', 'BP', 'BETA'])
+            chr_ranges.append(chunk.groupby('CHR')['BP'].agg(['min', 'max']))
+    except FileNotFoundError:
+        print(f"Error: The file {prscs_file} was not found.")
+        return
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        return
+
+    if n_beta == 0:
+        print("No beta values found in the file.")
+        return
+
+    chr_ranges = pd.concat(chr_ranges).groupby(level=0).agg({'min': 'min', 'max': 'max'}).sort_index()
+    chr_offsets = chr_ranges['max'].cumsum().shift(fill_value=0)
+    print(f"Pass 1: {n_beta} betas, {len(chr_ranges)} chromosomes.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(prscs_file))[0]
+
+    if beta_min == beta_max:
+        beta_min, beta_max = beta_min - 0.5, beta_max + 0.5
+    n_fine = bins * sketch_resolution
+    fine_edges = np.linspace(beta_min, beta_max, n_fine + 1)
+    fine_counts = np.zeros(n_fine, dtype=np.int64)
+
+    x_range = ((chr_ranges['min'] + chr_offsets).min(), (chr_ranges['max'] + chr_offsets).max())
+    cvs = ds.Canvas(plot_width=800, plot_height=100, x_range=x_range, y_range=(beta_min, beta_max))
+    agg = None
+
+    # Pass 2: histogram sketch and scatter aggregate
+    for chunk in read_chunks(prscs_file, has_headers, chunksize):
+        beta = chunk['BETA'].dropna().to_numpy(dtype=float)
+        idx = np.clip(((beta - beta_min) / (beta_max - beta_min) * n_fine).astype(np.int64), 0, n_fine - 1)
+        fine_counts += np.bincount(idx, minlength=n_fine)
+
+        chunk = chunk.dropna(subset=['CHR', 'BP', 'BETA'])
+        chunk['genome_pos'] = chunk['BP'] + chunk['CHR'].map(chr_offsets)
+        chunk_agg = cvs.points(chunk, 'genome_pos', 'BETA')
+        agg = chunk_agg if agg is None else agg + chunk_agg
+
+    # Histogram of betas with a binned Gaussian KDE (Scott's rule, as seaborn)
+    counts = fine_counts.reshape(bins, sketch_resolution).sum(axis=1)
+    edges = fine_edges[::sketch_resolution]
+    std = np.sqrt(max(beta_sq / n_beta - (beta_sum / n_beta) ** 2, 0) * n_beta / max(n_beta - 1, 1))
+    fine_width = fine_edges[1] - fine_edges[0]
+
+    plt.figure(figsize=(10, 6))
+    plt.hist(edges[:-1], bins=edges, weights=counts, color='blue', alpha=0.75, edgecolor='black')
+    if std > 0:
+        bandwidth = std * n_beta ** (-1 / 5) / fine_width
+        half = int(np.ceil(4 * bandwidth))
+        kernel = stats.norm.pdf(np.arange(-half, half + 1) / bandwidth)
+        density = fftconvolve(fine_counts, kernel / kernel.sum(), mode='same')
+        centers = (fine_edges[:-1] + fine_edges[1:]) / 2
+        plt.plot(centers, density * sketch_resolution, color='blue')
+    plt.title("Distribution of Betas (Effect Sizes)", fontsize=14)
+    plt.xlabel("Beta", fontsize=12)
+    plt.ylabel("Frequency", fontsize=12)
+    plt.grid(axis="y", alpha=0.75)
+    plt.tight_layout()
+    hist_output_path = os.path.join(output_dir, f"{base_name}_beta_distribution.png")
+    plt.savefig(hist_output_path)
+    plt.close()
+    print(f"Beta histogram saved: {hist_output_path}")
+
+    # QQ plot from the sketch, at Filliben's order statistic medians (as scipy.stats.probplot)
+    ranks = np.unique(np.linspace(1, n_beta, min(n_quantiles, n_beta)).round().astype(np.int64))
+    medians = (ranks - 0.3175) / (n_beta + 0.365)
+    medians[ranks == n_beta] = 0.5 ** (1 / n_beta)
+    medians[ranks == 1] = 1 - 0.5 ** (1 / n_beta)
+    osm = stats.norm.ppf(medians)
+    osr = sketch_quantiles(fine_counts, fine_edges, ranks)
+    osr[ranks == 1], osr[ranks == n_beta] = fine_edges[0], fine_edges[-1]
+    slope, intercept = np.polyfit(osm, osr, 1)
+
+    plt.figure(figsize=(10, 6))
+    plt.plot(osm, osr, 'bo')
+    plt.plot(osm, slope * osm + intercept, 'r-')
+    plt.xlabel("Theoretical quantiles")
+    plt.ylabel("Ordered Values")
+    plt.title("QQ Plot of Betas", fontsize=14)
+    plt.grid(True)
+    qq_output_path = os.path.join(output_dir, f"{base_name}_beta_qqplot.png")
+    plt.savefig(qq_output_path)
+    plt.close()
+    print(f"QQ plot saved: {qq_output_path}")
+
+    # Scatter plot of betas across chromosomes from the accumulated aggregate
+    img = tf.shade(agg, cmap='Viridis', how='linear')
+    fig, ax = plt.subplots(figsize=(16, 2))
+    ax.imshow(img.to_pil(), origin='lower')
+    ax.set_title("Scatter Plot of Betas Across Chromosomes")
+    ax.set_xlabel("Genome Position")
+    ax.set_ylabel("Effect Size (Beta)")
+    scatter_output_path = os.path.join(output_dir, f"{base_name}_beta_scatter.png")
+    plt.savefig(scatter_output_path)
+    plt.close()
+    print(f"Beta scatter plot saved: {scatter_output_path}")
+
 def main():
     # Command-line argument parser
     parser = argparse.ArgumentParser(description="Plot PRScs Betas.")
@@ -120,6 +276,10 @@ def main():
         "-o", "--output_dir", required=True, help="Directory to save the plots.")
     parser.add_argument(
         "--has_headers", action="store_true", help="Specify if the input file has headers.")
+    parser.add_argument(
+        "--chunked", action="store_true", help="Stream the file in chunks with bounded memory (for multi-million-SNP weight files).")
+    parser.add_argument(
+        "--chunksize", type=int, default=1_000_000, help="Rows per chunk with --chunked (default: 1000000).")
 
     # Parse arguments
     args = parser.parse_args()
@@ -128,7 +288,10 @@ def main():
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Call the plot function
-    plot_prscs_betas(args.input_file, args.output_dir, args.has_headers)
+    if args.chunked:
+        plot_prscs_betas_chunked(args.input_file, args.output_dir, args.has_headers, chunksize=args.chunksize)
+    else:
+        plot_prscs_betas(args.input_file, args.output_dir, args.has_headers)
 
 if __name__ == "__main__":
     main()
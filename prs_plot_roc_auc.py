@@ -7,27 +7,32 @@ from sklearn.linear_model import LogisticRegression, LinearRegression
 import argparse
 import os
 import numpy as np
+from itertools import combinations
+from scipy.stats import norm, rankdata
 
-def plot_and_save(prs_file, prs_column, pheno_column, output_dir):
+from prs_bootstrap import confidence_intervals
+from prs_table_io import expand_columns, read_table, table_columns, write_table
+
+def plot_and_save(prs_file, prs_column, pheno_column, output_dir, n_boot=0, seed=12345, workers=1):
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
     # Load the PRS data
     try:
-        df_prs = pd.read_csv(prs_file)
+        df_prs = read_table(prs_file, columns=[prs_column, pheno_column])
     except Exception as e:
         print(f"Error reading file: {e}")
         return
 
-    # Set missing value code (-9) to NaN
-    df_prs[prs_column] = df_prs[prs_column].replace(-9, np.nan)
-    df_prs[pheno_column] = df_prs[pheno_column].replace(-9, np.nan)
-
     # Check if necessary columns exist
     if prs_column not in df_prs.columns or pheno_column not in df_prs.columns:
         print(f"Error: '{prs_column}' and/or '{pheno_column}' column not found.")
         return
 
+    # Set missing value code (-9) to NaN
+    df_prs[prs_column] = df_prs[prs_column].replace(-9, np.nan)
+    df_prs[pheno_column] = df_prs[pheno_column].replace(-9, np.nan)
+
     # Sanitize column names for filenames (remove spaces, special characters, etc.)
     prs_column_sanitized = prs_column.replace(" ", "_").replace("-", "_")
     pheno_column_sanitized = pheno_column.replace(" ", "_").replace("-", "_")
@@ -53,6 +58,16 @@ def plot_and_save(prs_file, prs_column, pheno_column, output_dir):
         output_text += f"AUC-ROC: {auc}\n"
         print(f"AUC-ROC: {auc}")
 
+        # Bootstrap a confidence interval for the AUC
+        if n_boot:
+            y = pd.Categorical(df_prs_cleaned[pheno_column]).codes
+            ci = confidence_intervals(
+                y, df_prs_cleaned[[prs_column]].to_numpy(), [prs_column],
+                metrics=("auc",), n_boot=n_boot, seed=seed, workers=workers,
+            ).iloc[0]
+            output_text += f"AUC-ROC 95% CI: [{ci['CI Lower']:.4f}, {ci['CI Upper']:.4f}] ({n_boot} bootstrap replicates)\n"
+            print(f"AUC-ROC 95% CI: [{ci['CI Lower']:.4f}, {ci['CI Upper']:.4f}]")
+
         # Plot ROC curve
         fpr, tpr, thresholds = roc_curve(df_prs_cleaned[pheno_column], probs)
         plt.figure(figsize=(8, 6))
@@ -84,6 +99,15 @@ def plot_and_save(prs_file, prs_column, pheno_column, output_dir):
         output_text += f"R-squared: {r_squared:.4f}\n"
         print(f"R-squared: {r_squared:.4f}")
 
+        # Bootstrap a confidence interval for the R-squared
+        if n_boot:
+            ci = confidence_intervals(
+                df_prs_cleaned[pheno_column].to_numpy(), df_prs_cleaned[[prs_column]].to_numpy(), [prs_column],
+                metrics=("r2",), n_boot=n_boot, seed=seed, workers=workers,
+            ).iloc[0]
+            output_text += f"R-squared 95% CI: [{ci['CI Lower']:.4f}, {ci['CI Upper']:.4f}] ({n_boot} bootstrap replicates)\n"
+            print(f"R-squared 95% CI: [{ci['CI Lower']:.4f}, {ci['CI Upper']:.4f}]")
+
         # Scatter plot with regression line
         plt.figure(figsize=(8, 6))
         plt.scatter(df_prs_cleaned[prs_column], df_prs_cleaned[pheno_column], alpha=0.6, label="Data points")
@@ -106,6 +130,121 @@ def plot_and_save(prs_file, prs_column, pheno_column, output_dir):
         f.write(output_text)
     print(f"Results saved to {output_text_path}")
 
+def delong_auc(y, scores):
+    """
+    AUCs and DeLong covariance for many score columns at once.
+
+    AUC is computed in its Mann-Whitney form from midranks (one sort per column);
+    the placement values from the same ranks give the DeLong covariance matrix.
+
+    Args:
+        y (np.ndarray): Binary outcome coded 0/1.
+        scores (np.ndarray): (samples x columns) scores; higher means more likely a case.
+
+    Returns:
+        (np.ndarray, np.ndarray): AUC per column and the (columns x columns) covariance.
+    """
+    case = y == 1
+    scores = np.asarray(scores, dtype=float).reshape(len(y), -1)
+    m, n = case.sum(), (~case).sum()
+
+    ranks_all = rankdata(scores, axis=0)
+    ranks_case = rankdata(scores[case], axis=0)
+    ranks_ctrl = rankdata(scores[~case], axis=0)
+
+    # Placement values: share of controls below each case, of cases above each control
+    v10 = (ranks_all[case] - ranks_case) / n
+    v01 = 1 - (ranks_all[~case] - ranks_ctrl) / m
+    auc = v10.mean(axis=0)
+
+    s10 = np.atleast_2d(np.cov(v10, rowvar=False))
+    s01 = np.atleast_2d(np.cov(v01, rowvar=False))
+    return auc, s10 / m + s01 / n
+
+def evaluate_binary_batch(prs_file, prs_columns, pheno_column, output_dir, plot=False):
+    """
+    Evaluate many PRS columns against a binary phenotype in one pass.
+
+    Writes an AUC table (AUC, DeLong SE and 95% CI per column) and a table of
+    pairwise DeLong comparisons. ROC curves are only rendered when plot=True.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        df_prs = read_table(prs_file, columns=prs_columns + [pheno_column])
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        return
+
+    missing = [col for col in prs_columns + [pheno_column] if col not in df_prs.columns]
+    if missing:
+        print(f"Error: column(s) not found: {', '.join(missing)}")
+        return
+
+    # Set missing value code (-9) to NaN; paired comparisons need rows complete for all columns
+    df_prs = df_prs.replace(-9, np.nan).dropna()
+    if df_prs[pheno_column].nunique() != 2:
+        print(f"Error: '{pheno_column}' is not binary.")
+        return
+
+    y = pd.Categorical(df_prs[pheno_column]).codes
+    scores = df_prs[prs_columns].to_numpy(dtype=float)
+    print(f"Evaluating {len(prs_columns)} PRS columns on {len(y)} samples ({int(y.sum())} cases).")
+
+    auc, cov = delong_auc(y, scores)
+    se = np.sqrt(np.diag(cov))
+    auc_table = pd.DataFrame({
+        "PRS Column": prs_columns,
+        "AUC": auc,
+        "SE": se,
+        "CI Lower": auc - norm.ppf(0.975) * se,
+        "CI Upper": auc + norm.ppf(0.975) * se,
+        "N Cases": int(y.sum()),
+        "N Controls": int(len(y) - y.sum()),
+    })
+
+    pairs = np.array(list(combinations(range(len(prs_columns)), 2)), dtype=int).reshape(-1, 2)
+    i, j = pairs[:, 0], pairs[:, 1]
+    diff = auc[i] - auc[j]
+    diff_se = np.sqrt(np.maximum(cov[i, i] + cov[j, j] - 2 * cov[i, j], 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = diff / diff_se
+    comparisons = pd.DataFrame({
+        "PRS Column 1": np.asarray(prs_columns)[i],
+        "PRS Column 2": np.asarray(prs_columns)[j],
+        "AUC Difference": diff,
+        "SE": diff_se,
+        "Z": z,
+        "P": 2 * norm.sf(np.abs(z)),
+    })
+
+    pheno_column_sanitized = pheno_column.replace(" ", "_").replace("-", "_")
+    auc_path = os.path.join(output_dir, f"auc_{pheno_column_sanitized}.tsv")
+    comparisons_path = os.path.join(output_dir, f"auc_delong_comparisons_{pheno_column_sanitized}.tsv")
+    write_table(auc_table, auc_path, sep="\t")
+    write_table(comparisons, comparisons_path, sep="\t")
+    print(auc_table.to_string(index=False))
+    print(f"AUC table saved to {auc_path}")
+    print(f"DeLong comparisons saved to {comparisons_path}")
+
+    if plot:
+        for k, prs_column in enumerate(prs_columns):
+            prs_column_sanitized = prs_column.replace(" ", "_").replace("-", "_")
+            fpr, tpr, _ = roc_curve(y, scores[:, k])
+            plt.figure(figsize=(8, 6))
+            plt.plot(fpr, tpr, color='b', label=f'ROC curve (AUC = {auc[k]:.2f})')
+            plt.plot([0, 1], [0, 1], color='gray', linestyle='--')  # Diagonal line
+            plt.title(f"ROC Curve for {prs_column_sanitized} vs {pheno_column_sanitized}")
+            plt.xlabel("False Positive Rate")
+            plt.ylabel("True Positive Rate")
+            plt.legend(loc="lower right")
+            plt.grid(alpha=0.5)
+            plt.savefig(os.path.join(output_dir, f"roc_curve_{prs_column_sanitized}_{pheno_column_sanitized}.png"))
+            plt.close()
+        print(f"ROC curves saved to {output_dir}")
+
+    return auc_table, comparisons
+
 def main():
     # Command-line argument parser
     parser = argparse.ArgumentParser(description="Train a model and plot/save ROC-AUC or regression for PRS prediction.")
@@ -117,7 +256,7 @@ def main():
     
     # Define the argument for the PRS column name
     parser.add_argument(
-        "-prs", "--prs_column", required=True, help="Name of the PRS column."
+        "-prs", "--prs_column", required=True, help="Name of the PRS column (with --batch: comma-separated names or patterns)."
     )
     
     # Define the argument for the phenotype column name
@@ -130,11 +269,35 @@ def main():
         "-out", "--output_dir", required=True, help="Directory to save plots and results."
     )
 
+    # Define the optional bootstrap arguments
+    parser.add_argument(
+        "--bootstrap", type=int, default=0, help="Number of bootstrap replicates for an AUC / R-squared confidence interval (default: 0, no bootstrap)."
+    )
+    parser.add_argument(
+        "--seed", type=int, default=12345, help="Bootstrap random seed (default: 12345)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of bootstrap worker processes (default: 1)."
+    )
+
+    # Define the batch evaluation arguments
+    parser.add_argument(
+        "--batch", action="store_true", help="Evaluate many PRS columns against a binary phenotype with rank-based AUC and DeLong comparisons."
+    )
+    parser.add_argument(
+        "--plot", action="store_true", help="With --batch: also render a ROC curve per PRS column."
+    )
+
     # Parse the arguments
     args = parser.parse_args()
 
+    if args.batch:
+        prs_columns = expand_columns(args.prs_column, table_columns(args.prs_file))
+        evaluate_binary_batch(args.prs_file, prs_columns, args.pheno_column, args.output_dir, args.plot)
+        return
+
     # Call the function with parsed arguments
-    plot_and_save(args.prs_file, args.prs_column, args.pheno_column, args.output_dir)
+    plot_and_save(args.prs_file, args.prs_column, args.pheno_column, args.output_dir, args.bootstrap, args.seed, args.workers)
 
 if __name__ == "__main__":
     main()
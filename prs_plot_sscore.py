@@ -5,14 +5,21 @@
 # Histogram Split by PHENO1: Overlays histograms for each unique PHENO1 value.
 
 import pandas as pd
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+from prs_table_io import read_table, table_columns
 
 def plot_merged_sscore(input_file, output_dir):
     # Step 1: Read the merged .sscore file
     try:
-        df = pd.read_csv(input_file, delim_whitespace=True)
+        columns = [col for col in table_columns(input_file, sep=r"\s+") if col.startswith("SCORE") or col == "PHENO1"]
+        df = read_table(input_file, columns=columns, sep=r"\s+")
     except Exception as e:
         print(f"Error reading file: {e}")
         return
@@ -69,6 +76,150 @@ def plot_merged_sscore(input_file, output_dir):
             plt.close()
             print(f"PHENO1-split plot saved: {pheno_output_path}")
 
+def histogram_counts(values, groups, n_groups, bins=50):
+    """
+    Shared-bin histograms of every column of values, overall and per group, in one pass.
+
+    Args:
+        values (np.ndarray): (samples x columns) scores, NaN for missing.
+        groups (np.ndarray): Group code per sample in 0..n_groups (n_groups = no group).
+        n_groups (int): Number of groups.
+        bins (int): Number of bins per column.
+
+    Returns:
+        tuple: (edges (columns x bins+1), counts (columns x n_groups+1 x bins)).
+    """
+    n_cols = values.shape[1]
+    lo = np.nanmin(values, axis=0)
+    hi = np.nanmax(values, axis=0)
+    # Same convention as np.histogram for constant columns
+    constant = lo == hi
+    lo = np.where(constant, lo - 0.5, lo)
+    hi = np.where(constant, hi + 0.5, hi)
+    edges = lo[:, None] + (hi - lo)[:, None] * np.linspace(0, 1, bins + 1)[None, :]
+    edges[:, -1] = hi
+
+    valid = ~np.isnan(values)
+    with np.errstate(invalid="ignore"):
+        b = np.floor((values - lo) / (hi - lo) * bins)
+    b = np.clip(np.nan_to_num(b), 0, bins - 1).astype(np.int64)
+    # Correct for rounding at the bin edges, as np.histogram does
+    col_edges = np.take_along_axis(edges.T, b, axis=0), np.take_along_axis(edges.T, b + 1, axis=0)
+    b -= values < col_edges[0]
+    b += (values >= col_edges[1]) & (b != bins - 1)
+    flat = (np.arange(n_cols)[None, :] * (n_groups + 1) + groups[:, None]) * bins + b
+    counts = np.bincount(flat[valid], minlength=n_cols * (n_groups + 1) * bins)
+    return edges, counts.reshape(n_cols, n_groups + 1, bins)
+
+def render_score_plots(score_col, edges, counts, labels, overall_output_path, pheno_output_path):
+    """
+    Draw the overall and split-by-PHENO1 histograms of one SCORE column from precomputed counts.
+    """
+    if overall_output_path:
+        plt.figure(figsize=(10, 6))
+        plt.hist(edges[:-1], bins=edges, weights=counts.sum(axis=0), alpha=0.7, color="blue", edgecolor="black")
+        plt.title(f"Overall Distribution of {score_col}", fontsize=14)
+        plt.xlabel("Score", fontsize=12)
+        plt.ylabel("Frequency", fontsize=12)
+        plt.grid(axis="y", alpha=0.75)
+        plt.savefig(overall_output_path)
+        plt.close()
+
+    if pheno_output_path:
+        plt.figure(figsize=(10, 6))
+        for k, pheno in enumerate(labels):
+            plt.hist(edges[:-1], bins=edges, weights=counts[k], alpha=0.5, label=f"PHENO1 = {pheno}", edgecolor="black")
+        plt.title(f"Distribution of {score_col} by PHENO1", fontsize=14)
+        plt.xlabel("Score", fontsize=12)
+        plt.ylabel("Frequency", fontsize=12)
+        plt.legend(title="PHENO1", fontsize=10)
+        plt.grid(axis="y", alpha=0.75)
+        plt.savefig(pheno_output_path)
+        plt.close()
+    return score_col
+
+def is_up_to_date(path, input_mtime):
+    return os.path.exists(path) and os.path.getmtime(path) >= input_mtime
+
+def plot_merged_sscore_batch(input_file, output_dir, workers=4, skip_existing=False, bins=50):
+    """
+    Batch version of plot_merged_sscore for many SCORE columns: histograms for all columns
+    and PHENO1 groups are computed in one numpy pass with shared bins per column, and the
+    figures are rendered headless in a process pool.
+
+    Args:
+        input_file (str): Merged .sscore file (text, Parquet or Arrow).
+        output_dir (str): Directory to save the plots.
+        workers (int): Maximum number of rendering processes.
+        skip_existing (bool): Skip figures that are newer than the input file.
+        bins (int): Number of histogram bins.
+    """
+    try:
+        available = table_columns(input_file, sep=r"\s+")
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        return
+
+    score_columns = [col for col in available if col.startswith("SCORE")]
+    if not score_columns:
+        print("No SCORE columns found in the file to plot.")
+        return
+
+    pheno_available = "PHENO1" in available
+    if not pheno_available:
+        print("PHENO1 column not found. Only overall plots will be generated.")
+
+    # Work out which figures need (re)drawing before loading any data
+    input_mtime = os.path.getmtime(input_file)
+    outputs = {}
+    for score_col in score_columns:
+        overall_output_path = os.path.join(output_dir, f"{score_col}_overall_distribution.png")
+        pheno_output_path = os.path.join(output_dir, f"{score_col}_by_PHENO1_distribution.png") if pheno_available else None
+        if skip_existing:
+            if is_up_to_date(overall_output_path, input_mtime):
+                overall_output_path = None
+            if pheno_output_path and is_up_to_date(pheno_output_path, input_mtime):
+                pheno_output_path = None
+        if overall_output_path or pheno_output_path:
+            outputs[score_col] = (overall_output_path, pheno_output_path)
+
+    skipped = len(score_columns) - len(outputs)
+    if skipped:
+        print(f"Skipping {skipped} SCORE columns with up-to-date plots.")
+    if not outputs:
+        return
+
+    # Load only the columns that still need plotting
+    df = read_table(input_file, columns=list(outputs) + ["PHENO1"], sep=r"\s+")
+    score_columns = [col for col in outputs if df[col].notna().any()]
+    for score_col in outputs:
+        if score_col not in score_columns:
+            print(f"No values in {score_col}; skipping.")
+    if not score_columns:
+        return
+    values = df[score_columns].to_numpy(dtype=np.float64)
+
+    if pheno_available:
+        codes, labels = pd.factorize(df["PHENO1"], sort=True)
+        # Missing PHENO1 counts towards the overall histogram only
+        groups = np.where(codes < 0, len(labels), codes)
+    else:
+        labels = []
+        groups = np.zeros(len(df), dtype=np.int64)
+
+    edges, counts = histogram_counts(values, groups, len(labels), bins)
+
+    tasks = [(score_col, edges[k], counts[k], list(labels)) + outputs[score_col] for k, score_col in enumerate(score_columns)]
+
+    workers = max(1, min(workers, len(tasks), os.cpu_count() or 1))
+    print(f"Rendering plots for {len(tasks)} SCORE columns with {workers} workers...")
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(render_score_plots, *zip(*tasks), chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        done = [render_score_plots(*task) for task in tasks]
+    print(f"Plots saved for {len(done)} SCORE columns in {output_dir}")
+
 def main():
     # Command-line argument parser
     parser = argparse.ArgumentParser(description="Plot distributions from merged .sscore file.")
@@ -79,6 +230,16 @@ def main():
         "-o", "--output_dir", required=True, help="Directory to save the plots."
     )
 
+    parser.add_argument(
+        "--batch", action="store_true", help="Precompute all histograms in one pass and render the plots in parallel."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Maximum number of rendering processes for --batch (default: 4)."
+    )
+    parser.add_argument(
+        "--skip_existing", action="store_true", help="With --batch, skip plots that are newer than the input file."
+    )
+
     # Parse the arguments
     args = parser.parse_args()
 
@@ -86,7 +247,10 @@ def main():
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Call the plot function
-    plot_merged_sscore(args.input_file, args.output_dir)
+    if args.batch:
+        plot_merged_sscore_batch(args.input_file, args.output_dir, workers=args.workers, skip_existing=args.skip_existing)
+    else:
+        plot_merged_sscore(args.input_file, args.output_dir)
 
 if __name__ == "__main__":
     main()
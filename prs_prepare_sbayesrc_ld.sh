@@ -14,6 +14,11 @@ set -euo pipefail
 ############################################
 
 BASE_PATH="/root/persistent"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+# Step cache (skips steps whose inputs and parameters are unchanged; PRS_CACHE_MODE=fast|off).
+# The LD files are large: PRS_CACHE_MODE=fast avoids hashing them on every run.
+STEP_CACHE="${SCRIPT_DIR}/prs_step_cache.py"
 
 # Genotype data used as LD reference (PLINK prefix)
 GENO_PREFIX="${BASE_PATH}/data/imp/dmsa_imp_eur_1000GP_P3_auto_xchr/cobg_dir_genome_wide/t2d_dmsa_eur_gb-qc1.hg19.ch.fl.bgn.reid.randomid.filtered_geno_hwe_mind_maf01"
@@ -34,7 +39,9 @@ export OMP_NUM_THREADS=$THREADS
 
 GENO_CHR=""        # e.g. "1-22,X" if split by chr
 BLOCK_REF=""       # leave empty to use default GRCh37 blocks
-MAX_JOBS=25        # parallel LDstep2 jobs
+MAX_JOBS=25        # parallel LDstep2 R sessions
+LDSTEP3_JOBS=$(( $(nproc) / THREADS > 0 ? $(nproc) / THREADS : 1 ))   # parallel LDstep3 R sessions (THREADS each)
+BLOCKS_PER_SESSION=20   # blocks per R session before it is restarted
 
 ############################################
 # Sanity checks
@@ -49,7 +56,14 @@ mkdir -p "$OUTDIR"
 # Step 1: LDstep1 (block definition)
 ############################################
 
-if [[ ! -f "${OUTDIR}/ldm.info" ]]; then
+STEP1_CACHE=(
+  --step LDstep1
+  --inputs "$GWAS_EXAMPLE" "${GENO_PREFIX}.bed" "${GENO_PREFIX}.bim" "${GENO_PREFIX}.fam"
+  --params GENO_CHR="$GENO_CHR" BLOCK_REF="$BLOCK_REF"
+  --outputs "${OUTDIR}/ldm.info" "${OUTDIR}/snplist/*.snplist"
+)
+
+if ! python "$STEP_CACHE" check "${STEP1_CACHE[@]}"; then
   echo "Running LDstep1..."
   Rscript -e "
   library(SBayesRC)
@@ -62,6 +76,7 @@ if [[ ! -f "${OUTDIR}/ldm.info" ]]; then
     log2file  = TRUE
   )
   "
+  python "$STEP_CACHE" record "${STEP1_CACHE[@]}"
 else
   echo "LDstep1 already completed — skipping"
 fi
@@ -74,57 +89,44 @@ NUM_BLOCKS=$(ls "$OUTDIR/snplist"/*.snplist | wc -l)
 
 echo "Detected $NUM_BLOCKS LD blocks"
 
-job_pids=()
-
-check_jobs() {
-  while [[ ${#job_pids[@]} -ge $MAX_JOBS ]]; do
-    wait -n
-    job_pids=($(jobs -rp))
-  done
-}
-
-for idx in $(seq 1 "$NUM_BLOCKS"); do
-  if [[ ! -f "${OUTDIR}/b${idx}.ldm.full.bin" ]]; then
-    echo "Submitting LDstep2 block $idx"
-    check_jobs
-    Rscript -e "
-      library(SBayesRC)
-      SBayesRC::LDstep2(
-        outDir     = '$OUTDIR',
-        blockIndex = $idx,
-        log2file   = TRUE
-      )
-    " &> "${OUTDIR}/LDstep2_${idx}.log" &
-    job_pids+=($!)
-  fi
-done
-
-wait
+# Blocks run in parallel R sessions, largest first, with retries; progress is kept in
+# ${OUTDIR}/LDstep{2,3}_state.json so an interrupted run resumes where it stopped (blocks
+# that were running are redone; existing outputs are only adopted before the first state file)
+python "${SCRIPT_DIR}/prs_sbayesrc_ld_queue.py" \
+  --ld_dir "$OUTDIR" \
+  --step 2 \
+  --workers "$MAX_JOBS" \
+  --threads 1 \
+  --blocks_per_session "$BLOCKS_PER_SESSION" \
+  --adopt_existing
+
 echo "LDstep2 completed"
 
 ############################################
 # Step 3: LDstep3 (eigen decomposition)
 ############################################
 
-for idx in $(seq 1 "$NUM_BLOCKS"); do
-  if [[ ! -f "${OUTDIR}/block${idx}.eigen.bin" ]]; then
-    echo "Running LDstep3 block $idx"
-    Rscript -e "
-      library(SBayesRC)
-      SBayesRC::LDstep3(
-        outDir     = '$OUTDIR',
-        blockIndex = $idx,
-        log2file   = TRUE
-      )
-    " &> "${OUTDIR}/LDstep3_${idx}.log"
-  fi
-done
+python "${SCRIPT_DIR}/prs_sbayesrc_ld_queue.py" \
+  --ld_dir "$OUTDIR" \
+  --step 3 \
+  --workers "$LDSTEP3_JOBS" \
+  --threads "$THREADS" \
+  --blocks_per_session "$BLOCKS_PER_SESSION" \
+  --adopt_existing
+
+echo "LDstep3 completed"
 
 ############################################
 # Step 4: LDstep4 (merge LD info)
 ############################################
 
-if [[ ! -f "${OUTDIR}/snp.info" ]]; then
+STEP4_CACHE=(
+  --step LDstep4
+  --inputs "${OUTDIR}/ldm.info" "${OUTDIR}/block*.eigen.bin"
+  --outputs "${OUTDIR}/snp.info"
+)
+
+if ! python "$STEP_CACHE" check "${STEP4_CACHE[@]}"; then
   echo "Running LDstep4..."
   Rscript -e "
   library(SBayesRC)
@@ -133,6 +135,7 @@ if [[ ! -f "${OUTDIR}/snp.info" ]]; then
     log2file = TRUE
   )
   "
+  python "$STEP_CACHE" record "${STEP4_CACHE[@]}"
 else
   echo "LDstep4 already completed — skipping"
 fi
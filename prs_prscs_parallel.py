@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# Per-chromosome fan-out driver for PRS-CS.
+# Runs one PRScs.py process per chromosome in a bounded worker pool instead of one process
+# over all chromosomes. Every worker gets a fixed BLAS thread budget (MKL/OpenBLAS/OMP) and,
+# where possible, its own set of cores, so the MCMC runs do not compete for the CPUs.
+# Chromosomes with the most reference SNPs are started first, so the longest runs do not
+# end up last. Once every chromosome has finished, the per-chromosome _pst_eff files are
+# merged in chromosome order.
+
+import argparse
+import glob
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+def parse_chroms(chroms):
+    """
+    Parse a chromosome list such as '1,2,3' or '1-22'.
+    """
+    out = []
+    for part in chroms.split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            out += list(range(int(start), int(end) + 1))
+        else:
+            out.append(int(part))
+    return out
+
+def pst_eff_file(out_prefix, a, b, phi, chrom):
+    """
+    Per-chromosome output file written by PRScs.py (same naming as PRScs.py).
+    """
+    if phi is None:
+        return out_prefix + '_pst_eff_a%d_b%.1f_phiauto_chr%d.txt' % (a, b, chrom)
+    return out_prefix + '_pst_eff_a%d_b%.1f_phi%1.0e_chr%d.txt' % (a, b, phi, chrom)
+
+def chrom_sizes(ref_dir, bim_prefix, chroms):
+    """
+    Number of SNPs per chromosome, from the LD reference SNP info file if present,
+    else from the target .bim; used to start the largest chromosomes first.
+    """
+    snpinfo = sorted(glob.glob(os.path.join(ref_dir, "snpinfo_*")))
+    if snpinfo:
+        counts = pd.read_csv(snpinfo[0], sep=r"\s+", usecols=["CHR"])["CHR"].value_counts()
+    elif os.path.exists(bim_prefix + ".bim"):
+        counts = pd.read_csv(bim_prefix + ".bim", sep=r"\s+", header=None, usecols=[0])[0].value_counts()
+    else:
+        # Chromosome number is a fair proxy for size
+        return {chrom: -chrom for chrom in chroms}
+    counts.index = pd.to_numeric(counts.index, errors="coerce")
+    return {chrom: int(counts.get(chrom, 0)) for chrom in chroms}
+
+def core_sets(workers, threads):
+    """
+    Disjoint core sets (one per worker slot) if taskset is available and the cores allow it, else None.
+    """
+    if not hasattr(os, "sched_getaffinity") or shutil.which("taskset") is None:
+        return None
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < workers * threads:
+        return None
+    return [",".join(map(str, cores[k * threads:(k + 1) * threads])) for k in range(workers)]
+
+def run_chrom(chrom, args, threads, slots, cores):
+    """
+    Run PRScs.py for one chromosome with a capped thread budget; returns (chrom, exit code, seconds).
+    """
+    env = dict(os.environ)
+    for var in ("MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        env[var] = str(threads)
+
+    cmd = [
+        sys.executable, args.prscs,
+        "--ref_dir", args.ref_dir,
+        "--bim_prefix", args.bim_prefix,
+        "--sst_file", args.sst_file,
+        "--n_gwas", str(args.n_gwas),
+        "--a", str(args.a),
+        "--b", str(args.b),
+        "--n_iter", str(args.n_iter),
+        "--n_burnin", str(args.n_burnin),
+        "--thin", str(args.thin),
+        "--chrom", str(chrom),
+        "--out_dir", args.out_prefix,
+    ]
+    if args.phi is not None:
+        cmd += ["--phi", str(args.phi)]
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+
+    slot = slots.get()
+    try:
+        if cores:
+            cmd = ["taskset", "-c", cores[slot]] + cmd
+        start = time.time()
+        with open(f"{args.out_prefix}_chr{chrom}.log", "w") as log:
+            returncode = subprocess.call(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        return chrom, returncode, time.time() - start
+    finally:
+        slots.put(slot)
+
+def merge_pst_eff(files, merged_file):
+    with open(merged_file, "wb") as out:
+        for path in files:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, out)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run PRS-CS per chromosome in parallel and merge the posterior effect sizes.")
+    parser.add_argument("--prscs", required=True, help="Path to PRScs.py.")
+    parser.add_argument("--ref_dir", required=True, help="PRS-CS LD reference directory.")
+    parser.add_argument("--bim_prefix", required=True, help="Target PLINK prefix (for the SNP list).")
+    parser.add_argument("--sst_file", required=True, help="GWAS summary statistics in PRS-CS format.")
+    parser.add_argument("--n_gwas", type=int, required=True, help="GWAS sample size.")
+    parser.add_argument("--out_prefix", required=True, help="Output prefix (PRScs.py --out_dir), e.g. <outdir>/<pheno>.")
+    parser.add_argument("--merged_file", required=True, help="Merged effect size file.")
+    parser.add_argument("--a", type=float, default=1, help="PRS-CS parameter a (default: 1).")
+    parser.add_argument("--b", type=float, default=0.5, help="PRS-CS parameter b (default: 0.5).")
+    parser.add_argument("--phi", type=float, default=None, help="Global shrinkage phi (default: learnt from the data).")
+    parser.add_argument("--n_iter", type=int, default=1000, help="MCMC iterations (default: 1000).")
+    parser.add_argument("--n_burnin", type=int, default=500, help="MCMC burn-in iterations (default: 500).")
+    parser.add_argument("--thin", type=int, default=5, help="MCMC thinning (default: 5).")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (used for every chromosome).")
+    parser.add_argument("--chrom", default="1-22", help="Chromosomes, e.g. '1-22' or '1,2,3' (default: 1-22).")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent PRScs.py processes (default: cores / threads).")
+    parser.add_argument("--threads", type=int, default=2, help="BLAS threads per process (default: 2).")
+    parser.add_argument("--resume", action="store_true", help="Skip chromosomes whose output file already exists.")
+
+    args = parser.parse_args()
+
+    chroms = parse_chroms(args.chrom)
+    outputs = {chrom: pst_eff_file(args.out_prefix, args.a, args.b, args.phi, chrom) for chrom in chroms}
+    todo = [chrom for chrom in chroms if not (args.resume and os.path.exists(outputs[chrom]))]
+    if len(todo) < len(chroms):
+        print(f"Resuming: {len(chroms) - len(todo)} chromosomes already done.")
+
+    if todo:
+        sizes = chrom_sizes(args.ref_dir, args.bim_prefix, todo)
+        todo.sort(key=lambda chrom: sizes[chrom], reverse=True)
+
+        n_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        workers = args.workers or max(1, n_cpus // args.threads)
+        workers = min(workers, len(todo))
+        cores = core_sets(workers, args.threads)
+        slots = queue.Queue()
+        for slot in range(workers):
+            slots.put(slot)
+
+        print(f"Running PRS-CS for {len(todo)} chromosomes with {workers} workers x {args.threads} threads"
+              f"{' (pinned)' if cores else ''}; order: {','.join(map(str, todo))}")
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_chrom, chrom, args, args.threads, slots, cores) for chrom in todo]
+            for future in as_completed(futures):
+                chrom, returncode, seconds = future.result()
+                status = "done" if returncode == 0 else f"FAILED (exit {returncode})"
+                print(f"chr{chrom}: {status} in {seconds / 60:.1f} min")
+                if returncode != 0:
+                    failed.append(chrom)
+
+        if failed:
+            for chrom in failed:
+                print(f"---- last lines of {args.out_prefix}_chr{chrom}.log ----")
+                with open(f"{args.out_prefix}_chr{chrom}.log") as log:
+                    print("".join(log.readlines()[-10:]), end="")
+            print(f"ERROR: PRS-CS failed for chromosomes {','.join(map(str, failed))}; nothing merged.")
+            sys.exit(1)
+
+    files = [outputs[chrom] for chrom in chroms if os.path.exists(outputs[chrom])]
+    missing = [chrom for chrom in chroms if not os.path.exists(outputs[chrom])]
+    if missing:
+        print(f"WARNING: no effect sizes for chromosomes {','.join(map(str, missing))} (no SNPs?)")
+    merge_pst_eff(files, args.merged_file)
+    print(f"Merged effect sizes of {len(files)} chromosomes: {args.merged_file}")
+
+if __name__ == "__main__":
+    main()
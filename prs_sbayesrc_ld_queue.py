@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Resumable parallel work-queue for the per-block SBayesRC LD steps (LDstep2: LD matrices,
+# LDstep3: eigen decomposition).
+# Each worker keeps one R session open and feeds it block indices over stdin, so the cost
+# of starting R and loading SBayesRC is paid once per session (sessions are restarted
+# every --blocks_per_session blocks to bound memory). Blocks are processed largest first
+# (SNPs per block), failed blocks are retried, and the status and timing of every block is
+# kept in a state file, so an interrupted run resumes where it stopped. A block is redone
+# if its input (snplist for LDstep2, LD matrix for LDstep3) changed since it was done, or if
+# it was still running when the run was killed: SBayesRC writes its output straight to the
+# final path, so such an output may be truncated.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from prs_step_cache import file_fingerprint
+
+MARKER = "@@BLOCK"
+
+R_SESSION = """
+suppressPackageStartupMessages(library(SBayesRC))
+con <- file("stdin", "r")
+while (length(idx <- readLines(con, n = 1)) > 0) {{
+  idx <- as.integer(idx)
+  start <- Sys.time()
+  ok <- tryCatch({{
+    SBayesRC::{function}(outDir = '{ld_dir}', blockIndex = idx, log2file = TRUE)
+    TRUE
+  }}, error = function(e) {{
+    message("ERROR in block ", idx, ": ", conditionMessage(e))
+    FALSE
+  }})
+  cat("{marker}", if (ok) "DONE" else "FAILED", idx, as.numeric(difftime(Sys.time(), start, units = "secs")), "\\n")
+  flush(stdout())
+}}
+"""
+
+STEP_FILES = {
+    2: {"function": "LDstep2", "input": "snplist/{idx}.snplist", "output": "b{idx}.ldm.full.bin"},
+    3: {"function": "LDstep3", "input": "b{idx}.ldm.full.bin", "output": "block{idx}.eigen.bin"},
+}
+
+def parse_blocks(blocks):
+    """
+    Parse a block list such as '1-591' or '1,5,7-9'.
+    """
+    out = []
+    for part in blocks.split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            out += list(range(int(start), int(end) + 1))
+        else:
+            out.append(int(part))
+    return out
+
+def count_blocks(ld_dir):
+    snplist_dir = os.path.join(ld_dir, "snplist")
+    return len([name for name in os.listdir(snplist_dir) if name.endswith(".snplist")])
+
+def block_sizes(ld_dir, blocks):
+    """
+    Number of SNPs per block (lines in its snplist), the main driver of the run time.
+    """
+    sizes = {}
+    for idx in blocks:
+        path = os.path.join(ld_dir, "snplist", f"{idx}.snplist")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                sizes[idx] = sum(1 for _ in f)
+        else:
+            sizes[idx] = 0
+    return sizes
+
+class BlockQueue:
+    """
+    Pending blocks (largest first), retries and the resumable state file, shared by the worker threads.
+    """
+
+    def __init__(self, ld_dir, step, blocks, state_file, retries, adopt_existing=False):
+        self.ld_dir = ld_dir
+        self.files = STEP_FILES[step]
+        self.step = step
+        self.state_file = state_file
+        self.retries = retries
+        self.lock = threading.Lock()
+
+        self.state = {"step": step, "blocks": {}}
+        has_state = os.path.exists(state_file)
+        if has_state:
+            with open(state_file) as f:
+                self.state = json.load(f)
+
+        if adopt_existing and not has_state:
+            # Outputs of earlier runs without a state file count as done. With a state file,
+            # an output without a 'done' entry is from a block that never finished.
+            for idx in blocks:
+                if str(idx) not in self.state["blocks"] and os.path.exists(self.path("output", idx)):
+                    self.state["blocks"][str(idx)] = {"status": "done", "input": self.input_fingerprint(idx), "adopted": True}
+
+        self.total = len(blocks)
+        self.pending = [idx for idx in blocks if not self.is_done(idx)]
+        self.n_done = self.total - len(self.pending)
+        sizes = block_sizes(ld_dir, self.pending)
+        self.pending.sort(key=lambda idx: sizes[idx], reverse=True)
+        self.attempts = {idx: 0 for idx in self.pending}
+        self.failed = []
+        self.start = time.time()
+        self.busy_seconds = 0.0
+        self.n_finished = 0
+
+    def path(self, kind, idx):
+        return os.path.join(self.ld_dir, self.files[kind].format(idx=idx))
+
+    def input_fingerprint(self, idx):
+        path = self.path("input", idx)
+        return file_fingerprint(path, fast=True) if os.path.exists(path) else "missing"
+
+    def is_done(self, idx):
+        entry = self.state["blocks"].get(str(idx))
+        return (
+            entry is not None
+            and entry["status"] == "done"
+            and entry.get("input") == self.input_fingerprint(idx)
+            and os.path.exists(self.path("output", idx))
+        )
+
+    def next(self):
+        """
+        Next block to run, recorded as running so that it is redone if the run is killed.
+        """
+        with self.lock:
+            if not self.pending:
+                return None
+            idx = self.pending.pop(0)
+            self.state["blocks"][str(idx)] = {"status": "running", "started": time.strftime("%Y-%m-%d %H:%M:%S")}
+            self.save()
+            return idx
+
+    def save(self):
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, self.state_file)
+
+    def finish(self, idx, ok, seconds, worker):
+        with self.lock:
+            self.attempts[idx] += 1
+            entry = {
+                "status": "done" if ok else "failed",
+                "seconds": round(seconds, 1),
+                "attempts": self.attempts[idx],
+                "input": self.input_fingerprint(idx),
+                "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self.state["blocks"][str(idx)] = entry
+            if not ok and os.path.exists(self.path("output", idx)):
+                # Partial output of a failed block or crashed session
+                os.remove(self.path("output", idx))
+
+            if ok:
+                self.n_done += 1
+                self.n_finished += 1
+                self.busy_seconds += seconds
+                remaining = self.total - self.n_done
+                eta = (time.time() - self.start) / self.n_finished * remaining
+                print(f"[{self.n_done}/{self.total}] block {idx} done in {seconds:.1f}s (worker {worker}, ETA {eta / 60:.1f} min)", flush=True)
+            elif self.attempts[idx] <= self.retries:
+                print(f"block {idx} failed (attempt {self.attempts[idx]}), retrying later", flush=True)
+                self.pending.append(idx)
+            else:
+                print(f"block {idx} FAILED after {self.attempts[idx]} attempts", flush=True)
+                self.failed.append(idx)
+            self.save()
+
+def start_session(args, log):
+    script = R_SESSION.format(function=STEP_FILES[args.step]["function"], ld_dir=args.ld_dir, marker=MARKER)
+    env = dict(os.environ, OMP_NUM_THREADS=str(args.threads))
+    return subprocess.Popen(
+        [args.rscript, "-e", script],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=log, env=env, text=True, bufsize=1,
+    )
+
+def stop_session(proc):
+    if proc is None:
+        return
+    try:
+        proc.stdin.close()
+    except OSError:
+        pass
+    proc.wait()
+
+def run_worker(worker, args, blocks):
+    """
+    Feed blocks to one R session at a time until the queue is empty.
+    """
+    log_path = os.path.join(args.ld_dir, f"LDstep{args.step}_worker{worker}.log")
+    with open(log_path, "a") as log:
+        proc, n_session = None, 0
+        while True:
+            idx = blocks.next()
+            if idx is None:
+                break
+            if proc is None or n_session >= args.blocks_per_session:
+                stop_session(proc)
+                proc, n_session = start_session(args, log), 0
+            n_session += 1
+
+            start = time.time()
+            ok = False
+            try:
+                proc.stdin.write(f"{idx}\n")
+                proc.stdin.flush()
+                for line in proc.stdout:
+                    if line.startswith(MARKER):
+                        ok = line.split()[1] == "DONE"
+                        break
+                    log.write(line)
+                else:
+                    # The session died (e.g. out of memory): count the block as failed, start a new session
+                    proc.wait()
+                    log.write(f"R session exited with code {proc.returncode} during block {idx}\n")
+                    proc = None
+            except BrokenPipeError:
+                proc = None
+            log.flush()
+            blocks.finish(idx, ok, time.time() - start, worker)
+        stop_session(proc)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SBayesRC LDstep2 or LDstep3 over LD blocks with a resumable parallel work-queue.")
+    parser.add_argument("--ld_dir", required=True, help="SBayesRC LD output directory (after LDstep1).")
+    parser.add_argument("--step", type=int, choices=[2, 3], required=True, help="LD step to run (2: LD matrices, 3: eigen decomposition).")
+    parser.add_argument("--blocks", default=None, help="Blocks to run, e.g. '1-591' (default: all blocks in <ld_dir>/snplist).")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel R sessions (default: 4).")
+    parser.add_argument("--threads", type=int, default=1, help="OMP_NUM_THREADS per R session (default: 1).")
+    parser.add_argument("--blocks_per_session", type=int, default=20, help="Blocks per R session before it is restarted (default: 20).")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per failed block (default: 2).")
+    parser.add_argument("--state_file", default=None, help="State file (default: <ld_dir>/LDstep<step>_state.json).")
+    parser.add_argument("--adopt_existing", action="store_true", help="Count existing outputs as done when there is no state file yet (runs before the queue).")
+    parser.add_argument("--rscript", default="Rscript", help="Rscript executable (default: Rscript).")
+
+    args = parser.parse_args()
+
+    blocks = parse_blocks(args.blocks) if args.blocks else list(range(1, count_blocks(args.ld_dir) + 1))
+    state_file = args.state_file or os.path.join(args.ld_dir, f"LDstep{args.step}_state.json")
+    queue = BlockQueue(args.ld_dir, args.step, blocks, state_file, args.retries, args.adopt_existing)
+
+    print(f"LDstep{args.step}: {queue.total} blocks, {queue.n_done} already done, {len(queue.pending)} to run "
+          f"with {args.workers} workers x {args.threads} threads ({args.blocks_per_session} blocks per R session)", flush=True)
+
+    threads = [threading.Thread(target=run_worker, args=(k + 1, args, queue)) for k in range(min(args.workers, len(queue.pending)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.time() - queue.start
+    print(f"LDstep{args.step}: {queue.n_done}/{queue.total} blocks done in {elapsed / 60:.1f} min "
+          f"({queue.busy_seconds / 60:.1f} block-minutes). State: {state_file}")
+    if queue.failed:
+        print(f"ERROR: blocks failed: {','.join(map(str, sorted(queue.failed)))} (see {args.ld_dir}/LDstep{args.step}_worker*.log)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
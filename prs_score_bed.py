@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# Native PRS scoring engine for PLINK 1 binary filesets (.bed/.bim/.fam).
+# Memory-maps the .bed, decodes 2-bit genotypes in variant blocks through lookup
+# tables and scores every weight column (all methods and thresholds) in a single
+# pass over the genotypes with blocked matrix multiplications.
+# Missing genotypes are mean-imputed; output is one plink2-style .sscore per score.
+# With --cache_dir, per-chromosome partial sums of each score are kept on disk so a
+# re-run only rescores the chromosomes whose weights or target files changed.
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+BED_MAGIC = b"\x6c\x1b\x01"
+
+# 2-bit PLINK codes -> A1 dosage (00 hom A1, 01 missing, 10 het, 11 hom A2)
+CODE_DOSAGE = np.array([2.0, np.nan, 1.0, 0.0], dtype=np.float32)
+
+# Byte -> 4 genotypes lookup table (samples are packed low bits first)
+BYTE_DOSAGE = CODE_DOSAGE[(np.arange(256)[:, None] >> (2 * np.arange(4))) & 3]
+
+def load_bim(prefix):
+    return pd.read_csv(
+        f"{prefix}.bim", sep=r"\s+", header=None,
+        names=["CHR", "SNP", "CM", "BP", "A1", "A2"],
+        dtype={"CHR": str, "SNP": str, "A1": str, "A2": str},
+    )
+
+def load_fam(prefix):
+    return pd.read_csv(
+        f"{prefix}.fam", sep=r"\s+", header=None,
+        names=["FID", "IID", "PAT", "MAT", "SEX", "PHENO1"],
+        dtype={"FID": str, "IID": str},
+    )
+
+def open_bed(prefix, n_samples, n_variants):
+    """
+    Memory-map a SNP-major .bed file as a (n_variants, bytes_per_variant) uint8 array.
+    """
+    bed_file = f"{prefix}.bed"
+    with open(bed_file, "rb") as f:
+        if f.read(3) != BED_MAGIC:
+            raise ValueError(f"{bed_file} is not a SNP-major PLINK .bed file")
+    bytes_per_variant = (n_samples + 3) // 4
+    return np.memmap(bed_file, dtype=np.uint8, mode="r", offset=3, shape=(n_variants, bytes_per_variant))
+
+def decode_block(bed, variant_idx, n_samples):
+    """
+    Decode a block of variants into a (len(variant_idx), n_samples) float32 A1 dosage matrix with NaN for missing.
+    """
+    packed = bed[variant_idx]
+    return BYTE_DOSAGE[packed].reshape(len(variant_idx), -1)[:, :n_samples]
+
+def load_weights(spec):
+    """
+    Load one weight file given as [FILE, ID_COL, ALLELE_COL, SCORE_COL, ...] with
+    1-based column numbers, as in plink2 --score. A header line is detected when
+    the first score column is not numeric.
+
+    Returns a DataFrame with SNP, A1 and one column per score.
+    """
+    path, id_col, allele_col, *score_cols = spec
+    if not score_cols:
+        raise ValueError(f"No score column given for weight file {path}")
+    id_col, allele_col = int(id_col) - 1, int(allele_col) - 1
+    score_cols = [int(col) - 1 for col in score_cols]
+
+    raw = pd.read_csv(path, sep=r"\s+", header=None, dtype=str, comment=None)
+    header = None
+    if pd.to_numeric(raw.iloc[:1, score_cols[0]], errors="coerce").isna().all():
+        header, raw = raw.iloc[0], raw.iloc[1:]
+
+    base = os.path.splitext(os.path.basename(path))[0]
+    weights = pd.DataFrame({"SNP": raw[id_col].values, "A1": raw[allele_col].values})
+    for col in score_cols:
+        name = header[col].lstrip("#") if header is not None else f"col{col + 1}"
+        weights[f"{base}_{name}"] = pd.to_numeric(raw[col], errors="coerce").values
+    return weights
+
+def align_weights(bim, weight_tables):
+    """
+    Align weight tables to the .bim.
+
+    Returns (variant_idx, W, F, score_names): sorted .bim row indices of scored
+    variants, a (variants x scores) weight matrix (0 where a score does not use
+    the variant), and a boolean matrix that is True where the scored allele is A2.
+    """
+    snp_row = pd.Series(np.arange(len(bim)), index=bim["SNP"])
+    snp_row = snp_row[~snp_row.index.duplicated()]
+
+    columns = []
+    for weights in weight_tables:
+        weights = weights.drop_duplicates("SNP")
+        rows = snp_row.reindex(weights["SNP"]).to_numpy()
+        found = ~np.isnan(rows)
+        rows = rows[found].astype(np.int64)
+        allele = weights["A1"].to_numpy()[found]
+        is_a1 = allele == bim["A1"].to_numpy()[rows]
+        is_a2 = allele == bim["A2"].to_numpy()[rows]
+        usable = is_a1 | is_a2
+        skipped = int((~found).sum() + (~usable).sum())
+        if skipped:
+            print(f"Skipped {skipped} weights not found in the target or with mismatched alleles.")
+        for name in weights.columns[2:]:
+            values = weights[name].to_numpy()[found][usable]
+            keep = ~np.isnan(values)
+            columns.append((name, rows[usable][keep], values[keep], is_a2[usable][keep]))
+
+    variant_idx = np.unique(np.concatenate([rows for _, rows, _, _ in columns])) if columns else np.empty(0, dtype=np.int64)
+    position = {v: i for i, v in enumerate(variant_idx)}
+    W = np.zeros((len(variant_idx), len(columns)), dtype=np.float64)
+    F = np.zeros((len(variant_idx), len(columns)), dtype=bool)
+    for k, (_, rows, values, flip) in enumerate(columns):
+        at = np.fromiter((position[r] for r in rows), dtype=np.int64, count=len(rows))
+        W[at, k] = values
+        F[at, k] = flip
+    return variant_idx, W, F, [name for name, _, _, _ in columns]
+
+def score_variants(bed, n_samples, variant_idx, W, F, block_size=256):
+    """
+    Score samples over the given variants in one pass.
+
+    Returns a dict of (samples x scores) arrays: SUM (weighted named-allele dosage,
+    missing genotypes mean-imputed), ALLELE_CT and NAMED_ALLELE_DOSAGE_SUM over
+    non-missing genotypes of each score's variants.
+    """
+    n_scores = W.shape[1]
+    totals = {
+        "SUM": np.zeros((n_samples, n_scores)),
+        "ALLELE_CT": np.zeros((n_samples, n_scores)),
+        "NAMED_ALLELE_DOSAGE_SUM": np.zeros((n_samples, n_scores)),
+    }
+    used = W != 0
+    # Scoring the A2 allele: w * (2 - d) = 2w - w * d
+    W_signed = np.where(F, -W, W)
+    constant = 2 * np.where(F, W, 0).sum(axis=0)
+
+    for start in range(0, len(variant_idx), block_size):
+        block = slice(start, start + block_size)
+        dosage = decode_block(bed, variant_idx[block], n_samples)
+        present = ~np.isnan(dosage)
+
+        n_present = present.sum(axis=1)
+        means = np.nansum(dosage, axis=1) / np.maximum(n_present, 1)
+        imputed = np.where(present, dosage, means[:, None]).astype(np.float32)
+        observed = np.where(present, dosage, 0).astype(np.float32)
+        present = present.astype(np.float32)
+
+        totals["SUM"] += imputed.T @ W_signed[block].astype(np.float32)
+        totals["ALLELE_CT"] += 2 * (present.T @ used[block].astype(np.float32))
+        totals["NAMED_ALLELE_DOSAGE_SUM"] += (
+            observed.T @ (used[block] & ~F[block]).astype(np.float32)
+            + (2 * present - observed).T @ (used[block] & F[block]).astype(np.float32)
+        )
+
+    totals["SUM"] += constant
+    return totals
+
+TOTAL_NAMES = ("SUM", "ALLELE_CT", "NAMED_ALLELE_DOSAGE_SUM")
+
+def target_fingerprint(prefix):
+    """
+    Identify the target genotype files by path, size and modification time.
+    """
+    parts = []
+    for ext in ("bed", "bim", "fam"):
+        stat = os.stat(f"{prefix}.{ext}")
+        parts.append(f"{os.path.abspath(prefix)}.{ext}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+def partial_key(fingerprint, chrom, snps, weights, flips):
+    """
+    Cache key of one score's partial sum on one chromosome.
+    """
+    digest = hashlib.sha256()
+    digest.update(fingerprint.encode())
+    digest.update(f"|chr{chrom}|".encode())
+    digest.update("\n".join(snps).encode())
+    digest.update(np.ascontiguousarray(weights, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(flips, dtype=bool).tobytes())
+    return digest.hexdigest()
+
+def score_variants_cached(bed, bim, bfile, n_samples, variant_idx, W, F, cache_dir, block_size=256):
+    """
+    Per-chromosome cached version of score_variants.
+
+    Each (score, chromosome) partial sum is stored as <cache_dir>/<key>.npy, keyed
+    by the target files and that score's weights on that chromosome. Only the
+    missing partials are computed; the totals are the sum of the partials.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = target_fingerprint(bfile)
+    chroms = bim["CHR"].to_numpy()[variant_idx]
+    snps = bim["SNP"].to_numpy()[variant_idx]
+    totals = {name: np.zeros((n_samples, W.shape[1])) for name in TOTAL_NAMES}
+    n_cached = n_computed = 0
+
+    for chrom in pd.unique(chroms):
+        on_chrom = chroms == chrom
+        keys, todo = [], []
+        for k in range(W.shape[1]):
+            used = on_chrom & (W[:, k] != 0)
+            key = partial_key(fingerprint, chrom, snps[used], W[used, k], F[used, k])
+            keys.append(os.path.join(cache_dir, f"{key}.npy"))
+            if not os.path.exists(keys[k]):
+                todo.append(k)
+
+        if todo:
+            rows = on_chrom & (W[:, todo] != 0).any(axis=1)
+            partial = score_variants(bed, n_samples, variant_idx[rows], W[rows][:, todo], F[rows][:, todo], block_size)
+            for j, k in enumerate(todo):
+                np.save(keys[k], np.column_stack([partial[name][:, j] for name in TOTAL_NAMES]))
+            n_computed += len(todo)
+        n_cached += W.shape[1] - len(todo)
+
+        for k in range(W.shape[1]):
+            partial = np.load(keys[k])
+            for i, name in enumerate(TOTAL_NAMES):
+                totals[name][:, k] += partial[:, i]
+
+    print(f"Score cache: {n_cached} chromosome partials reused, {n_computed} computed.")
+    return totals
+
+def write_sscore(fam, totals, score_names, out_prefix):
+    """
+    Write one plink2-style .sscore file per score, readable by prs_merge_sscore.py.
+    """
+    pheno = fam["PHENO1"].where(fam["PHENO1"] != -9)
+    written = []
+    for k, name in enumerate(score_names):
+        allele_ct = totals["ALLELE_CT"][:, k]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            score_avg = totals["SUM"][:, k] / allele_ct
+        out = pd.DataFrame({
+            "#FID": fam["FID"],
+            "IID": fam["IID"],
+            "PHENO1": pheno,
+            "ALLELE_CT": allele_ct.astype(np.int64),
+            "NAMED_ALLELE_DOSAGE_SUM": totals["NAMED_ALLELE_DOSAGE_SUM"][:, k],
+            "SCORE1_AVG": score_avg,
+        })
+        output_file = f"{out_prefix}.{name}.sscore"
+        out.to_csv(output_file, sep="\t", index=False, na_rep="NA")
+        written.append(output_file)
+    return written
+
+def score_bed(bfile, weight_specs, out_prefix, block_size=256, cache_dir=None):
+    """
+    Score every weight column of every weight file against a PLINK fileset in one genotype pass.
+    If cache_dir is given, unchanged per-chromosome partial sums are reused from it.
+    """
+    print("Loading .bim/.fam...")
+    bim = load_bim(bfile)
+    fam = load_fam(bfile)
+    bed = open_bed(bfile, len(fam), len(bim))
+
+    weight_tables = [load_weights(spec) for spec in weight_specs]
+    variant_idx, W, F, score_names = align_weights(bim, weight_tables)
+    if not score_names:
+        print("No usable weights found.")
+        return []
+    print(f"Scoring {len(fam)} samples on {len(variant_idx)} variants for {len(score_names)} scores...")
+
+    if cache_dir:
+        totals = score_variants_cached(bed, bim, bfile, len(fam), variant_idx, W, F, cache_dir, block_size)
+    else:
+        totals = score_variants(bed, len(fam), variant_idx, W, F, block_size)
+    written = write_sscore(fam, totals, score_names, out_prefix)
+    print(f"Wrote {len(written)} .sscore files with prefix {out_prefix}")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Score many PRS weight columns in one pass over a memory-mapped PLINK .bed fileset.")
+    parser.add_argument("--bfile", required=True, help="PLINK fileset prefix (.bed/.bim/.fam).")
+    parser.add_argument(
+        "--score", required=True, action="append", nargs="+", metavar="ARG",
+        help="FILE ID_COL ALLELE_COL SCORE_COL [SCORE_COL ...] with 1-based column numbers, as in plink2 --score. Repeat for more files.",
+    )
+    parser.add_argument("--out", required=True, help="Output prefix; writes <out>.<score>.sscore per score column.")
+    parser.add_argument("--block_size", type=int, default=256, help="Number of variants decoded per block (default: 256).")
+    parser.add_argument("--cache_dir", default=None, help="Directory for per-chromosome partial score sums; only changed chromosomes are rescored.")
+
+    args = parser.parse_args()
+    score_bed(args.bfile, args.score, args.out, args.block_size, args.cache_dir)
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,10 @@ GWAS="$2"
 ############################################
 
 BASE_PATH="/root/persistent"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+# Step cache (skips steps whose inputs and parameters are unchanged; PRS_CACHE_MODE=fast|off)
+STEP_CACHE="${SCRIPT_DIR}/prs_step_cache.py"
 
 # PRS-CS installation
 PRSCS_DIR="${BASE_PATH}/opt/PRScs"
@@ -47,6 +51,12 @@ THIN=5
 SEED=12345
 CHROM_LIST=$(seq -s, 1 22)
 
+# One PRScs.py process per chromosome: PRSCS_THREADS BLAS threads per process,
+# as many processes as the CPU budget (THREADS, set by run_prs_pipeline.sh) allows
+PRSCS_THREADS="${PRSCS_THREADS:-2}"
+PRSCS_WORKERS="${PRSCS_WORKERS:-$(( ${THREADS:-$(nproc)} / PRSCS_THREADS ))}"
+(( PRSCS_WORKERS < 1 )) && PRSCS_WORKERS=1
+
 ############################################
 # GWAS sample size (required by PRS-CS)
 ############################################
@@ -81,38 +91,71 @@ echo "N_GWAS: $N_GWAS"
 echo "PHI: $PHI"
 echo "=========================================="
 
-python "$PRSCS_PY" \
-  --ref_dir "$REF_DIR" \
-  --bim_prefix "$TARGET_PREFIX" \
-  --sst_file "$GWAS" \
-  --n_gwas "$N_GWAS" \
-  --a "$A" \
-  --b "$B" \
-  --phi "$PHI" \
-  --n_iter "$N_ITER" \
-  --n_burnin "$N_BURNIN" \
-  --thin "$THIN" \
-  --chrom "$CHROM_LIST" \
-  --out_dir "$OUTDIR" \
-  --seed "$SEED"
-
-############################################
-# Merge chromosome-specific effect sizes
-############################################
-
 MERGED="${OUTDIR}/${PHENO}_pst_eff_a${A}_b${B}_phi${PHI}_merged.txt"
 
-cat "${OUTDIR}/${PHENO}_pst_eff_a${A}_b${B}_phi${PHI}_chr"*.txt > "$MERGED"
-
-echo "Merged effect sizes: $MERGED"
+PRSCS_CACHE=(
+  --step "prscs_${PHENO}"
+  --inputs "$GWAS" "$REF_DIR" "${TARGET_PREFIX}.bim"
+  --params A="$A" B="$B" PHI="$PHI" N_ITER="$N_ITER" N_BURNIN="$N_BURNIN" THIN="$THIN" SEED="$SEED" CHROM="$CHROM_LIST" N_GWAS="$N_GWAS"
+  --outputs "$MERGED"
+)
+
+if python "$STEP_CACHE" check "${PRSCS_CACHE[@]}"; then
+  echo "Reusing effect sizes: $MERGED"
+else
+  # Per-chromosome runs in parallel (largest first), merged into $MERGED when all are done
+  python "${SCRIPT_DIR}/prs_prscs_parallel.py" \
+    --prscs "$PRSCS_PY" \
+    --ref_dir "$REF_DIR" \
+    --bim_prefix "$TARGET_PREFIX" \
+    --sst_file "$GWAS" \
+    --n_gwas "$N_GWAS" \
+    --a "$A" \
+    --b "$B" \
+    --phi "$PHI" \
+    --n_iter "$N_ITER" \
+    --n_burnin "$N_BURNIN" \
+    --thin "$THIN" \
+    --chrom "$CHROM_LIST" \
+    --out_prefix "${OUTDIR}/${PHENO}" \
+    --merged_file "$MERGED" \
+    --seed "$SEED" \
+    --workers "$PRSCS_WORKERS" \
+    --threads "$PRSCS_THREADS"
+
+  python "$STEP_CACHE" record "${PRSCS_CACHE[@]}"
+fi
 
 ############################################
-# Calculate PRS using PLINK2
-############################################
-
-plink2 \
-  --bfile "$TARGET_PREFIX" \
-  --score "$MERGED" 2 4 6 \
-  --out "${OUTDIR}/${PHENO}_PRSCS_scores"
+# Calculate PRS (PLINK2, or the native engine with SCORER=native)
+############################################
+
+# SCORER=native keeps per-chromosome partial sums in ${OUTDIR}/score_cache, so after a
+# weight change only the chromosomes whose weights changed are rescored
+SCORER="${SCORER:-plink2}"
+
+SCORE_CACHE=(
+  --step "prscs_score_${PHENO}"
+  --inputs "$MERGED" "${TARGET_PREFIX}.bed" "${TARGET_PREFIX}.bim" "${TARGET_PREFIX}.fam"
+  --params SCORER="$SCORER"
+  --outputs "${OUTDIR}/${PHENO}_PRSCS_scores*.sscore"
+)
+
+if python "$STEP_CACHE" check "${SCORE_CACHE[@]}"; then
+  echo "Reusing PRS-CS scores for $PHENO"
+elif [[ "$SCORER" == "native" ]]; then
+  python "${SCRIPT_DIR}/prs_score_bed.py" \
+    --bfile "$TARGET_PREFIX" \
+    --score "$MERGED" 2 4 6 \
+    --out "${OUTDIR}/${PHENO}_PRSCS_scores" \
+    --cache_dir "${OUTDIR}/score_cache"
+  python "$STEP_CACHE" record "${SCORE_CACHE[@]}"
+else
+  plink2 \
+    --bfile "$TARGET_PREFIX" \
+    --score "$MERGED" 2 4 6 \
+    --out "${OUTDIR}/${PHENO}_PRSCS_scores"
+  python "$STEP_CACHE" record "${SCORE_CACHE[@]}"
+fi
 
 echo "PRS-CS completed for $PHENO"
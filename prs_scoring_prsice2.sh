@@ -18,6 +18,10 @@ GWAS="$2"
 ############################################
 
 BASE_PATH="/root/persistent"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+# Step cache (skips steps whose inputs and parameters are unchanged; PRS_CACHE_MODE=fast|off)
+STEP_CACHE="${SCRIPT_DIR}/prs_step_cache.py"
 
 # Target genotype (PRS target cohort)
 TARGET_PREFIX="${BASE_PATH}/data/UKB500k_241121/UKB500k_chr#_241121_Qced"
@@ -32,6 +36,9 @@ PRSICE_BIN="${OPT_DIR}/PRSice_linux"
 PRSICE_R="${OPT_DIR}/PRSice.R"
 R_LIB="/usr/lib/R/library"
 
+# Threads (set by run_prs_pipeline.sh when methods run concurrently)
+THREADS="${THREADS:-1}"
+
 # Output
 OUTDIR="${BASE_PATH}/data/prs/PRSice2/${PHENO}"
 mkdir -p "$OUTDIR"
@@ -60,6 +67,16 @@ if [[ "$PHENO" =~ ^(SZ|MDD|BD|ADHD|ASD|CAD|T2D|ANX|AD).* ]]; then
   BETA_FLAG="--or"
 fi
 
+############################################
+# Clumping (prs_clump.py, once per GWAS and target)
+############################################
+
+CLUMP_KB=500
+CLUMP_R2=0.2
+CLUMP_P=1
+BASE_MAF=0.01
+CLUMP_PREFIX="${OUTDIR}/${PHENO}_clump"
+
 ############################################
 # Common PRSice options
 ############################################
@@ -72,10 +89,8 @@ COMMON_OPTS=(
   --binary-target "$BINARY_TARGET"
   --stat "$STAT"
   $BETA_FLAG
-  --clump-kb 500kb
-  --clump-r2 0.2
-  --clump-p 1
-  --base-maf MAF:0.01
+  --no-clump
+  --base-maf "MAF:${BASE_MAF}"
   --missing MEAN_IMPUTE
   --pheno "$PHENO_FILE"
   --cov "$COV_FILE"
@@ -88,7 +103,7 @@ COMMON_OPTS=(
 )
 
 ############################################
-# Run PRSice (1st pass: create .valid)
+# Clump once, then run PRSice on the clumped SNPs
 ############################################
 
 echo "=========================================="
@@ -97,21 +112,75 @@ echo "GWAS: $GWAS"
 echo "Binary trait: $BINARY_TARGET"
 echo "=========================================="
 
-Rscript "$PRSICE_R" "${COMMON_OPTS[@]}"
+# The clumped set only depends on the GWAS, the target and the clumping parameters,
+# so it is reused by every threshold and every rerun of PRSice
+CLUMP_CACHE=(
+  --step "prsice2_clump_${PHENO}"
+  --inputs "$GWAS" "${TARGET_PREFIX//#/*}.bed" "${TARGET_PREFIX//#/*}.bim"
+  --params CLUMP_KB="$CLUMP_KB" CLUMP_R2="$CLUMP_R2" CLUMP_P="$CLUMP_P" BASE_MAF="$BASE_MAF"
+  --outputs "${CLUMP_PREFIX}.snplist"
+)
 
-############################################
-# Run PRSice (2nd pass: extract valid SNPs)
-############################################
+if python "$STEP_CACHE" check "${CLUMP_CACHE[@]}"; then
+  echo "Reusing clumped SNPs: ${CLUMP_PREFIX}.snplist"
+else
+  python "${SCRIPT_DIR}/prs_clump.py" \
+    --base "$GWAS" \
+    --target "$TARGET_PREFIX" \
+    --out "$CLUMP_PREFIX" \
+    --clump_kb "$CLUMP_KB" \
+    --clump_r2 "$CLUMP_R2" \
+    --clump_p1 "$CLUMP_P" \
+    --min_maf "$BASE_MAF" \
+    --workers "$THREADS"
+  python "$STEP_CACHE" record "${CLUMP_CACHE[@]}"
+fi
 
-VALID_FILE="${OUTDIR}/${PHENO}.valid"
+# Optional fine threshold sweep on the clumped SNPs (SWEEP_LEVELS log-spaced p-value
+# thresholds from 5e-8 to 1), scored in one pass by prs_threshold_scores.py
+SWEEP_LEVELS="${SWEEP_LEVELS:-0}"
+if (( SWEEP_LEVELS > 0 )); then
+  SWEEP_CACHE=(
+    --step "prsice2_sweep_${PHENO}"
+    --inputs "$GWAS" "${CLUMP_PREFIX}.snplist" "${TARGET_PREFIX//#/*}.bed" "${TARGET_PREFIX//#/*}.bim" "${TARGET_PREFIX//#/*}.fam"
+    --params SWEEP_LEVELS="$SWEEP_LEVELS"
+    --outputs "${OUTDIR}/${PHENO}_sweep.parquet" "${OUTDIR}/${PHENO}_sweep.thresholds"
+  )
+  if python "$STEP_CACHE" check "${SWEEP_CACHE[@]}"; then
+    echo "Reusing threshold sweep: ${OUTDIR}/${PHENO}_sweep.parquet"
+  else
+    python "${SCRIPT_DIR}/prs_threshold_scores.py" \
+      --base "$GWAS" \
+      --target "$TARGET_PREFIX" \
+      --out "${OUTDIR}/${PHENO}_sweep" \
+      --score_file "${OUTDIR}/${PHENO}_sweep.parquet" \
+      --extract "${CLUMP_PREFIX}.snplist" \
+      --n_thresholds "$SWEEP_LEVELS"
+    python "$STEP_CACHE" record "${SWEEP_CACHE[@]}"
+  fi
+fi
 
-if [[ -f "$VALID_FILE" ]]; then
-  echo "Found .valid file — rerunning with --extract"
-  Rscript "$PRSICE_R" \
-    "${COMMON_OPTS[@]}" \
-    --extract "$VALID_FILE"
-else
-  echo "WARNING: .valid file not produced — skipping extract step"
+# Everything that affects the result: the PRSice options (thresholds, ...), the clumped
+# SNPs, the base, target, phenotype and covariate files and the PRSice binary
+PRSICE_CACHE=(
+  --step "prsice2_${PHENO}"
+  --inputs "$GWAS" "${CLUMP_PREFIX}.snplist" "${TARGET_PREFIX//#/*}.bed" "${TARGET_PREFIX//#/*}.bim" "${TARGET_PREFIX//#/*}.fam" "$PHENO_FILE" "$COV_FILE" "$PRSICE_BIN"
+  --params OPTS="${COMMON_OPTS[*]}"
+  --outputs "${OUTDIR}/${PHENO}.summary" "${OUTDIR}/${PHENO}.best"
+)
+
+if python "$STEP_CACHE" check "${PRSICE_CACHE[@]}"; then
+  echo "PRSice2 completed for $PHENO"
+  exit 0
 fi
 
+# Single pass: the clumped set only contains SNPs matched to the target, so the
+# former .valid/--extract rerun is no longer needed
+Rscript "$PRSICE_R" \
+  "${COMMON_OPTS[@]}" \
+  --thread "$THREADS" \
+  --extract "${CLUMP_PREFIX}.snplist"
+
+python "$STEP_CACHE" record "${PRSICE_CACHE[@]}"
+
 echo "PRSice2 completed for $PHENO"
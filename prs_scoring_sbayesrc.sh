@@ -18,6 +18,10 @@ GWAS="$2"
 ############################################
 
 BASE_PATH="/root/persistent"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+# Step cache (skips steps whose inputs and parameters are unchanged; PRS_CACHE_MODE=fast|off)
+STEP_CACHE="${SCRIPT_DIR}/prs_step_cache.py"
 
 OUTDIR="${BASE_PATH}/data/prs/SBayesRC/${PHENO}"
 mkdir -p "$OUTDIR"
@@ -27,7 +31,7 @@ OUT_PREFIX="${OUTDIR}/sbayesrc_${PHENO}"
 LD_DIR="${BASE_PATH}/opt/gctb_refs/LD_Reference/ukbEUR_Imputed"
 ANNOT="${BASE_PATH}/opt/gctb_refs/annot_baseline2.2.txt"
 
-THREADS=4
+THREADS="${THREADS:-4}"
 export OMP_NUM_THREADS=$THREADS
 
 ############################################
@@ -48,7 +52,11 @@ echo "GWAS: $GWAS"
 echo "=========================================="
 
 # 1. Tidy
-Rscript -e "
+python "$STEP_CACHE" run \
+  --step "sbayesrc_tidy_${PHENO}" \
+  --inputs "$GWAS" "$LD_DIR" \
+  --outputs "${OUT_PREFIX}_tidy.ma" \
+  -- Rscript -e "
 library(SBayesRC)
 SBayesRC::tidy(
   mafile = '$GWAS',
@@ -59,7 +67,11 @@ SBayesRC::tidy(
 "
 
 # 2. Impute
-Rscript -e "
+python "$STEP_CACHE" run \
+  --step "sbayesrc_impute_${PHENO}" \
+  --inputs "${OUT_PREFIX}_tidy.ma" "$LD_DIR" \
+  --outputs "${OUT_PREFIX}_imp.ma" \
+  -- Rscript -e "
 library(SBayesRC)
 SBayesRC::impute(
   mafile = '${OUT_PREFIX}_tidy.ma',
@@ -70,7 +82,11 @@ SBayesRC::impute(
 "
 
 # 3. Main SBayesRC
-Rscript -e "
+python "$STEP_CACHE" run \
+  --step "sbayesrc_sbrc_${PHENO}" \
+  --inputs "${OUT_PREFIX}_imp.ma" "$LD_DIR" "$ANNOT" \
+  --outputs "${OUT_PREFIX}_sbrc.txt" \
+  -- Rscript -e "
 library(SBayesRC)
 SBayesRC::sbayesrc(
   mafile   = '${OUT_PREFIX}_imp.ma',
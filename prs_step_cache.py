@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# Content-addressed step cache for the PRS pipeline.
+# A step is identified by a name; its cache key is a hash of the step name, its parameters
+# and the fingerprints of its input files. After a step succeeds, the key and its outputs
+# are recorded in a manifest (JSON, next to the outputs by default). A later run with
+# the same key and untouched outputs is skipped.
+#
+# Fingerprints:
+#   files        sha256 of the content, or size + mtime in fast mode (--fast or PRS_CACHE_MODE=fast)
+#   directories  the sorted file listing with sizes and mtimes, in every mode: their content is
+#                never hashed (LD references are too large), so edits that keep size and mtime
+#                go unnoticed
+#   globs        the fingerprints of all matching paths
+# The sha256 of each input file is memoized in the manifest by path, size and mtime, so a
+# check, and the record after it, only hash files that changed since they were last hashed.
+# PRS_CACHE_MODE=off disables the cache (every step runs, nothing is recorded).
+#
+# Usage from a shell script:
+#   if python prs_step_cache.py check "${ARGS[@]}"; then echo "skipping"; else <run>; python prs_step_cache.py record "${ARGS[@]}"; fi
+#   python prs_step_cache.py run "${ARGS[@]}" -- <command> <args>...
+
+import argparse
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+HASH_BUFFER = 4 * 1024 * 1024
+MANIFEST_NAME = ".prs_step_manifest.json"
+
+def expand(pattern):
+    """
+    Paths matching a pattern (a plain path matches itself if it exists).
+    """
+    return sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern] if os.path.exists(pattern) else []
+
+def file_fingerprint(path, fast=False, digests=None):
+    """
+    Fingerprint of one file. In full mode, digests (absolute path -> {"stat", "sha256"})
+    memoizes the sha256: it is reused while size and mtime are unchanged and updated otherwise.
+    """
+    st = os.stat(path)
+    if fast:
+        return f"{st.st_size}:{st.st_mtime_ns}"
+    stat = [st.st_size, st.st_mtime_ns]
+    known = digests.get(os.path.abspath(path)) if digests is not None else None
+    if known is not None and known["stat"] == stat:
+        return known["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BUFFER), b""):
+            h.update(block)
+    if digests is not None:
+        digests[os.path.abspath(path)] = {"stat": stat, "sha256": h.hexdigest()}
+    return h.hexdigest()
+
+def dir_fingerprint(path):
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            h.update(f"{os.path.relpath(full, path)}\t{st.st_size}\t{st.st_mtime_ns}\n".encode())
+    return "dir:" + h.hexdigest()
+
+def input_fingerprints(patterns, fast=False, digests=None):
+    """
+    Fingerprint of every input path; patterns matching nothing are recorded as missing.
+    """
+    fingerprints = {}
+    for pattern in patterns:
+        paths = expand(pattern)
+        if not paths:
+            fingerprints[pattern] = "missing"
+        for path in paths:
+            fingerprints[path] = dir_fingerprint(path) if os.path.isdir(path) else file_fingerprint(path, fast, digests)
+    return fingerprints
+
+def step_key(step, params, fingerprints):
+    payload = json.dumps({"step": step, "params": params, "inputs": fingerprints}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def output_stats(patterns):
+    """
+    Size and mtime of every output path, or None if an output pattern matches nothing.
+    """
+    stats = {}
+    for pattern in patterns:
+        paths = expand(pattern)
+        if not paths:
+            return None
+        for path in paths:
+            st = os.stat(path)
+            stats[path] = [st.st_size, st.st_mtime_ns]
+    return stats
+
+def parse_params(params):
+    parsed = {}
+    for param in params:
+        name, sep, value = param.partition("=")
+        if not sep:
+            raise ValueError(f"Parameter '{param}' is not of the form NAME=VALUE")
+        parsed[name] = value
+    return parsed
+
+@contextmanager
+def locked_manifest(path):
+    """
+    Load the manifest under an exclusive lock (steps may record concurrently) and
+    yield it; changes are written back atomically.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = {"steps": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+        before = json.dumps(manifest, sort_keys=True)
+        yield manifest
+        if json.dumps(manifest, sort_keys=True) != before:
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(tmp, path)
+
+def default_manifest(outputs):
+    return os.environ.get("PRS_STEP_MANIFEST") or os.path.join(os.path.dirname(os.path.abspath(outputs[0])), MANIFEST_NAME)
+
+def load_digests(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with locked_manifest(manifest_path) as manifest:
+        return dict(manifest.get("digests", {}))
+
+def save_digests(manifest_path, digests):
+    with locked_manifest(manifest_path) as manifest:
+        manifest.setdefault("digests", {}).update(digests)
+
+def is_cached(manifest_path, step, key, outputs):
+    """
+    True if the manifest has the step with this key and all its recorded outputs are unchanged.
+    """
+    if not os.path.exists(manifest_path):
+        return False
+    with locked_manifest(manifest_path) as manifest:
+        entry = manifest["steps"].get(step)
+    if entry is None or entry["key"] != key:
+        return False
+    return output_stats(outputs) == entry["outputs"]
+
+def record(manifest_path, step, key, mode, params, fingerprints, outputs):
+    stats = output_stats(outputs)
+    if stats is None:
+        missing = [pattern for pattern in outputs if not expand(pattern)]
+        print(f"WARNING: step '{step}' not cached, outputs missing: {', '.join(missing)}")
+        return False
+    with locked_manifest(manifest_path) as manifest:
+        manifest["steps"][step] = {
+            "key": key,
+            "mode": mode,
+            "params": params,
+            "inputs": fingerprints,
+            "outputs": stats,
+            "recorded": datetime.now().isoformat(timespec="seconds"),
+        }
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed cache for PRS pipeline steps.")
+    parser.add_argument("action", choices=["check", "record", "run"], help="check: exit 0 if the step can be skipped; record: store a finished step; run: check, run the command after '--' if needed, record.")
+    parser.add_argument("--step", required=True, help="Step name (unique per manifest, e.g. 'prscs_CRP').")
+    parser.add_argument("--inputs", nargs="*", default=[], help="Input files, directories or glob patterns.")
+    parser.add_argument("--params", nargs="*", default=[], help="Parameters as NAME=VALUE.")
+    parser.add_argument("--outputs", nargs="+", required=True, help="Output files or glob patterns.")
+    parser.add_argument("--manifest", default=None, help=f"Manifest file (default: $PRS_STEP_MANIFEST or {MANIFEST_NAME} next to the first output).")
+    parser.add_argument("--fast", action="store_true", help="Fingerprint input files by size and mtime instead of content.")
+
+    argv = sys.argv[1:]
+    command = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, command = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    mode = os.environ.get("PRS_CACHE_MODE", "fast" if args.fast else "full")
+    if args.fast and mode == "full":
+        mode = "fast"
+    if args.action == "run" and not command:
+        parser.error("run needs a command after '--'")
+
+    if mode == "off":
+        if args.action == "check":
+            sys.exit(1)
+        if args.action == "run":
+            sys.exit(subprocess.call(command))
+        return
+
+    params = parse_params(args.params)
+    manifest_path = args.manifest or default_manifest(args.outputs)
+    # Memoized digests: only files changed since they were last hashed are read again.
+    # New digests are saved at check time too, so the record after the step reuses them.
+    digests = load_digests(manifest_path) if mode == "full" else None
+    known = dict(digests) if digests is not None else None
+    fingerprints = input_fingerprints(args.inputs, fast=mode == "fast", digests=digests)
+    if digests != known:
+        save_digests(manifest_path, {path: digest for path, digest in digests.items() if known.get(path) != digest})
+    key = step_key(args.step, params, fingerprints)
+
+    if args.action in ("check", "run") and is_cached(manifest_path, args.step, key, args.outputs):
+        print(f"Step '{args.step}' is up to date (inputs and parameters unchanged) — skipping")
+        sys.exit(0)
+
+    if args.action == "check":
+        sys.exit(1)
+
+    if args.action == "run":
+        returncode = subprocess.call(command)
+        if returncode != 0:
+            sys.exit(returncode)
+
+    if record(manifest_path, args.step, key, mode, params, fingerprints, args.outputs):
+        print(f"Step '{args.step}' recorded in {manifest_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# Parse-once GWAS summary statistics ingestion.
+# The raw sumstats (plain, gzip or BGZF; tab or whitespace delimited) are streamed in chunks,
+# their columns are detected from common header names, MAF/INFO filters are applied and the
+# result is written once to a canonical, typed, compressed Parquet file:
+#   SNP CHR POS A1 A2 FREQ MAF BETA SE P N INFO  (A1 = effect allele, BETA = log(OR) if only OR is given)
+# FREQ is the A1 frequency and stays NA when the input only has a minor allele frequency;
+# MAF comes from such a column or from FREQ and is used for filtering and the MAF columns.
+# Per-method input files are cheap views of the canonical file (column projection, no re-parsing):
+#   cojo     SNP A1 A2 freq b se p N             (SBayesRC, GCTB)
+#   prscs    SNP A1 A2 BETA P                    (PRS-CS)
+#   prsice   SNP CHR BP A1 A2 BETA OR SE P MAF INFO (PRSice-2)
+#   ldpred2  chr pos rsid a1 a0 n_eff beta_se p OR INFO MAF (prs_scoring_ldpred2.R)
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from prs_table_io import table_format
+from sumstats_io import open_input, open_output
+
+# Canonical column -> accepted header names (compared case-insensitively)
+COLUMN_ALIASES = {
+    "SNP": ["snp", "rsid", "rs_id", "rsids", "markername", "variant_id", "snpid", "id", "marker"],
+    "CHR": ["chr", "chrom", "#chrom", "chromosome", "#chr", "hg19chrc"],
+    "POS": ["pos", "bp", "position", "base_pair_location", "bp_hg19", "genpos"],
+    "A1": ["a1", "effect_allele", "allele1", "ea", "alt", "tested_allele", "a1_effect"],
+    "A2": ["a2", "a0", "other_allele", "allele2", "nea", "ref", "non_effect_allele", "reference_allele"],
+    "FREQ": ["freq", "frq", "eaf", "effect_allele_frequency", "a1freq", "freq1", "af", "a1_freq"],
+    "MAF": ["maf", "minor_allele_frequency"],
+    "BETA": ["beta", "b", "effect", "log_odds"],
+    "OR": ["or", "odds_ratio"],
+    "SE": ["se", "standard_error", "stderr", "beta_se", "se_beta"],
+    "P": ["p", "pval", "p_value", "pvalue", "p-value", "p_bolt_lmm", "p.value"],
+    "N": ["n", "neff", "n_eff", "n_total", "samplesize", "sample_size", "nobs"],
+    "INFO": ["info", "imputation_info", "info_score", "rsq", "r2"],
+}
+
+CANONICAL_COLUMNS = ["SNP", "CHR", "POS", "A1", "A2", "FREQ", "MAF", "BETA", "SE", "P", "N", "INFO"]
+REQUIRED_COLUMNS = ["SNP", "A1", "A2", "P"]
+
+VIEWS = {
+    "cojo": {"SNP": "SNP", "A1": "A1", "A2": "A2", "FREQ": "freq", "BETA": "b", "SE": "se", "P": "p", "N": "N"},
+    "prscs": {"SNP": "SNP", "A1": "A1", "A2": "A2", "BETA": "BETA", "P": "P"},
+    "prsice": {"SNP": "SNP", "CHR": "CHR", "POS": "BP", "A1": "A1", "A2": "A2", "BETA": "BETA", "OR": "OR", "SE": "SE", "P": "P", "MAF": "MAF", "INFO": "INFO"},
+    "ldpred2": {"CHR": "chr", "POS": "pos", "SNP": "rsid", "A1": "a1", "A2": "a0", "N": "n_eff", "SE": "beta_se", "P": "p", "OR": "OR", "INFO": "INFO", "MAF": "MAF"},
+}
+
+def detect_columns(header, required=None):
+    """
+    Map canonical column names to the input header. The first alias that matches wins.
+    By default BETA or OR is required besides SNP, A1, A2 and P; other callers pass
+    their own list of required columns.
+    """
+    lower = {col.strip().lower(): col for col in header}
+    mapping = {}
+    for canonical, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lower and lower[alias] not in mapping.values():
+                mapping[canonical] = lower[alias]
+                break
+
+    missing = [col for col in (required or REQUIRED_COLUMNS) if col not in mapping]
+    if required is None and "BETA" not in mapping and "OR" not in mapping:
+        missing.append("BETA/OR")
+    if missing:
+        raise ValueError(f"Could not detect columns {', '.join(missing)} in header: {', '.join(header)}")
+    return mapping
+
+def canonical_chunk(chunk, mapping, min_maf=None, min_info=None, n=None):
+    """
+    Rename, type, filter and complete one chunk of raw sumstats.
+
+    Returns (canonical chunk, number of rows removed by the MAF/INFO filters).
+    """
+    out = pd.DataFrame(index=chunk.index)
+    out["SNP"] = chunk[mapping["SNP"]].astype(str)
+    out["CHR"] = chunk[mapping["CHR"]].astype(str).str.replace("chr", "", regex=False) if "CHR" in mapping else None
+    out["POS"] = pd.to_numeric(chunk[mapping["POS"]], errors="coerce").astype("Int64") if "POS" in mapping else pd.NA
+    out["A1"] = chunk[mapping["A1"]].astype(str).str.upper()
+    out["A2"] = chunk[mapping["A2"]].astype(str).str.upper()
+    for col in ["FREQ", "MAF", "SE", "P", "N", "INFO"]:
+        out[col] = pd.to_numeric(chunk[mapping[col]], errors="coerce") if col in mapping else np.nan
+    if "MAF" not in mapping:
+        out["MAF"] = np.minimum(out["FREQ"], 1 - out["FREQ"])
+    if "BETA" in mapping:
+        out["BETA"] = pd.to_numeric(chunk[mapping["BETA"]], errors="coerce")
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["BETA"] = np.log(pd.to_numeric(chunk[mapping["OR"]], errors="coerce"))
+    if n is not None:
+        out["N"] = out["N"].fillna(n)
+
+    out = out.dropna(subset=["BETA", "P"])
+    n_rows = len(out)
+    if min_maf is not None and ("FREQ" in mapping or "MAF" in mapping):
+        out = out[out["MAF"] >= min_maf]
+    if min_info is not None and "INFO" in mapping:
+        out = out[out["INFO"] >= min_info]
+    return out[CANONICAL_COLUMNS], n_rows - len(out)
+
+def ingest(input_file, canonical_file, min_maf=None, min_info=None, n=None, chunksize=1_000_000):
+    """
+    Stream raw sumstats into the canonical Parquet file.
+
+    Args:
+        input_file (str): Raw sumstats (plain, gzip or BGZF; tab or whitespace delimited).
+        canonical_file (str): Output Parquet file.
+        min_maf (float): Drop variants with minor allele frequency below this (optional).
+        min_info (float): Drop variants with imputation INFO below this (optional).
+        n (int): Sample size for rows without an N column/value (optional).
+        chunksize (int): Rows per chunk.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("SNP", pa.string()), ("CHR", pa.string()), ("POS", pa.int64()), ("A1", pa.string()), ("A2", pa.string()),
+        ("FREQ", pa.float64()), ("MAF", pa.float64()), ("BETA", pa.float64()), ("SE", pa.float64()), ("P", pa.float64()),
+        ("N", pa.float64()), ("INFO", pa.float64()),
+    ])
+
+    with open_input(input_file) as infile:
+        header_line = infile.readline()
+        sep = "\t" if "\t" in header_line else r"\s+"
+        header = header_line.rstrip("\r\n").split("\t") if sep == "\t" else header_line.split()
+        mapping = detect_columns(header)
+        print("Detected columns: " + ", ".join(f"{canonical}={col}" for canonical, col in mapping.items()))
+
+        reader = pd.read_csv(infile, sep=sep, header=None, names=header, usecols=list(mapping.values()),
+                             dtype=str, chunksize=chunksize)
+        n_in = n_out = n_filtered = 0
+        with pq.ParquetWriter(canonical_file, schema, compression="zstd") as writer:
+            for chunk in reader:
+                n_in += len(chunk)
+                out, removed = canonical_chunk(chunk, mapping, min_maf, min_info, n)
+                n_filtered += removed
+                n_out += len(out)
+                writer.write_table(pa.Table.from_pandas(out, schema=schema, preserve_index=False))
+
+    print(f"Read {n_in} variants; {n_in - n_out - n_filtered} without effect/P, {n_filtered} removed by MAF/INFO filters; "
+          f"{n_out} written to {canonical_file}")
+
+def write_view(canonical_file, view, output_file, threads=4, batch_size=1_000_000):
+    """
+    Write a per-method input file from the canonical file, reading only the columns it needs.
+    """
+    import pyarrow.parquet as pq
+
+    columns = VIEWS[view]
+    parquet = pq.ParquetFile(canonical_file)
+    # Canonical files written before the MAF column existed: derive it from FREQ
+    derive_maf = "MAF" in columns and "MAF" not in parquet.schema_arrow.names
+    needed = [col for col in CANONICAL_COLUMNS
+              if col in columns or (col == "BETA" and "OR" in columns) or (col == "FREQ" and derive_maf)]
+    if view == "cojo" and parquet.read(columns=["N"]).column("N").null_count == parquet.metadata.num_rows:
+        raise ValueError(f"No sample size in {canonical_file}: the cojo view needs an N column or --n")
+
+    n_rows = 0
+    with open_output(output_file, threads) as out:
+        for k, batch in enumerate(parquet.iter_batches(batch_size=batch_size, columns=needed)):
+            df = batch.to_pandas()
+            if "OR" in columns:
+                df["OR"] = np.exp(df["BETA"])
+            if derive_maf:
+                df["MAF"] = np.minimum(df["FREQ"], 1 - df["FREQ"])
+            df = df[list(columns)].rename(columns=columns)
+            df.to_csv(out, sep="\t", index=False, header=k == 0, na_rep="NA")
+            n_rows += len(df)
+    print(f"{view} view with {n_rows} variants written to {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse GWAS summary statistics once into a canonical Parquet file and write per-method views.")
+    parser.add_argument("input_file", help="Raw sumstats (plain/gzip/BGZF), or an existing canonical .parquet file to only write views.")
+    parser.add_argument("--canonical", default=None, help="Canonical Parquet output (required unless the input is canonical).")
+    parser.add_argument("--view", nargs=2, action="append", default=[], metavar=("NAME", "PATH"), help=f"Write a view ({', '.join(VIEWS)}) to PATH; repeatable.")
+    parser.add_argument("--min_maf", type=float, default=None, help="Minimum minor allele frequency (default: no filter).")
+    parser.add_argument("--min_info", type=float, default=None, help="Minimum imputation INFO (default: no filter).")
+    parser.add_argument("--n", type=float, default=None, help="GWAS sample size for rows without N.")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="Rows per chunk (default: 1000000).")
+    parser.add_argument("--threads", type=int, default=4, help="Compression threads for .gz views (default: 4).")
+
+    args = parser.parse_args()
+
+    for name, _ in args.view:
+        if name not in VIEWS:
+            parser.error(f"Unknown view '{name}' (choose from {', '.join(VIEWS)})")
+
+    if table_format(args.input_file) == "parquet":
+        canonical_file = args.input_file
+    else:
+        if not args.canonical:
+            parser.error("--canonical is required for raw sumstats input")
+        canonical_file = args.canonical
+        os.makedirs(os.path.dirname(os.path.abspath(canonical_file)), exist_ok=True)
+        ingest(args.input_file, canonical_file, args.min_maf, args.min_info, args.n, args.chunksize)
+
+    for name, path in args.view:
+        write_view(canonical_file, name, path, threads=args.threads)
+
+if __name__ == "__main__":
+    main()
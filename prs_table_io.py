@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Table I/O shared by the Python pipeline stages.
+# The format follows the file extension: .parquet/.pq is Parquet, .arrow/.feather/.ipc
+# is Arrow IPC, anything else is delimited text. Columnar formats are typed and support
+# column projection, so a stage only loads the columns it uses.
+
+import os
+from fnmatch import fnmatch
+
+import pandas as pd
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+def table_format(path):
+    path = os.fspath(path).lower()
+    if path.endswith(PARQUET_SUFFIXES):
+        return "parquet"
+    if path.endswith(ARROW_SUFFIXES):
+        return "arrow"
+    return "text"
+
+def table_columns(path, sep=","):
+    """
+    Return the column names of a table without loading its data.
+    """
+    fmt = table_format(path)
+    # pyarrow is only needed for the columnar formats
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if fmt == "arrow":
+        import pyarrow.ipc as ipc
+        with ipc.open_file(path) as reader:
+            return reader.schema.names
+    return list(pd.read_csv(path, sep=sep, nrows=0).columns)
+
+def expand_columns(patterns, columns):
+    """
+    Expand comma-separated column names and shell-style patterns (e.g. 'SCORE1_AVG_*_std').
+    """
+    expanded = []
+    for pattern in patterns.split(','):
+        matches = [col for col in columns if fnmatch(col, pattern)]
+        expanded += matches if matches else [pattern]
+    return list(dict.fromkeys(expanded))
+
+def read_table(path, columns=None, sep=","):
+    """
+    Read a Parquet, Arrow IPC or delimited text table.
+
+    Args:
+        path (str): Input file.
+        columns (list): Columns to load (optional). Requested columns that are not
+            in the file are skipped, so callers can report them themselves.
+        sep (str): Delimiter for text input.
+    """
+    fmt = table_format(path)
+    if columns is not None:
+        available = set(table_columns(path, sep))
+        columns = [col for col in dict.fromkeys(columns) if col in available]
+
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    if fmt == "arrow":
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, sep=sep, usecols=columns)
+
+def write_table(df, path, sep=","):
+    """
+    Write a table as Parquet, Arrow IPC or delimited text depending on the extension.
+    """
+    fmt = table_format(path)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "arrow":
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, sep=sep, index=False)
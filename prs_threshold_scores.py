@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# Single-pass p-value threshold (C+T) scoring against a PLINK 1 binary target.
+# The (clumped) base SNPs are sorted by p-value once and the genotypes are decoded in that
+# order. Each SNP falls into the first threshold bin with p <= threshold; per-sample sums of
+# each bin are accumulated block by block, and the score at a threshold is the cumulative sum
+# of the bins up to it. Every threshold therefore costs one pass over the SNPs of the largest
+# threshold, so fine grids (e.g. 1000 log-spaced levels) are as cheap as the PRSice-2 bar levels.
+# Missing genotypes are mean-imputed and scores are averaged over the non-missing alleles,
+# like PRSice-2 (--score avg) and prs_score_bed.py.
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from prs_clump import COMPLEMENT, target_filesets
+from prs_score_bed import decode_block, load_bim, load_fam, open_bed
+from prs_sumstats_ingest import detect_columns
+from prs_table_io import read_table, table_columns, table_format, write_table
+
+# Thresholds of prs_scoring_prsice2.sh (--bar-levels plus --all-score)
+DEFAULT_THRESHOLDS = [5e-8, 5e-7, 5e-6, 5e-5, 5e-4, 5e-3, 5e-2, 0.1, 0.2, 0.3, 0.4, 0.5, 1.0]
+
+def threshold_grid(n_thresholds, lower=5e-8, upper=1.0):
+    """
+    n_thresholds log-spaced p-value thresholds from lower to upper.
+    """
+    return np.unique(np.geomspace(lower, upper, n_thresholds))
+
+def load_base(sumstats_file, delimiter="\t", extract=None):
+    """
+    Base SNPs with SNP, A1, (A2), P and BETA (log(OR) when only OR is given),
+    restricted to the SNPs in the extract file (e.g. prs_clump.py <out>.snplist).
+    """
+    mapping = detect_columns(table_columns(sumstats_file, sep=delimiter), required=["SNP", "A1", "P"])
+    if "BETA" not in mapping and "OR" not in mapping:
+        raise ValueError(f"No BETA or OR column in {sumstats_file}")
+    names = [col for col in ("SNP", "A1", "A2", "P", "BETA", "OR") if col in mapping]
+    base = read_table(sumstats_file, columns=[mapping[col] for col in names], sep=delimiter)
+    base = base.rename(columns={mapping[col]: col for col in names})
+    base["SNP"] = base["SNP"].astype(str)
+    base["P"] = pd.to_numeric(base["P"], errors="coerce")
+    if "BETA" in base:
+        base["BETA"] = pd.to_numeric(base["BETA"], errors="coerce")
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            base["BETA"] = np.log(pd.to_numeric(base["OR"], errors="coerce"))
+    base = base.replace([np.inf, -np.inf], np.nan).dropna(subset=["P", "BETA"]).drop_duplicates("SNP", keep=False)
+
+    if extract:
+        keep = pd.read_csv(extract, sep=r"\s+", header=None, usecols=[0], dtype=str)[0]
+        base = base[base["SNP"].isin(keep)]
+    return base.drop(columns="OR", errors="ignore")
+
+def align_base(bim, base):
+    """
+    Match base SNPs to the .bim by ID and effect allele (or its strand complement).
+
+    Returns (bim rows, weights, True where the effect allele is the .bim A2, p-values).
+    """
+    merged = base.merge(bim[["SNP", "A1", "A2"]].reset_index(), on="SNP", suffixes=("", "_BIM"))
+    allele = merged["A1"].str.upper()
+    complement = allele.str.translate(COMPLEMENT)
+    bim_a1, bim_a2 = merged["A1_BIM"].str.upper(), merged["A2_BIM"].str.upper()
+    is_a1 = (allele == bim_a1) | ((allele != bim_a2) & (complement == bim_a1))
+    is_a2 = ~is_a1 & ((allele == bim_a2) | (complement == bim_a2))
+    usable = (is_a1 | is_a2).to_numpy()
+    skipped = len(merged) - int(usable.sum())
+    if skipped:
+        print(f"Skipped {skipped} base SNPs with alleles mismatched to the target.")
+    return (merged["index"].to_numpy()[usable], merged["BETA"].to_numpy()[usable],
+            is_a2.to_numpy()[usable], merged["P"].to_numpy()[usable])
+
+def sweep_chrom(bed, n_samples, variant_idx, weights, flips, bins, sums, allele_ct, block_size=1024):
+    """
+    Add one chromosome's SNPs, visited in p-value order, to the per-bin SUM and
+    ALLELE_CT arrays (n_thresholds x n_samples, not yet accumulated over the bins).
+    """
+    # Scoring the A2 allele: w * (2 - d) = 2w - w * d
+    signed = np.where(flips, -weights, weights).astype(np.float32)
+    np.add.at(sums, bins[flips], 2 * weights[flips, None].astype(np.float32))
+
+    for start in range(0, len(variant_idx), block_size):
+        block = slice(start, start + block_size)
+        dosage = decode_block(bed, variant_idx[block], n_samples)
+        present = ~np.isnan(dosage)
+        means = np.nansum(dosage, axis=1) / np.maximum(present.sum(axis=1), 1)
+        imputed = np.where(present, dosage, means[:, None].astype(np.float32))
+
+        # SNPs are sorted by p-value, so each bin is a contiguous run within the block
+        block_bins = bins[block]
+        first = np.flatnonzero(np.r_[True, block_bins[1:] != block_bins[:-1]])
+        sums[block_bins[first]] += np.add.reduceat(imputed * signed[block, None], first, axis=0)
+        allele_ct[block_bins[first]] += 2 * np.add.reduceat(present.astype(np.float32), first, axis=0)
+
+def threshold_scores(sumstats_file, target, out_prefix, thresholds, extract=None, chroms=None, delimiter="\t", block_size=1024, score_file=None):
+    """
+    Average scores of all samples at every p-value threshold, in one pass over the SNPs.
+
+    Writes the scores (FID, IID, one Pt_<threshold> column per threshold) to score_file
+    (default <out_prefix>.all_score; Parquet or Arrow by extension, which is much faster
+    to write for fine grids) and <out_prefix>.thresholds (Threshold, Num_SNP).
+    """
+    thresholds = np.unique(np.asarray(thresholds, dtype=np.float64))
+    n_thresholds = len(thresholds)
+    base = load_base(sumstats_file, delimiter, extract)
+    base = base[base["P"] <= thresholds[-1]]
+    filesets = target_filesets(target, chroms or list(range(1, 23)))
+    print(f"Scoring {len(base)} base SNPs at {n_thresholds} p-value thresholds over {len(filesets)} target filesets...")
+
+    fam = sums = allele_ct = None
+    n_snps = np.zeros(n_thresholds, dtype=np.int64)
+    for chrom, bfile in filesets:
+        bim = load_bim(bfile)
+        chrom_fam = load_fam(bfile)
+        if fam is None:
+            fam = chrom_fam
+            sums = np.zeros((n_thresholds, len(fam)), dtype=np.float32)
+            allele_ct = np.zeros((n_thresholds, len(fam)), dtype=np.float32)
+        elif not chrom_fam["IID"].equals(fam["IID"]):
+            raise ValueError(f"Samples of {bfile}.fam differ from the first target fileset")
+
+        rows, weights, flips, p = align_base(bim, base)
+        order = np.argsort(p, kind="stable")
+        rows, weights, flips, p = rows[order], weights[order], flips[order], p[order]
+        # Bin k holds the SNPs with thresholds[k - 1] < p <= thresholds[k]
+        bins = np.searchsorted(thresholds, p, side="left")
+        n_snps += np.bincount(bins, minlength=n_thresholds)
+
+        bed = open_bed(bfile, len(chrom_fam), len(bim))
+        sweep_chrom(bed, len(chrom_fam), rows, weights, flips, bins, sums, allele_ct, block_size)
+        print(f"chr{chrom}: {len(rows)} SNPs")
+
+    if fam is None:
+        raise ValueError(f"No target filesets found for {target}")
+
+    # Snapshots at the threshold boundaries: running sums over the bins (in place, as the
+    # arrays are n_thresholds x n_samples)
+    np.cumsum(sums, axis=0, out=sums)
+    np.cumsum(allele_ct, axis=0, out=allele_ct)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = np.divide(sums, allele_ct, out=sums)
+
+    names = [f"Pt_{t:.6g}" for t in thresholds]
+    out = pd.concat([fam[["FID", "IID"]], pd.DataFrame(scores.T, columns=names)], axis=1)
+    score_file = score_file or f"{out_prefix}.all_score"
+    if table_format(score_file) == "text":
+        out.to_csv(score_file, sep="\t", index=False, na_rep="NA", float_format="%.6g")
+    else:
+        write_table(out, score_file)
+    pd.DataFrame({"Threshold": thresholds, "Num_SNP": np.cumsum(n_snps)}).to_csv(f"{out_prefix}.thresholds", sep="\t", index=False)
+    print(f"Scores at {n_thresholds} thresholds written to {score_file}")
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Score PRS at many p-value thresholds in a single pass over the clumped SNPs.")
+    parser.add_argument("--base", required=True, help="GWAS sumstats with SNP, A1, P and BETA or OR columns; TSV, Parquet or Arrow.")
+    parser.add_argument("--target", required=True, help="PLINK prefix of the target; '#' is replaced by the chromosome number.")
+    parser.add_argument("--out", required=True, help="Output prefix (<out>.all_score, <out>.thresholds).")
+    parser.add_argument("--score_file", default=None, help="Write the scores here instead of <out>.all_score; .parquet/.arrow for fine grids.")
+    parser.add_argument("--extract", default=None, help="Only score these SNPs, e.g. the prs_clump.py <out>.snplist.")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=None, help="P-value thresholds (default: the PRSice-2 bar levels and 1).")
+    parser.add_argument("--n_thresholds", type=int, default=None, help="Use this many log-spaced thresholds from --lower to --upper instead.")
+    parser.add_argument("--lower", type=float, default=5e-8, help="Smallest threshold of the log-spaced grid (default: 5e-8).")
+    parser.add_argument("--upper", type=float, default=1.0, help="Largest threshold of the log-spaced grid (default: 1).")
+    parser.add_argument("--chrom", nargs="*", default=None, help="Chromosomes (default: 1-22).")
+    parser.add_argument("--block_size", type=int, default=1024, help="Number of variants decoded per block (default: 1024).")
+    parser.add_argument("--delimiter", default="\t", help="Delimiter of a text base file (default: tab).")
+
+    args = parser.parse_args()
+
+    if args.n_thresholds:
+        thresholds = threshold_grid(args.n_thresholds, args.lower, args.upper)
+    else:
+        thresholds = args.thresholds or DEFAULT_THRESHOLDS
+    threshold_scores(args.base, args.target, args.out, thresholds, args.extract, args.chrom, args.delimiter, args.block_size, args.score_file)
+
+if __name__ == "__main__":
+    main()
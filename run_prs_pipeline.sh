@@ -11,7 +11,8 @@ Usage:
   ./run_prs_pipeline.sh \
     -p <phenotype> \
     -g <gwas_sumstats_path> \
-    -m <method>
+    -m <method> \
+    [-j <max_parallel_steps>] [-c <cpus>] [-M <memory_gb>] [-l <log_dir>] [-i <ingest_dir>]
 
 Required arguments:
   -p   Phenotype name (e.g. MDD, SCZ)
@@ -21,7 +22,24 @@ Required arguments:
          prscs
          prsice2
          sbayesrc
-         all
+         all   (methods run concurrently, see below)
+
+Options for -m all:
+  -j   Maximum number of steps running at once (default: 4)
+  -c   CPU budget shared by all running steps (default: nproc)
+  -M   Memory budget in GB shared by all running steps (default: total RAM)
+  -l   Directory for per-step logs (default: logs/<phenotype>)
+
+Sumstats ingestion:
+  -i   Parse the GWAS sumstats once (prs_sumstats_ingest.py) into
+       <ingest_dir>/<phenotype>.parquet and give every method its own view
+       (COJO .ma, PRS-CS, PRSice-2, LDpred2 layouts) instead of the raw file.
+       MIN_MAF/MIN_INFO/N_GWAS environment variables set the filters and the
+       sample size for files without an N column.
+
+  Per-step budgets can be set with <STEP>_CPUS and <STEP>_MEM_GB environment
+  variables (STEP = LDPRED2, PRSCS, PRSICE2, SBAYESRC_R, SBAYESRC_SH). A step's
+  CPU budget is passed on as OMP_NUM_THREADS/THREADS (and NCORES for LDpred2).
 
 Example:
   ./run_prs_pipeline.sh -p MDD -g gwas/MDD.sumstats.gz -m all
@@ -29,11 +47,22 @@ EOF
   exit 1
 }
 
-while getopts ":p:g:m:h" opt; do
+MAX_PARALLEL=4
+TOTAL_CPUS=$(nproc)
+TOTAL_MEM_GB=$(awk '/MemTotal/ {print int($2 / 1024 / 1024)}' /proc/meminfo)
+LOG_DIR=""
+INGEST_DIR=""
+
+while getopts ":p:g:m:j:c:M:l:i:h" opt; do
   case $opt in
     p) PHENO="$OPTARG" ;;
     g) GWAS="$OPTARG" ;;
     m) METHOD="$OPTARG" ;;
+    j) MAX_PARALLEL="$OPTARG" ;;
+    c) TOTAL_CPUS="$OPTARG" ;;
+    M) TOTAL_MEM_GB="$OPTARG" ;;
+    l) LOG_DIR="$OPTARG" ;;
+    i) INGEST_DIR="$OPTARG" ;;
     h) usage ;;
     \?) echo "Invalid option: -$OPTARG" >&2; usage ;;
     :) echo "Option -$OPTARG requires an argument." >&2; usage ;;
@@ -62,6 +91,29 @@ PRSCS_SCRIPT="prs_scoring_prscs.sh"
 PRSICE2_SCRIPT="prs_scoring_prsice2.sh"
 SBAYESRC_R_SCRIPT="prs_scoring_sbayesrc.R"
 SBAYESRC_SH_SCRIPT="prs_scoring_sbayesrc.sh"
+INGEST_SCRIPT="prs_sumstats_ingest.py"
+STEP_CACHE="prs_step_cache.py"
+
+SBAYESRC_OUTDIR="/root/persistent/data/prs/SBayesRC/${PHENO}"
+
+############################################
+# Per-method sumstats (views of the ingested file with -i, else the raw file)
+############################################
+
+GWAS_LDPRED2="$GWAS"
+GWAS_PRSCS="$GWAS"
+GWAS_PRSICE2="$GWAS"
+GWAS_COJO="$GWAS"
+LDPRED2_ARGS=()
+
+if [[ -n "$INGEST_DIR" ]]; then
+  CANONICAL="${INGEST_DIR}/${PHENO}.parquet"
+  GWAS_LDPRED2="${INGEST_DIR}/${PHENO}_ldpred2.txt.gz"
+  GWAS_PRSCS="${INGEST_DIR}/${PHENO}_prscs.txt"
+  GWAS_PRSICE2="${INGEST_DIR}/${PHENO}_prsice2.txt.gz"
+  GWAS_COJO="${INGEST_DIR}/${PHENO}_cojo.ma"
+  LDPRED2_ARGS=("$GWAS_LDPRED2")
+fi
 
 ############################################
 # Helper function
@@ -74,45 +126,206 @@ run_step() {
   echo "=========================================="
 }
 
+############################################
+# Steps (for the concurrent scheduler)
+############################################
+# Each step is a function step_<name>; STEP_DEPS lists the steps that must
+# succeed first, STEP_CPUS/STEP_MEM the resources reserved while it runs.
+
+STEPS=(ldpred2 prscs prsice2 sbayesrc_r sbayesrc_sh)
+
+step_ingest() {
+  local opts=()
+  [[ -n "${MIN_MAF:-}" ]] && opts+=(--min_maf "$MIN_MAF")
+  [[ -n "${MIN_INFO:-}" ]] && opts+=(--min_info "$MIN_INFO")
+  [[ -n "${N_GWAS:-}" ]] && opts+=(--n "$N_GWAS")
+  mkdir -p "$INGEST_DIR"
+  # Cached, so unchanged sumstats keep the views (and their mtimes) of the last run and
+  # the downstream method caches stay valid, also with PRS_CACHE_MODE=fast
+  python "$STEP_CACHE" run \
+    --step "ingest_${PHENO}" \
+    --inputs "$GWAS" \
+    --params MIN_MAF="${MIN_MAF:-}" MIN_INFO="${MIN_INFO:-}" N_GWAS="${N_GWAS:-}" \
+    --outputs "$CANONICAL" "$GWAS_LDPRED2" "$GWAS_PRSCS" "$GWAS_PRSICE2" "$GWAS_COJO" \
+    -- python "$INGEST_SCRIPT" "$GWAS" --canonical "$CANONICAL" "${opts[@]}" \
+      --view ldpred2 "$GWAS_LDPRED2" \
+      --view prscs "$GWAS_PRSCS" \
+      --view prsice "$GWAS_PRSICE2" \
+      --view cojo "$GWAS_COJO"
+}
+step_ldpred2()     { Rscript "$LDPRED2_SCRIPT" "$PHENO" "$GWAS" "${LDPRED2_ARGS[@]}"; }
+step_prscs()       { bash "$PRSCS_SCRIPT" "$PHENO" "$GWAS_PRSCS"; }
+step_prsice2()     { bash "$PRSICE2_SCRIPT" "$PHENO" "$GWAS_PRSICE2"; }
+step_sbayesrc_r()  { Rscript "$SBAYESRC_R_SCRIPT" "$PHENO" "$GWAS_COJO" "$SBAYESRC_OUTDIR"; }
+step_sbayesrc_sh() { bash "$SBAYESRC_SH_SCRIPT" "$PHENO" "$GWAS_COJO"; }
+
+declare -A STEP_DEPS=(
+  [ingest]=""
+  [ldpred2]=""
+  [prscs]=""
+  [prsice2]=""
+  [sbayesrc_r]=""
+  [sbayesrc_sh]="sbayesrc_r"
+)
+
+declare -A STEP_CPUS=(
+  [ingest]="${INGEST_CPUS:-4}"
+  [ldpred2]="${LDPRED2_CPUS:-8}"
+  [prscs]="${PRSCS_CPUS:-16}"
+  [prsice2]="${PRSICE2_CPUS:-8}"
+  [sbayesrc_r]="${SBAYESRC_R_CPUS:-4}"
+  [sbayesrc_sh]="${SBAYESRC_SH_CPUS:-4}"
+)
+
+declare -A STEP_MEM=(
+  [ingest]="${INGEST_MEM_GB:-8}"
+  [ldpred2]="${LDPRED2_MEM_GB:-32}"
+  [prscs]="${PRSCS_MEM_GB:-16}"
+  [prsice2]="${PRSICE2_MEM_GB:-16}"
+  [sbayesrc_r]="${SBAYESRC_R_MEM_GB:-32}"
+  [sbayesrc_sh]="${SBAYESRC_SH_MEM_GB:-32}"
+)
+
+# With -i every method reads a view written by the ingest step
+if [[ -n "$INGEST_DIR" ]]; then
+  STEPS=(ingest "${STEPS[@]}")
+  for step in ldpred2 prscs prsice2 sbayesrc_r; do
+    STEP_DEPS[$step]="ingest"
+  done
+fi
+
+############################################
+# Concurrent scheduler
+############################################
+# Starts every step whose dependencies have succeeded as soon as the global
+# step cap and the CPU/memory budgets allow. Steps depending on a failed
+# step are skipped; independent steps keep running.
+
+run_all() {
+  LOG_DIR="${LOG_DIR:-logs/${PHENO}}"
+  mkdir -p "$LOG_DIR"
+
+  declare -A status start elapsed pid_of exit_code
+  local step dep pid rc ready n_running=0 cpus_used=0 mem_used=0 cpus mem
+  for step in "${STEPS[@]}"; do
+    status[$step]="pending"
+    # A step larger than the whole budget runs on its own with the whole budget
+    (( STEP_CPUS[$step] > TOTAL_CPUS )) && STEP_CPUS[$step]=$TOTAL_CPUS
+    (( STEP_MEM[$step] > TOTAL_MEM_GB )) && STEP_MEM[$step]=$TOTAL_MEM_GB
+  done
+
+  echo "Scheduling ${#STEPS[@]} steps for $PHENO (max $MAX_PARALLEL at once, $TOTAL_CPUS CPUs, ${TOTAL_MEM_GB} GB)"
+  echo "Logs: $LOG_DIR"
+
+  while :; do
+    # Skip steps whose dependencies failed, start steps that fit the budgets
+    for step in "${STEPS[@]}"; do
+      [[ "${status[$step]}" == "pending" ]] || continue
+      ready=1
+      for dep in ${STEP_DEPS[$step]}; do
+        case "${status[$dep]}" in
+          done) ;;
+          failed|skipped) status[$step]="skipped"; ready=0; break ;;
+          *) ready=0 ;;
+        esac
+      done
+      (( ready )) || continue
+
+      cpus=${STEP_CPUS[$step]}
+      mem=${STEP_MEM[$step]}
+      if (( n_running < MAX_PARALLEL && cpus_used + cpus <= TOTAL_CPUS && mem_used + mem <= TOTAL_MEM_GB )); then
+        (
+          export OMP_NUM_THREADS=$cpus MKL_NUM_THREADS=$cpus OPENBLAS_NUM_THREADS=$cpus THREADS=$cpus NCORES=$cpus
+          "step_$step"
+        ) > "${LOG_DIR}/${PHENO}_${step}.log" 2>&1 &
+        pid_of[$step]=$!
+        start[$step]=$SECONDS
+        status[$step]="running"
+        n_running=$(( n_running + 1 )) cpus_used=$(( cpus_used + cpus )) mem_used=$(( mem_used + mem ))
+        echo "[$(date '+%H:%M:%S')] Started  $step (${cpus} CPUs, ${mem} GB)"
+      fi
+    done
+
+    (( n_running == 0 )) && break
+
+    # Reap finished steps
+    sleep 5
+    for step in "${STEPS[@]}"; do
+      [[ "${status[$step]}" == "running" ]] || continue
+      pid=${pid_of[$step]}
+      kill -0 "$pid" 2>/dev/null && continue
+      if wait "$pid"; then rc=0; else rc=$?; fi
+      exit_code[$step]=$rc
+      elapsed[$step]=$(( SECONDS - start[$step] ))
+      n_running=$(( n_running - 1 )) cpus_used=$(( cpus_used - STEP_CPUS[$step] )) mem_used=$(( mem_used - STEP_MEM[$step] ))
+      if (( rc == 0 )); then
+        status[$step]="done"
+      else
+        status[$step]="failed"
+      fi
+      echo "[$(date '+%H:%M:%S')] Finished $step: ${status[$step]} (exit $rc, ${elapsed[$step]}s)"
+    done
+  done
+
+  # Summary
+  local failed=0
+  echo
+  echo "=========================================="
+  echo "Summary for phenotype $PHENO"
+  echo "=========================================="
+  printf "%-12s %-8s %-5s %-8s %s\n" "STEP" "STATUS" "EXIT" "TIME(s)" "LOG"
+  for step in "${STEPS[@]}"; do
+    printf "%-12s %-8s %-5s %-8s %s\n" "$step" "${status[$step]}" "${exit_code[$step]:--}" "${elapsed[$step]:--}" "${LOG_DIR}/${PHENO}_${step}.log"
+    [[ "${status[$step]}" == "done" ]] || failed=1
+  done
+
+  if (( failed )); then
+    echo
+    for step in "${STEPS[@]}"; do
+      [[ "${status[$step]}" == "failed" ]] || continue
+      echo "---- last lines of ${LOG_DIR}/${PHENO}_${step}.log ----"
+      tail -n 10 "${LOG_DIR}/${PHENO}_${step}.log"
+    done
+    echo
+    echo "ERROR: PRS pipeline failed for phenotype: $PHENO"
+    exit 1
+  fi
+}
+
 ############################################
 # Method dispatch
 ############################################
 
+if [[ -n "$INGEST_DIR" && "$METHOD" != "all" ]]; then
+  run_step "sumstats ingestion"
+  step_ingest
+fi
+
 case "$METHOD" in
   ldpred2)
     run_step "LDpred2"
-    Rscript "$LDPRED2_SCRIPT" "$PHENO" "$GWAS"
+    step_ldpred2
     ;;
 
   prscs)
     run_step "PRS-CS"
-    bash "$PRSCS_SCRIPT" "$PHENO" "$GWAS"
+    step_prscs
     ;;
 
   prsice2)
     run_step "PRSice-2"
-    bash "$PRSICE2_SCRIPT" "$PHENO" "$GWAS"
+    step_prsice2
     ;;
 
   sbayesrc)
     run_step "SBayesRC"
-    Rscript "$SBAYESRC_R_SCRIPT" "$PHENO" "$GWAS"
-    bash "$SBAYESRC_SH_SCRIPT" "$PHENO" "$GWAS"
+    step_sbayesrc_r
+    step_sbayesrc_sh
     ;;
 
   all)
-    run_step "LDpred2"
-    Rscript "$LDPRED2_SCRIPT" "$PHENO" "$GWAS"
-
-    run_step "PRS-CS"
-    bash "$PRSCS_SCRIPT" "$PHENO" "$GWAS"
-
-    run_step "PRSice-2"
-    bash "$PRSICE2_SCRIPT" "$PHENO" "$GWAS"
-
-    run_step "SBayesRC"
-    Rscript "$SBAYESRC_R_SCRIPT" "$PHENO" "$GWAS"
-    bash "$SBAYESRC_SH_SCRIPT" "$PHENO" "$GWAS"
+    run_step "LDpred2, PRS-CS, PRSice-2 and SBayesRC"
+    run_all
     ;;
 
   *)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Streaming text I/O for (optionally) compressed sumstats files.
+# Input is read transparently from plain text, gzip or BGZF (which is gzip-compatible).
+# Output ending in .gz/.bgz is written as BGZF, with blocks compressed on a thread pool,
+# so the result can be indexed with tabix and read by anything that reads gzip.
+
+import gzip
+import io
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+BUFFER_SIZE = 4 * 1024 * 1024
+
+# Maximum uncompressed payload per BGZF block (as used by htslib)
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_HEADER = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+COMPRESSED_SUFFIXES = (".gz", ".bgz")
+
+def is_gzipped(path):
+    with open(path, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+def open_input(path):
+    """
+    Open a plain, gzip or BGZF text file for reading with a large read buffer.
+    """
+    if is_gzipped(path):
+        raw = io.BufferedReader(gzip.GzipFile(path, "rb"), buffer_size=BUFFER_SIZE)
+        return io.TextIOWrapper(raw)
+    return open(path, "r", buffering=BUFFER_SIZE)
+
+def open_output(path, threads=4):
+    """
+    Open a text file for writing; paths ending in .gz/.bgz are written as BGZF.
+    """
+    if path.endswith(COMPRESSED_SUFFIXES):
+        return BgzfWriter(path, threads=threads)
+    return open(path, "w", newline="", buffering=BUFFER_SIZE)
+
+def compress_block(data, level=6):
+    """
+    Compress one chunk of at most BGZF_BLOCK_SIZE bytes into a complete BGZF block.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    block_size = len(BGZF_HEADER) + 2 + len(payload) + 8
+    return b"".join((
+        BGZF_HEADER,
+        struct.pack("<H", block_size - 1),
+        payload,
+        struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data)),
+    ))
+
+class BgzfWriter:
+    """
+    Text writer producing BGZF output. zlib releases the GIL, so blocks are
+    compressed concurrently on a thread pool and written back in order.
+    """
+
+    def __init__(self, path, threads=4, level=6, encoding="utf-8"):
+        self.path = path
+        self.level = level
+        self.encoding = encoding
+        self._file = open(path, "wb")
+        self._buffer = bytearray()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads))
+        self._pending = deque()
+        self._max_pending = 4 * max(1, threads)
+
+    def write(self, text):
+        self._buffer += text.encode(self.encoding)
+        while len(self._buffer) >= BGZF_BLOCK_SIZE:
+            self._submit(bytes(self._buffer[:BGZF_BLOCK_SIZE]))
+            del self._buffer[:BGZF_BLOCK_SIZE]
+        return len(text)
+
+    def _submit(self, data):
+        self._pending.append(self._pool.submit(compress_block, data, self.level))
+        while len(self._pending) > self._max_pending:
+            self._file.write(self._pending.popleft().result())
+
+    def flush(self):
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._file.write(self._pending.popleft().result())
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.write(BGZF_EOF)
+        self._file.close()
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
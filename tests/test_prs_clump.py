@@ -0,0 +1,19 @@
+import numpy as np
+
+from prs_clump import BitGenotypes, plane_mask
+
+def test_lru_keeps_requested_rows(tmp_path):
+    n_samples, n_variants = 37, 10
+    rng = np.random.default_rng(0)
+    bed = rng.integers(0, 256, size=(n_variants, (n_samples + 3) // 4), dtype=np.uint8)
+    variant_bytes = 3 * len(plane_mask(n_samples))
+    genotypes = BitGenotypes(bed, n_samples, cache_bytes=4 * variant_bytes)
+
+    genotypes.get([0, 1, 2])
+    # Row 0 is cached but oldest: the new rows must not evict it
+    planes = genotypes.get([0, 5, 6, 7])
+
+    expected = genotypes.encode(np.array([0, 5, 6, 7]))
+    for plane, want in zip(planes, expected):
+        np.testing.assert_array_equal(plane, want)
+    assert list(genotypes.cache) == [0, 5, 6, 7]
@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip("datashader")
+
+from prs_plot_prscs import read_chunks
+
+def test_read_chunks_prscs_layout(tmp_path):
+    # PRScs.py _pst_eff layout: CHR SNP BP A1 A2 BETA, no header
+    path = tmp_path / "MDD_pst_eff_a1_b0.5_phiauto_chr1.txt"
+    path.write_text("1\trs3094315\t752566\tG\tA\t-1.503925e-05\n1\trs3131972\t752721\tA\tG\t2.110571e-05\n")
+
+    chunk = next(read_chunks(str(path), has_headers=False, chunksize=10))
+    assert list(chunk["CHR"]) == [1, 1]
+    assert list(chunk["BP"]) == [752566, 752721]
+    assert chunk["BETA"].tolist() == pytest.approx([-1.503925e-05, 2.110571e-05])
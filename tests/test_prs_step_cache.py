@@ -0,0 +1,20 @@
+import os
+
+from prs_step_cache import file_fingerprint
+
+def test_digest_reused_while_size_and_mtime_match(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("aaaa")
+    digests = {}
+    first = file_fingerprint(str(path), digests=digests)
+    assert digests[str(path)]["sha256"] == first
+
+    # Same size and mtime: the memoized digest is returned without reading the file
+    st = os.stat(path)
+    path.write_text("bbbb")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert file_fingerprint(str(path), digests=digests) == first
+
+    # A new mtime invalidates the memo
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert file_fingerprint(str(path), digests=digests) != first